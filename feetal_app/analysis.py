@@ -0,0 +1,247 @@
+"""
+Combined analysis pipeline: preterm CNN on the scan, maternal model on the
+values extracted from the medical reports, combined risk, PDF and the
+AnalysisReport row for the doctor dashboard.
+
+Used directly by combined_analysis_api (synchronous mode) and by the job
+workers in jobs.py.
+"""
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.utils import timezone
+
+from .ml_service import (
+    extract_medical_values,
+    predict_maternal_health,
+    predict_preterm_delivery_batch,
+    preprocess_preterm_upload,
+)
+from .models import AnalysisReport
+from .pdf_store import store_pdf
+from .reports import build_combined_pdf, report_data
+
+logger = logging.getLogger(__name__)
+
+_file_pool = None
+_report_process_pool = None
+_pool_lock = threading.Lock()
+
+
+class AnalysisError(Exception):
+    """A combined analysis failure with the message and HTTP status shown to the patient."""
+
+    def __init__(self, message, status=500):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def combine_risk(preterm_result, maternal_result):
+    """Overall risk is the worse of the two; confidence is the mean of both probabilities."""
+    def risk_to_score(r):
+        if r == "High Risk":
+            return 3
+        if r == "Medium Risk":
+            return 2
+        return 1
+
+    scores = [
+        risk_to_score(preterm_result.get("risk_level")),
+        risk_to_score(maternal_result.get("risk_level")),
+    ]
+    max_score = max(scores)
+
+    if max_score == 3:
+        combined_risk = "High Risk"
+    elif max_score == 2:
+        combined_risk = "Medium Risk"
+    else:
+        combined_risk = "Low Risk"
+
+    pt_conf = preterm_result.get("probability", 0) * 100
+    mh_conf = maternal_result.get("prediction_proba", 0) * 100
+    combined_confidence = int(round((pt_conf + mh_conf) / 2))
+
+    return {
+        "risk_level": combined_risk,
+        "confidence": combined_confidence,
+    }
+
+
+# ------------------------- FILE POOLS -------------------------
+def get_file_pool():
+    """
+    Process-wide thread pool for per-file work (scan decoding, report parsing).
+    Shared by all requests/jobs, so concurrency stays bounded under load.
+    """
+    global _file_pool
+    if _file_pool is None:
+        with _pool_lock:
+            if _file_pool is None:
+                _file_pool = ThreadPoolExecutor(
+                    max_workers=getattr(settings, "ANALYSIS_FILE_WORKERS", 4),
+                    thread_name_prefix="analysis-file",
+                )
+    return _file_pool
+
+
+def _init_report_process():
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+
+
+def _extract_report_bytes(name, data):
+    """Process-pool entry point: extract values from one report's bytes."""
+    return extract_medical_values(ContentFile(data, name=name))
+
+
+def _get_report_process_pool():
+    global _report_process_pool
+    if _report_process_pool is None:
+        with _pool_lock:
+            if _report_process_pool is None:
+                # spawn: forking a multi-threaded web worker is unsafe
+                _report_process_pool = ProcessPoolExecutor(
+                    max_workers=getattr(settings, "ANALYSIS_FILE_WORKERS", 4),
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_report_process,
+                )
+    return _report_process_pool
+
+
+def _submit_report(f):
+    """
+    Parse one medical report in the background. PDF parsing is pure Python,
+    so ANALYSIS_REPORT_PROCESSES moves it off the GIL into worker processes.
+    """
+    if getattr(settings, "ANALYSIS_REPORT_PROCESSES", False):
+        f.seek(0)
+        return _get_report_process_pool().submit(_extract_report_bytes, os.path.basename(f.name), f.read())
+    return get_file_pool().submit(extract_medical_values, f)
+
+
+def aggregate_preterm_results(scan_results):
+    """
+    One preterm result for the whole upload: the highest-probability scan
+    decides (a single worrying scan must not be averaged away); per-scan
+    results are kept under ``scans``.
+    """
+    scored = [r for r in scan_results if r.get("success")]
+    if not scored:
+        return None
+    worst = max(scored, key=lambda r: r["probability"])
+    result = dict(worst)
+    result["scans"] = scan_results
+    result["scans_scored"] = len(scored)
+    return result
+
+
+def run_combined_analysis(scanning_files, medical_files, patient_name, patient_email, progress=None):
+    """
+    Run the whole combined analysis and return the saved AnalysisReport.
+
+    ``progress(percent, stage)`` is called between steps when given.
+    Raises AnalysisError for failures the patient should see.
+    """
+    def report_progress(percent, stage):
+        if progress is not None:
+            progress(percent, stage)
+
+    # Decode every scan and parse every report concurrently; wall time follows the slowest file
+    report_progress(10, "Reading scans and medical reports")
+    pool = get_file_pool()
+    scan_futures = [pool.submit(preprocess_preterm_upload, {"image_file": f}) for f in scanning_files]
+    report_futures = [_submit_report(f) for f in medical_files]
+
+    # Preterm analysis (image-based): every scan in one CNN batch
+    scan_results = [None] * len(scanning_files)
+    arrays, index = [], []
+    for i, (f, future) in enumerate(zip(scanning_files, scan_futures)):
+        try:
+            arrays.append(future.result())
+            index.append(i)
+        except Exception as e:
+            logger.error(f"Could not read scan {f.name}: {str(e)}")
+            scan_results[i] = {"success": False, "error": str(e)}
+
+    report_progress(40, "Analyzing ultrasound scans")
+    for i, result in zip(index, predict_preterm_delivery_batch(arrays)):
+        scan_results[i] = result
+    for f, result in zip(scanning_files, scan_results):
+        result["file_name"] = os.path.basename(f.name or "")
+
+    preterm_result = aggregate_preterm_results(scan_results)
+    if preterm_result is None:
+        raise AnalysisError(scan_results[0].get("error", "Preterm analysis failed."), status=500)
+
+    # Maternal analysis (reports-based); later files win, as when parsed in order
+    report_progress(55, "Reading medical reports")
+    extracted = {}
+    for f, future in zip(medical_files, report_futures):
+        try:
+            vals = future.result()
+        except Exception as e:
+            logger.error(f"Could not read report {f.name}: {str(e)}")
+            vals = None
+        if vals:
+            for k, v in vals.items():
+                if v is not None and v != "":
+                    extracted[k] = v
+
+    if not extracted:
+        raise AnalysisError(
+            "Could not detect medical values in reports. Please ensure Age, BP, Sugar, etc. are present in text.",
+            status=400,
+        )
+
+    report_progress(65, "Assessing maternal health")
+    maternal_result = predict_maternal_health(extracted)
+    if not maternal_result.get("success"):
+        raise AnalysisError(maternal_result.get("error", "Maternal analysis failed."), status=500)
+
+    combined_result = combine_risk(preterm_result, maternal_result)
+
+    generated_at = timezone.localtime()
+    report_progress(75, "Saving report")
+    report = AnalysisReport.objects.create(
+        patient_name=patient_name,
+        patient_email=patient_email,
+        combined_risk_level=combined_result["risk_level"],
+        analysis_data=report_data(preterm_result, maternal_result, combined_result, generated_at),
+    )
+    if getattr(settings, "ANALYSIS_DEFER_PDF", False):
+        # Rendered from analysis_data on the first download (reports.store_report_pdf)
+        return report
+
+    # Build PDF & save
+    report_progress(85, "Generating PDF report")
+    pdf_bytes = build_combined_pdf(
+        patient_name,
+        patient_email,
+        preterm_result,
+        maternal_result,
+        combined_result,
+        generated_at=generated_at,
+    )
+
+    try:
+        # Ensure directory exists (critical for Render)
+        report_dir = os.path.join(settings.MEDIA_ROOT, "analysis_reports")
+        os.makedirs(report_dir, exist_ok=True)
+
+        report.pdf.name, fingerprint = store_pdf(pdf_bytes)
+        report.pdf_etag, report.pdf_size = fingerprint["pdf_etag"], fingerprint["pdf_size"]
+        report.save(update_fields=["pdf", "pdf_etag", "pdf_size"])
+    except Exception as e:
+        # The download view renders it again from analysis_data
+        logger.error(f"Failed to save PDF: {str(e)}")
+
+    return report
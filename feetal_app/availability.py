@@ -0,0 +1,175 @@
+"""
+Bookable appointment slots from DoctorSchedule.
+
+Each doctor's weekly windows (DoctorSchedule rows) are expanded into
+APPOINTMENT_SLOT_MINUTES slots for every date in the requested range, and
+slots that overlap an existing non-cancelled appointment are removed. The
+bookings of all requested doctors for the whole range are read in one query
+and kept per (doctor, date) as a sorted list of start minutes, so each slot
+is checked with a binary search instead of a query.
+
+Bookings go through reserve_appointment(): the appt_unique_active_slot
+constraint lets only one active appointment hold a doctor/date/time, so
+concurrent requests for the same slot are decided by the database.
+"""
+import time
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, OperationalError, transaction
+from django.utils import timezone
+
+from .models import Appointment, DoctorSchedule
+
+BOOKING_ATTEMPTS = 5
+
+WEEKDAYS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+
+
+class SlotUnavailable(Exception):
+    """The requested time is not a free slot of the doctor."""
+
+
+def slot_minutes():
+    return int(getattr(settings, "APPOINTMENT_SLOT_MINUTES", 30))
+
+
+def _minutes(t):
+    return t.hour * 60 + t.minute
+
+
+def _format(minutes):
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+class BookingIndex:
+    """Start minutes of the booked appointments per (doctor, date), sorted."""
+
+    def __init__(self, doctor_ids, start, end):
+        self._starts = defaultdict(list)
+        bookings = (
+            Appointment.objects.filter(doctor_id__in=doctor_ids, appointment_date__range=(start, end))
+            .exclude(status="cancelled")
+            .order_by()
+            .values_list("doctor_id", "appointment_date", "appointment_time")
+        )
+        for doctor_id, day, at in bookings:
+            self._starts[(doctor_id, day)].append(_minutes(at))
+        for starts in self._starts.values():
+            starts.sort()
+
+    def has_bookings(self, doctor_id, day):
+        return (doctor_id, day) in self._starts
+
+    def overlaps(self, doctor_id, day, start, length):
+        """True when a booking on that day overlaps [start, start + length)."""
+        starts = self._starts.get((doctor_id, day))
+        if not starts:
+            return False
+        # Bookings last one slot: any starting in (start - length, start + length) overlaps
+        i = bisect_right(starts, start - length)
+        return i < len(starts) and starts[i] < start + length
+
+
+def _window_slots(windows, length):
+    """(minute, "HH:MM") for every slot that fits in the windows, in order and without repeats."""
+    minutes = sorted({
+        slot
+        for window_start, window_end in windows
+        for slot in range(window_start, window_end - length + 1, length)
+    })
+    return [(slot, _format(slot)) for slot in minutes]
+
+
+def available_slots(doctor_ids, start, end):
+    """
+    Free slots per doctor and date between ``start`` and ``end`` (inclusive):
+    {doctor_id: {date: ["09:00", "09:30", ...]}}. Dates without a free slot
+    are left out; slots that have already started are never offered.
+    """
+    doctor_ids = list(doctor_ids)
+    length = slot_minutes()
+    windows = defaultdict(list)
+    for doctor_id, day, start_time, end_time in DoctorSchedule.objects.filter(doctor_id__in=doctor_ids).values_list(
+        "doctor_id", "day", "start_time", "end_time"
+    ):
+        windows[(doctor_id, day)].append((_minutes(start_time), _minutes(end_time)))
+    # The weekly template is expanded once; each date only filters it
+    weekly = {key: _window_slots(day_windows, length) for key, day_windows in windows.items()}
+    bookings = BookingIndex(doctor_ids, start, end)
+
+    now = timezone.localtime()
+    today, now_minutes = now.date(), _minutes(now.time())
+
+    result = {doctor_id: {} for doctor_id in doctor_ids}
+    day = max(start, today)
+    while day <= end:
+        weekday = WEEKDAYS[day.weekday()]
+        for doctor_id in doctor_ids:
+            template = weekly.get((doctor_id, weekday))
+            if not template:
+                continue
+            if day == today:
+                template = [(slot, label) for slot, label in template if slot > now_minutes]
+            if bookings.has_bookings(doctor_id, day):
+                slots = [label for slot, label in template if not bookings.overlaps(doctor_id, day, slot, length)]
+            else:
+                slots = [label for slot, label in template]
+            if slots:
+                result[doctor_id][day] = slots
+        day += timedelta(days=1)
+    return result
+
+
+def fits_schedule(doctor_id, day, at):
+    """
+    Whether ``at`` is the start of one of the doctor's schedule slots on
+    ``day``. Doctors without any schedule accept every time.
+    """
+    schedule = list(DoctorSchedule.objects.filter(doctor_id=doctor_id).values_list("day", "start_time", "end_time"))
+    if not schedule:
+        return True
+    weekday = WEEKDAYS[day.weekday()]
+    windows = [(_minutes(start_time), _minutes(end_time)) for d, start_time, end_time in schedule if d == weekday]
+    return any(slot == _minutes(at) for slot, _ in _window_slots(windows, slot_minutes()))
+
+
+def _slot_holder(fields):
+    return (
+        Appointment.objects.filter(
+            doctor=fields["doctor"],
+            appointment_date=fields["appointment_date"],
+            appointment_time=fields["appointment_time"],
+        )
+        .exclude(status="cancelled")
+        .first()
+    )
+
+
+def reserve_appointment(**fields):
+    """
+    Create an Appointment holding its doctor/date/time slot; returns
+    (appointment, created). When the slot is already held by the same
+    patient (a retried request) that appointment is returned with
+    created=False; when someone else holds it SlotUnavailable is raised.
+    """
+    for attempt in range(BOOKING_ATTEMPTS):
+        try:
+            with transaction.atomic():
+                return Appointment.objects.create(**fields), True
+        except IntegrityError:
+            holder = _slot_holder(fields)
+            if holder is None:
+                # Cancelled between our insert and the lookup; the slot is free again
+                continue
+            if holder.patient_email.lower() == fields.get("patient_email", "").lower():
+                return holder, False
+            raise SlotUnavailable("This time slot has just been booked. Please choose another time.")
+        except OperationalError:
+            # SQLite turns concurrent writers away with "database is locked"
+            if attempt == BOOKING_ATTEMPTS - 1:
+                raise
+            time.sleep(0.05 * (attempt + 1))
+    raise SlotUnavailable("This time slot is busy. Please try again.")
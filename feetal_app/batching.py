@@ -0,0 +1,167 @@
+"""
+Micro-batching layer for model inference.
+
+Concurrent requests (gunicorn threads) submit their input rows to a
+MicroBatcher, which collects them for a few milliseconds and runs them
+through a single ``predict`` call on a background thread. Each caller gets
+back only its own slice of the output.
+"""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+# Bucket upper bounds used for the batcher histograms
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+QUEUE_WAIT_MS_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+_STOP = object()
+
+
+class Histogram:
+    """Thread-safe cumulative histogram with fixed bucket bounds."""
+
+    def __init__(self, bounds):
+        self.bounds = tuple(bounds)
+        self._counts = [0] * (len(self.bounds) + 1)
+        self._count = 0
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            for i, bound in enumerate(self.bounds):
+                if value <= bound:
+                    self._counts[i] += 1
+                    break
+            else:
+                self._counts[-1] += 1
+            self._count += 1
+            self._sum += value
+
+    def snapshot(self):
+        with self._lock:
+            buckets = {f"<={b}": c for b, c in zip(self.bounds, self._counts)}
+            buckets["+Inf"] = self._counts[-1]
+            return {
+                "count": self._count,
+                "sum": round(self._sum, 3),
+                "mean": round(self._sum / self._count, 3) if self._count else 0.0,
+                "buckets": buckets,
+            }
+
+
+class _Request:
+    __slots__ = ("rows", "future", "enqueued_at")
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+
+
+class MicroBatcher:
+    """
+    Collect in-flight inference requests and run them as one batch.
+
+    ``predict_fn`` receives a stacked NumPy array (N x ...) and must return
+    an array whose first dimension is N. A batch is dispatched as soon as it
+    holds ``max_batch_size`` rows or the oldest request has waited
+    ``max_wait_ms`` milliseconds.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=8, max_wait_ms=5.0, name="batcher"):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.name = name
+
+        self.batch_size_hist = Histogram(BATCH_SIZE_BUCKETS)
+        self.queue_wait_hist = Histogram(QUEUE_WAIT_MS_BUCKETS)
+
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=f"{name}-worker", daemon=True)
+        self._thread.start()
+
+    # ------------------------- public API -------------------------
+    def submit(self, rows):
+        """Queue ``rows`` (N x ...) for inference and return a Future."""
+        request = _Request(rows)
+        self._queue.put(request)
+        return request.future
+
+    def predict(self, rows, timeout=None):
+        """Blocking helper: submit ``rows`` and wait for their predictions."""
+        return self.submit(rows).result(timeout=timeout)
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "queue_depth": self._queue.qsize(),
+            "batch_size": self.batch_size_hist.snapshot(),
+            "queue_wait_ms": self.queue_wait_hist.snapshot(),
+        }
+
+    def shutdown(self, timeout=None):
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    # ------------------------- worker -------------------------
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+
+            batch = [first]
+            size = len(first.rows)
+            deadline = first.enqueued_at + self.max_wait
+            stop = False
+
+            while size < self.max_batch_size:
+                # Past the deadline we still drain whatever is already queued
+                remaining = deadline - time.monotonic()
+                try:
+                    if remaining > 0:
+                        nxt = self._queue.get(timeout=remaining)
+                    else:
+                        nxt = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is _STOP:
+                    stop = True
+                    break
+                batch.append(nxt)
+                size += len(nxt.rows)
+
+            self._dispatch(batch, size)
+            if stop:
+                return
+
+    def _dispatch(self, batch, size):
+        import numpy as np
+
+        started = time.monotonic()
+        self.batch_size_hist.observe(size)
+        for request in batch:
+            self.queue_wait_hist.observe((started - request.enqueued_at) * 1000.0)
+
+        try:
+            inputs = batch[0].rows if len(batch) == 1 else np.concatenate([r.rows for r in batch])
+            outputs = self.predict_fn(inputs)
+        except Exception as e:
+            logger.error(f"{self.name}: batch inference failed: {str(e)}")
+            for request in batch:
+                request.future.set_exception(e)
+            return
+
+        offset = 0
+        for request in batch:
+            n = len(request.rows)
+            request.future.set_result(outputs[offset:offset + n])
+            offset += n
@@ -0,0 +1,105 @@
+"""
+Cached doctor directory served by get_doctors.
+
+The serialized JSON body for each specialization filter is cached twice: in
+the process (TTLCache) and in Django's cache, which is shared between worker
+processes when CACHES points at Redis or Memcached. Both are keyed by a
+directory version kept in Django's cache. Saving or deleting a doctor or a
+user bumps the version (signals.py), so old entries are never read again,
+in any process. The version is the time of the change and is also sent as
+Last-Modified, next to an ETag of the body, so browsers revalidate with 304s.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Doctor
+from .ttl_cache import TTLCache
+
+VERSION_KEY = "feetal:doctor_directory:version"
+ENTRY_KEY = "feetal:doctor_directory:{version}:{specialization}"
+
+DirectoryEntry = namedtuple("DirectoryEntry", "content etag last_modified")
+
+_local_cache = None
+_local_cache_lock = threading.Lock()
+
+
+def _ttl():
+    return getattr(settings, "DOCTOR_DIRECTORY_CACHE_TTL", 3600)
+
+
+def _get_local_cache():
+    global _local_cache
+    if _local_cache is None:
+        with _local_cache_lock:
+            if _local_cache is None:
+                _local_cache = TTLCache(max_size=64, ttl=_ttl())
+    return _local_cache
+
+
+def directory_version():
+    """Time of the last doctor change, as stored in the shared cache."""
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # First request, or the shared cache was flushed: start a new version now
+        cache.add(VERSION_KEY, time.time(), timeout=None)
+        version = cache.get(VERSION_KEY, time.time())
+    return version
+
+
+def invalidate_directory():
+    cache.set(VERSION_KEY, time.time(), timeout=None)
+
+
+def build_directory(specialization=""):
+    """The get_doctors response body: active doctors, optionally of one specialization."""
+    doctors = Doctor.objects.filter(user__is_active=True).select_related("user")
+    if specialization:
+        doctors = doctors.filter(specialization=specialization)
+
+    doctors_list = [
+        {
+            "id": doc.id,
+            "name": f"Dr. {doc.user.get_full_name() or doc.user.username}",
+            "specialization": doc.get_specialization_display(),
+            "specialization_code": doc.specialization,
+        }
+        for doc in doctors
+    ]
+    return json.dumps({"success": True, "doctors": doctors_list}).encode()
+
+
+def _etag(content):
+    return f'"{hashlib.sha256(content).hexdigest()[:32]}"'
+
+
+def get_directory(specialization=""):
+    """DirectoryEntry for the current version, built at most once per version and filter."""
+    if specialization and specialization not in dict(Doctor.SPECIALIZATION_CHOICES):
+        # Unknown codes match nobody; one shared key keeps the caches bounded
+        specialization = "?"
+    version = directory_version()
+    if _ttl() <= 0:
+        content = build_directory(specialization)
+        return DirectoryEntry(content, _etag(content), version)
+
+    local = _get_local_cache()
+    key = (version, specialization)
+    entry = local.get(key)
+    if entry is not None:
+        return entry
+
+    shared_key = ENTRY_KEY.format(version=version, specialization=specialization)
+    content = cache.get(shared_key)
+    if content is None:
+        content = build_directory(specialization)
+        cache.set(shared_key, content, timeout=_ttl())
+    entry = DirectoryEntry(content, _etag(content), version)
+    local.set(key, entry)
+    return entry
@@ -0,0 +1,147 @@
+"""
+Serving AnalysisReport PDFs.
+
+The storage name, size and SHA-256 ETag of a report's PDF are resolved once
+and kept on the row (pdf_size / pdf_etag). After that a download needs no
+storage probing: If-None-Match is answered with 304 from the row alone, the
+transfer is handed to the front server when REPORT_SENDFILE is configured,
+and otherwise the file is opened directly, honouring single byte ranges.
+"""
+import hashlib
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import FileResponse, HttpResponse
+from django.utils.http import parse_etags, quote_etag
+
+from .models import AnalysisReport
+from .reports import report_file_name, store_report_pdf
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+UNSATISFIABLE = "unsatisfiable"
+
+
+def resolve_report_pdf(report):
+    """
+    Storage name of the report's PDF, with pdf_size/pdf_etag filled in (and
+    saved) on first use. Returns None when the report has no PDF.
+    """
+    if report.pdf_etag and report.pdf:
+        return report.pdf.name
+    name = store_report_pdf(report)
+    if not name:
+        return None
+    if not report.pdf_etag:
+        digest, size = hashlib.sha256(), 0
+        with default_storage.open(name, "rb") as f:
+            for chunk in iter(lambda: f.read(64 * 1024), b""):
+                digest.update(chunk)
+                size += len(chunk)
+        report.pdf_etag, report.pdf_size = digest.hexdigest(), size
+        AnalysisReport.objects.filter(pk=report.pk, pdf=name).update(pdf_etag=report.pdf_etag, pdf_size=size)
+    return name
+
+
+def parse_range(header, size):
+    """
+    (start, end) byte offsets, inclusive, for a single ``bytes=`` range;
+    UNSATISFIABLE when it lies outside the file; None to send the whole file
+    (no header, multiple ranges or a malformed header).
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match:
+        return None
+    first, last = match.groups()
+    if first == "":
+        if last == "":
+            return None
+        length = int(last)
+        if length == 0:
+            return UNSATISFIABLE
+        return max(0, size - length), size - 1
+    start = int(first)
+    if start >= size:
+        return UNSATISFIABLE
+    end = int(last) if last else size - 1
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def _not_modified(request, etag):
+    if_none_match = request.META.get("HTTP_IF_NONE_MATCH")
+    if not if_none_match:
+        return False
+    # Weak comparison (RFC 9110 13.1.2)
+    tags = [tag[2:] if tag.startswith("W/") else tag for tag in parse_etags(if_none_match)]
+    return "*" in tags or etag in tags
+
+
+def _sendfile_response(name):
+    backend = getattr(settings, "REPORT_SENDFILE", "")
+    if backend not in ("xsendfile", "x-accel"):
+        return None
+    response = HttpResponse(content_type="application/pdf")
+    if backend == "xsendfile":
+        response["X-Sendfile"] = default_storage.path(name)
+    else:
+        prefix = getattr(settings, "REPORT_SENDFILE_PREFIX", "/protected-media/").rstrip("/")
+        response["X-Accel-Redirect"] = quote(f"{prefix}/{name}")
+    # The front server answers Range requests itself
+    return response
+
+
+def serve_report_pdf(request, report):
+    """
+    Download response for an AnalysisReport's PDF (rendered first if it was
+    deferred), or None when the report has no PDF to serve.
+    """
+    name = resolve_report_pdf(report)
+    if name is None:
+        return None
+    etag = quote_etag(report.pdf_etag)
+
+    if _not_modified(request, etag):
+        response = HttpResponse(status=304)
+    else:
+        response = _sendfile_response(name)
+        if response is None:
+            try:
+                file = default_storage.open(name, "rb")
+            except FileNotFoundError:
+                # The file went away since it was resolved: resolve (or re-render) it again
+                AnalysisReport.objects.filter(pk=report.pk).update(pdf_etag="", pdf_size=None)
+                report.pdf_etag, report.pdf_size = "", None
+                if not report.analysis_data:
+                    return None
+                return serve_report_pdf(request, report)
+
+            size = report.pdf_size
+            byte_range = None
+            if_range = request.META.get("HTTP_IF_RANGE")
+            if not if_range or if_range == etag:
+                byte_range = parse_range(request.META.get("HTTP_RANGE"), size)
+
+            if byte_range is None:
+                response = FileResponse(file, content_type="application/pdf")
+                response["Content-Length"] = str(size)
+            elif byte_range == UNSATISFIABLE:
+                file.close()
+                response = HttpResponse(status=416)
+                response["Content-Range"] = f"bytes */{size}"
+            else:
+                start, end = byte_range
+                file.seek(start)
+                response = HttpResponse(file.read(end - start + 1), status=206, content_type="application/pdf")
+                file.close()
+                response["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+        response["Content-Disposition"] = f'attachment; filename="{report_file_name(report)}"'
+        response["Accept-Ranges"] = "bytes"
+
+    response["ETag"] = etag
+    # Reports are private; browsers revalidate and get a 304 while the file is unchanged
+    response["Cache-Control"] = "private, no-cache"
+    return response
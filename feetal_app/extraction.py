@@ -0,0 +1,348 @@
+"""
+Single-pass medical value extraction engine.
+
+All report patterns are compiled once at import. Extraction makes one pass
+over the text with a combined anchor scanner (the label keywords that every
+labelled pattern starts with, e.g. "age", "bp", "glucose") and runs the
+precompiled patterns only at those positions. Patterns that start with a
+number and end with a unit ("120/80 mmHg", "98.6 F", "32 years old") are
+only consulted as low-priority fallbacks, so they are evaluated lazily when
+a field actually needs them.
+
+The result is identical to the previous pattern-by-pattern search:
+for each field the highest-priority pattern that matches anywhere wins,
+and the BP / blood sugar / temperature validation rounds see the same
+matches in the same order.
+"""
+import hashlib
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+
+# ------------------------- PATTERN TABLES -------------------------
+# Labelled patterns: name -> (regex, [(anchor, offset), ...]). Every match of
+# the regex starts `offset` characters after an occurrence of `anchor`.
+LABEL_PATTERNS = {
+    "age_label": (r"Age[:= ]+(\d+)", [("age", 0)]),
+    "age_is": (r"Age\s+is\s+(\d+)", [("age", 0)]),
+    "age_loose": (r"Age\s*:?\s*(\d+)", [("age", 0)]),
+
+    "systolic_label": (r"Systolic[:= ]+(\d+)", [("systolic", 0)]),
+    "systolic_bp_label": (r"Systolic\s+BP[:= ]+(\d+)", [("systolic", 0)]),
+    "sbp_label": (r"SBP[:= ]+(\d+)", [("bp", -1)]),
+    "systolic_loose": (r"Systolic\s*:?\s*(\d+)", [("systolic", 0)]),
+    "diastolic_label": (r"Diastolic[:= ]+(\d+)", [("diastolic", 0)]),
+    "diastolic_bp_label": (r"Diastolic\s+BP[:= ]+(\d+)", [("diastolic", 0)]),
+    "dbp_label": (r"DBP[:= ]+(\d+)", [("bp", -1)]),
+    "diastolic_loose": (r"Diastolic\s*:?\s*(\d+)", [("diastolic", 0)]),
+    "bp_pair": (r"BP[:= ]+(\d+)[/ ]+(\d+)", [("bp", 0)]),
+    "blood_pressure_pair": (r"Blood\s+Pressure[:= ]+(\d+)[/ ]+(\d+)", [("blood", 0)]),
+
+    "blood_sugar_any": (r"Blood.?Sugar[:= ]+(\d+\.?\d*)", [("blood", 0)]),
+    "blood_sugar_label": (r"Blood\s+Sugar[:= ]+(\d+\.?\d*)", [("blood", 0)]),
+    "blood_sugar_loose": (r"Blood\s+Sugar\s*:?\s*(\d+\.?\d*)", [("blood", 0)]),
+    "blood_glucose_label": (r"Blood\s+Glucose[:= ]+(\d+\.?\d*)", [("blood", 0)]),
+    "bs_label": (r"BS[:= ]+(\d+\.?\d*)", [("bs", 0)]),
+    "bs_loose": (r"BS\s*:?\s*(\d+\.?\d*)", [("bs", 0)]),
+    "glucose_label": (r"Glucose[:= ]+(\d+\.?\d*)", [("glucose", 0)]),
+    "fasting_glucose_label": (r"Fasting\s+Glucose[:= ]+(\d+\.?\d*)", [("fasting", 0)]),
+    "random_glucose_label": (r"Random\s+Glucose[:= ]+(\d+\.?\d*)", [("random", 0)]),
+
+    "heart_rate_any": (
+        r"(?:Heart.?Rate|Pulse|HR)[:= ]+(\d+)",
+        [("heart", 0), ("pulse", 0), ("hr", 0)],
+    ),
+    "heart_rate_label": (r"Heart\s+Rate[:= ]+(\d+)", [("heart", 0)]),
+    "pulse_label": (r"Pulse[:= ]+(\d+)", [("pulse", 0)]),
+    "hr_label": (r"HR[:= ]+(\d+)", [("hr", 0)]),
+
+    "temp_any": (
+        r"(?:Temperature|Temp|Body\s+Temp)[:= ]+(\d+\.?\d*)",
+        [("temp", 0), ("body", 0)],
+    ),
+    "temp_label": (r"Temp[:= ]+(\d+\.?\d*)", [("temp", 0)]),
+    "temperature_label": (r"Temperature[:= ]+(\d+\.?\d*)", [("temp", 0)]),
+    "body_temp_label": (r"Body\s+Temp[:= ]+(\d+\.?\d*)", [("body", 0)]),
+}
+
+# Number-first patterns (value precedes a unit/keyword), evaluated lazily.
+UNIT_PATTERNS = {
+    "years_old": r"(\d+)\s+years?\s+old",
+    "mmhg_pair": r"(\d+)[/ ]+(\d+)\s*mmHg",
+    "bp_suffix_pair": r"(\d+)\s*/\s*(\d+)\s*BP",
+    "fahrenheit_short": r"(\d+\.?\d*)\s*°?\s*F",
+    "fahrenheit_long": r"(\d+\.?\d*)\s*°?\s*Fahrenheit",
+}
+
+# Field -> patterns in priority order, as (pattern name, capture group).
+FIELD_RULES = {
+    "age": [("age_label", 1), ("age_is", 1), ("years_old", 1), ("age_loose", 1)],
+    "systolic_bp": [
+        ("systolic_label", 1), ("systolic_bp_label", 1), ("sbp_label", 1),
+        ("systolic_loose", 1), ("bp_pair", 1), ("blood_pressure_pair", 1),
+        ("mmhg_pair", 1),
+    ],
+    "diastolic_bp": [
+        ("diastolic_label", 1), ("diastolic_bp_label", 1), ("dbp_label", 1),
+        ("diastolic_loose", 1), ("bp_pair", 2), ("blood_pressure_pair", 2),
+        ("mmhg_pair", 2),
+    ],
+    "bs": [
+        ("blood_sugar_any", 1), ("bs_label", 1), ("glucose_label", 1),
+        ("blood_sugar_loose", 1), ("bs_loose", 1), ("fasting_glucose_label", 1),
+        ("random_glucose_label", 1),
+    ],
+    "heart_rate": [
+        ("heart_rate_any", 1), ("heart_rate_label", 1), ("pulse_label", 1), ("hr_label", 1),
+    ],
+    "body_temp": [("temp_any", 1), ("temp_label", 1), ("temperature_label", 1)],
+}
+
+# Validation rounds run after the first pass
+BP_FALLBACK = ["bp_pair", "blood_pressure_pair", "mmhg_pair", "bp_suffix_pair"]
+BS_FALLBACK = [
+    "blood_sugar_label", "glucose_label", "bs_label",
+    "fasting_glucose_label", "random_glucose_label", "blood_glucose_label",
+]
+TEMP_FALLBACK = [
+    "temperature_label", "temp_label", "body_temp_label",
+    "fahrenheit_short", "fahrenheit_long",
+]
+
+# Changes whenever a pattern or priority changes (used as a cache version key)
+PATTERN_SET_VERSION = hashlib.sha256(
+    repr((LABEL_PATTERNS, UNIT_PATTERNS, FIELD_RULES, BP_FALLBACK, BS_FALLBACK, TEMP_FALLBACK)).encode()
+).hexdigest()[:16]
+
+
+def _compile_set(lowercase):
+    """
+    Compile every pattern once. The lowercase set runs without IGNORECASE
+    on text that has been lower-cased (ASCII only), which lets the regex
+    engine use literal-prefix scanning; the other set is for non-ASCII text.
+    """
+    flags = 0 if lowercase else re.IGNORECASE
+    prep = str.lower if lowercase else (lambda p: p)
+
+    anchors = {}
+    labels = {}
+    for name, (regex, anchor_list) in LABEL_PATTERNS.items():
+        labels[name] = re.compile(prep(regex), flags)
+        for anchor, offset in anchor_list:
+            anchors.setdefault(anchor, []).append((name, offset))
+
+    # Longest anchors first; anchors never share a start position.
+    anchor_re = re.compile(
+        "(?=(" + "|".join(sorted(anchors, key=len, reverse=True)) + "))", flags
+    )
+    units = {name: re.compile(prep(regex), flags) for name, regex in UNIT_PATTERNS.items()}
+    return anchor_re, anchors, labels, units
+
+
+_LOWER_SET = _compile_set(lowercase=True)
+_IGNORECASE_SET = _compile_set(lowercase=False)
+
+
+# ------------------------- SCANNER -------------------------
+class _ReportScan:
+    """Matches of every pattern in one text, collected in a single anchor pass."""
+
+    def __init__(self, text):
+        if text.isascii():
+            self.text = text.lower()
+            anchor_re, self.anchors, self.labels, self.units = _LOWER_SET
+        else:
+            self.text = text
+            anchor_re, self.anchors, self.labels, self.units = _IGNORECASE_SET
+
+        # name -> list of match objects in start order (all positions)
+        self._matches = {name: [] for name in self.labels}
+        self._unit_cache = {}
+
+        text_ = self.text
+        for hit in anchor_re.finditer(text_):
+            pos = hit.start()
+            for name, offset in self._anchor_patterns(hit.group(1)):
+                start = pos + offset
+                if start < 0:
+                    continue
+                m = self.labels[name].match(text_, start)
+                if m:
+                    self._matches[name].append(m)
+
+    def _anchor_patterns(self, matched):
+        found = self.anchors.get(matched) or self.anchors.get(matched.casefold())
+        if found is None:
+            # Other Unicode case-equivalents (only reachable on non-ASCII text)
+            for anchor, patterns in self.anchors.items():
+                if re.fullmatch(anchor, matched, re.IGNORECASE):
+                    return patterns
+            return []
+        return found
+
+    def first(self, name):
+        """Equivalent of re.search(pattern, text)."""
+        if name in self._matches:
+            found = self._matches[name]
+            return found[0] if found else None
+        if name not in self._unit_cache:
+            self._unit_cache[name] = self.units[name].search(self.text)
+        return self._unit_cache[name]
+
+    def iter(self, name):
+        """Equivalent of re.finditer(pattern, text) (non-overlapping matches)."""
+        if name not in self._matches:
+            yield from self.units[name].finditer(self.text)
+            return
+        end = 0
+        for m in self._matches[name]:
+            if m.start() >= end:
+                yield m
+                end = m.end()
+
+
+# ------------------------- EXTRACTION -------------------------
+def extract_values_from_text(text):
+    """
+    Extract age, BP, blood sugar, heart rate and temperature from report text.
+    Returns the same dict as the original regex extractor (missing values are 0).
+    """
+    scan = _ReportScan(text)
+
+    extracted = {}
+    for field, rules in FIELD_RULES.items():
+        value = 0
+        for name, group in rules:
+            m = scan.first(name)
+            if m:
+                try:
+                    value = float(m.group(group))
+                    break
+                except (ValueError, IndexError):
+                    continue
+        extracted[field] = value
+
+    logger.debug(f"Initial extracted values: {extracted}")
+
+    # 0. Blood sugar in mmol/L (typically 4-25) -> mg/dL
+    bs_value = extracted.get("bs", 0)
+    if 0 < bs_value < 30:
+        extracted["bs"] = bs_value * 18.0182
+        logger.debug(f"Converted BS from {bs_value} mmol/L to {extracted['bs']:.1f} mg/dL")
+
+    # 1. BP in combined "120/80" format
+    if extracted.get("systolic_bp", 0) == 0 or extracted.get("diastolic_bp", 0) == 0:
+        for name in BP_FALLBACK:
+            m = scan.first(name)
+            if m:
+                try:
+                    sys_val = float(m.group(1))
+                    dia_val = float(m.group(2))
+                    if 80 <= sys_val <= 250 and 40 <= dia_val <= 150:
+                        extracted["systolic_bp"] = sys_val
+                        extracted["diastolic_bp"] = dia_val
+                        break
+                except (ValueError, IndexError):
+                    continue
+
+    # 2. Blood sugar should be 50-500 mg/dL
+    if extracted.get("bs", 0) < 50:
+        for name in BS_FALLBACK:
+            for m in scan.iter(name):
+                try:
+                    bs_val = float(m.group(1))
+                    if 50 <= bs_val <= 500:
+                        extracted["bs"] = bs_val
+                        break
+                except (ValueError, IndexError):
+                    continue
+            if extracted.get("bs", 0) >= 50:
+                break
+
+    # 3. Body temperature should be 90-110 °F
+    if extracted.get("body_temp", 0) < 90 or extracted.get("body_temp", 0) > 110:
+        for name in TEMP_FALLBACK:
+            for m in scan.iter(name):
+                try:
+                    temp_val = float(m.group(1))
+                    if 90 <= temp_val <= 110:
+                        extracted["body_temp"] = temp_val
+                        break
+                except (ValueError, IndexError):
+                    continue
+            if 90 <= extracted.get("body_temp", 0) <= 110:
+                break
+
+    return extracted
+
+
+# ------------------------- INCREMENTAL (PAGE-BY-PAGE) EXTRACTION -------------------------
+# Vital -> whether an extracted value is one the validation rounds would accept
+VITAL_CHECKS = {
+    "age": lambda values: values.get("age", 0) > 0,
+    "systolic_bp": lambda values: values.get("systolic_bp", 0) > 0,
+    "diastolic_bp": lambda values: values.get("diastolic_bp", 0) > 0,
+    "bs": lambda values: values.get("bs", 0) >= 50,
+    "heart_rate": lambda values: values.get("heart_rate", 0) > 0,
+    "body_temp": lambda values: 90 <= values.get("body_temp", 0) <= 110,
+}
+
+
+def has_all_vitals(values):
+    """True once every vital has a value the validation rounds would accept."""
+    return bool(values) and all(check(values) for check in VITAL_CHECKS.values())
+
+
+class IncrementalExtractor:
+    """
+    Feed report text one page at a time and stop reading as soon as
+    ``complete`` is True. result() always matches extract_values_from_text()
+    over the pages fed so far.
+
+    Each page is scanned on its own, and only for as long as some vital has
+    not been seen, so reading n pages costs one pass over them instead of
+    one pass per page over everything before it. When every vital has been
+    seen, the whole text is extracted once to apply the priority rules
+    across pages; result() does the same at the end.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._missing = set(VITAL_CHECKS)
+        self._full = None  # (chunks extracted, values) of the last whole-text extraction
+        self.pages_fed = 0
+
+    @property
+    def text(self):
+        return "".join(self._chunks)
+
+    @property
+    def values(self):
+        if self._full and self._full[0] == len(self._chunks):
+            return self._full[1]
+        return None
+
+    @property
+    def complete(self):
+        return not self._missing and has_all_vitals(self.values)
+
+    def feed(self, page_text):
+        """Add one page of text; returns True once all vitals are present."""
+        self.pages_fed += 1
+        if page_text:
+            self._chunks.append(page_text + "\n")
+            if self._missing:
+                page_values = extract_values_from_text(page_text)
+                self._missing = {field for field in self._missing if not VITAL_CHECKS[field](page_values)}
+                if not self._missing:
+                    values = self.result()
+                    # A higher-priority match elsewhere can still win with an unusable value
+                    self._missing = {field for field, check in VITAL_CHECKS.items() if not check(values)}
+        return self.complete
+
+    def result(self):
+        if self.values is None:
+            self._full = (len(self._chunks), extract_values_from_text(self.text))
+        return self._full[1]
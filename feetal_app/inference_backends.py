@@ -0,0 +1,109 @@
+"""
+Lightweight CPU runtimes for the preterm CNN.
+
+Only forward passes are needed at serving time, so instead of importing all
+of TensorFlow and Keras the model can be converted once
+(``python manage.py convert_preterm_model``) and run through TFLite or
+ONNX Runtime. The wrappers expose the same ``predict(batch, verbose=0)``
+call as a Keras model, so the micro-batcher, warm-up and model server use
+them unchanged.
+"""
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+PRETERM_BACKENDS = ("keras", "tflite", "onnx")
+BACKEND_EXTENSIONS = {"tflite": ".tflite", "onnx": ".onnx"}
+
+
+def _tflite_interpreter_class():
+    """Prefer the standalone runtimes; fall back to the one bundled with TensorFlow."""
+    try:
+        from tflite_runtime.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        pass
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        pass
+    import tensorflow as tf
+    return tf.lite.Interpreter
+
+
+class TFLitePretermModel:
+    """TFLite interpreter with float or int8 (quantized) input/output tensors."""
+
+    backend = "tflite"
+
+    def __init__(self, path, num_threads=None):
+        self.path = str(path)
+        self._interpreter = _tflite_interpreter_class()(model_path=self.path, num_threads=num_threads)
+        self._interpreter.allocate_tensors()
+        self._input = self._interpreter.get_input_details()[0]
+        self._output = self._interpreter.get_output_details()[0]
+        self._batch_size = int(self._input["shape"][0])
+        # The interpreter keeps per-call state, so calls are serialized
+        self._lock = threading.Lock()
+
+    def _resize(self, batch_size):
+        if batch_size != self._batch_size:
+            shape = [batch_size] + [int(d) for d in self._input["shape"][1:]]
+            self._interpreter.resize_tensor_input(self._input["index"], shape)
+            self._interpreter.allocate_tensors()
+            self._input = self._interpreter.get_input_details()[0]
+            self._output = self._interpreter.get_output_details()[0]
+            self._batch_size = batch_size
+
+    def predict(self, batch, verbose=0):
+        import numpy as np
+
+        batch = np.asarray(batch, dtype=np.float32)
+        with self._lock:
+            self._resize(len(batch))
+            dtype = self._input["dtype"]
+            scale, zero_point = self._input.get("quantization", (0.0, 0))
+            if dtype in (np.int8, np.uint8) and scale:
+                info = np.iinfo(dtype)
+                batch = np.clip(np.round(batch / scale + zero_point), info.min, info.max).astype(dtype)
+            self._interpreter.set_tensor(self._input["index"], batch)
+            self._interpreter.invoke()
+            output = self._interpreter.get_tensor(self._output["index"]).copy()
+
+            scale, zero_point = self._output.get("quantization", (0.0, 0))
+        if output.dtype in (np.int8, np.uint8) and scale:
+            output = (output.astype(np.float32) - zero_point) * scale
+        return output.astype(np.float32)
+
+
+class OnnxPretermModel:
+    """ONNX Runtime session on the CPU execution provider."""
+
+    backend = "onnx"
+
+    def __init__(self, path, num_threads=None):
+        import onnxruntime as ort
+
+        self.path = str(path)
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = int(num_threads)
+        self._session = ort.InferenceSession(self.path, options, providers=["CPUExecutionProvider"])
+        self._input_name = self._session.get_inputs()[0].name
+
+    def predict(self, batch, verbose=0):
+        import numpy as np
+
+        batch = np.asarray(batch, dtype=np.float32)
+        return np.asarray(self._session.run(None, {self._input_name: batch})[0], dtype=np.float32)
+
+
+def load_preterm_backend(backend, path, num_threads=None):
+    """Open a converted preterm CNN artifact with the runtime for ``backend``."""
+    if backend == "tflite":
+        return TFLitePretermModel(path, num_threads=num_threads)
+    if backend == "onnx":
+        return OnnxPretermModel(path, num_threads=num_threads)
+    raise ValueError(f"Unsupported preterm backend: {backend}")
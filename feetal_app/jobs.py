@@ -0,0 +1,296 @@
+"""
+Database-backed job queue for combined analyses.
+
+combined_analysis_api persists the uploads to default_storage, inserts an
+AnalysisJob row and returns its job ID straight away. Workers claim queued
+rows with a conditional UPDATE (so two workers never run the same job, on
+SQLite as well as PostgreSQL), run analysis.run_combined_analysis and record
+progress on the row, which the status endpoint reports.
+
+Workers run as a thread pool inside each web process (ANALYSIS_JOB_WORKERS)
+or as a separate process: ``python manage.py run_analysis_worker``.
+"""
+import logging
+import os
+import shutil
+import socket
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, connection
+from django.db.models import F
+from django.utils import timezone
+
+from .models import AnalysisJob
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_ROOT = "analysis_jobs"
+# Session key listing the job IDs this browser uploaded (newest last)
+SESSION_JOBS_KEY = "analysis_jobs"
+SESSION_JOBS_LIMIT = 20
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+# ------------------------- ENQUEUE -------------------------
+def _save_uploads(job_id, kind, files):
+    names = []
+    for f in files:
+        name = default_storage.get_valid_name(os.path.basename(f.name or "upload"))
+        names.append(default_storage.save(f"{UPLOAD_ROOT}/{job_id}/{kind}/{name}", f))
+    return names
+
+
+def enqueue_combined_analysis(scanning_files, medical_files, patient_name, patient_email):
+    """Persist the uploads and queue a combined analysis; returns the AnalysisJob."""
+    job = AnalysisJob(patient_name=patient_name, patient_email=patient_email)
+    job.scanning_files = _save_uploads(job.job_id, "scans", scanning_files)
+    job.medical_files = _save_uploads(job.job_id, "reports", medical_files)
+    job.save()
+
+    pool = get_worker_pool()
+    if pool is not None:
+        pool.notify()
+    return job
+
+
+def remember_job(request, job):
+    """Let this session read the job's status (see can_view_job)."""
+    jobs = [j for j in request.session.get(SESSION_JOBS_KEY, []) if j != str(job.job_id)]
+    jobs.append(str(job.job_id))
+    request.session[SESSION_JOBS_KEY] = jobs[-SESSION_JOBS_LIMIT:]
+
+
+def can_view_job(request, job):
+    """Only the uploader may read a job: the session that queued it, or the patient signed in with its email."""
+    if str(job.job_id) in request.session.get(SESSION_JOBS_KEY, []):
+        return True
+    user = request.user
+    return bool(
+        user.is_authenticated and job.patient_email and user.email
+        and user.email.lower() == job.patient_email.lower()
+    )
+
+
+def delete_uploads(job):
+    for name in list(job.scanning_files) + list(job.medical_files):
+        try:
+            default_storage.delete(name)
+        except Exception as e:
+            logger.warning(f"Could not delete job upload {name}: {str(e)}")
+    # FileSystemStorage leaves the per-job directories behind
+    try:
+        shutil.rmtree(default_storage.path(f"{UPLOAD_ROOT}/{job.job_id}"), ignore_errors=True)
+    except NotImplementedError:
+        pass
+
+
+# ------------------------- CLAIM & RUN -------------------------
+def requeue_stale_jobs():
+    """
+    Put back jobs whose worker stopped reporting progress (e.g. the process
+    was killed mid-analysis); jobs out of attempts are marked failed.
+    """
+    cutoff = timezone.now() - timedelta(seconds=getattr(settings, "ANALYSIS_JOB_STALE_SECONDS", 600))
+    max_attempts = getattr(settings, "ANALYSIS_JOB_MAX_ATTEMPTS", 2)
+    stale = AnalysisJob.objects.filter(status=AnalysisJob.STATUS_RUNNING, updated_at__lt=cutoff)
+    stale.filter(attempts__lt=max_attempts).update(
+        status=AnalysisJob.STATUS_QUEUED, stage="Requeued", worker="", updated_at=timezone.now()
+    )
+    stale.filter(attempts__gte=max_attempts).update(
+        status=AnalysisJob.STATUS_FAILED,
+        error="The analysis did not finish. Please try again.",
+        error_status=500,
+        finished_at=timezone.now(),
+        updated_at=timezone.now(),
+    )
+
+
+def claim_next_job(worker_name):
+    """Atomically move the oldest queued job to running and return it (or None)."""
+    while True:
+        candidate = (
+            AnalysisJob.objects.filter(status=AnalysisJob.STATUS_QUEUED)
+            .order_by("created_at")
+            .values_list("pk", flat=True)
+            .first()
+        )
+        if candidate is None:
+            return None
+        now = timezone.now()
+        claimed = AnalysisJob.objects.filter(pk=candidate, status=AnalysisJob.STATUS_QUEUED).update(
+            status=AnalysisJob.STATUS_RUNNING,
+            worker=worker_name,
+            attempts=F("attempts") + 1,
+            progress=0,
+            stage="Starting",
+            started_at=now,
+            updated_at=now,
+        )
+        if claimed:
+            return AnalysisJob.objects.get(pk=candidate)
+        # Another worker won the race; try the next one
+
+
+def _update(job, **fields):
+    fields["updated_at"] = timezone.now()
+    AnalysisJob.objects.filter(pk=job.pk).update(**fields)
+
+
+def run_job(job):
+    """Run one claimed job to completion, recording the outcome on its row."""
+    from .analysis import AnalysisError, run_combined_analysis
+
+    files = []
+    try:
+        scanning = [default_storage.open(name, "rb") for name in job.scanning_files]
+        medical = [default_storage.open(name, "rb") for name in job.medical_files]
+        files = scanning + medical
+
+        report = run_combined_analysis(
+            scanning,
+            medical,
+            job.patient_name,
+            job.patient_email,
+            progress=lambda percent, stage: _update(job, progress=percent, stage=stage),
+        )
+        _update(
+            job,
+            status=AnalysisJob.STATUS_COMPLETED,
+            progress=100,
+            stage="Completed",
+            report=report,
+            finished_at=timezone.now(),
+        )
+    except AnalysisError as e:
+        _update(
+            job,
+            status=AnalysisJob.STATUS_FAILED,
+            stage="Failed",
+            error=e.message,
+            error_status=e.status,
+            finished_at=timezone.now(),
+        )
+    except Exception as e:
+        # The row is read by the patient: the traceback only goes to the log
+        logger.error(f"Analysis job {job.job_id} failed: {str(e)}\n{traceback.format_exc()}")
+        _update(
+            job,
+            status=AnalysisJob.STATUS_FAILED,
+            stage="Failed",
+            error="An error occurred while running combined analysis.",
+            error_status=500,
+            finished_at=timezone.now(),
+        )
+    finally:
+        for f in files:
+            f.close()
+
+    delete_uploads(job)
+
+
+# ------------------------- WORKER POOL -------------------------
+class JobWorkerPool:
+    """``num_workers`` threads that poll the queue; notify() wakes them for a new job."""
+
+    def __init__(self, num_workers=2, poll_interval=2.0, name="analysis"):
+        self.num_workers = max(1, int(num_workers))
+        self.poll_interval = float(poll_interval)
+        self.name = name
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        self.jobs_run = 0
+        self._lock = threading.Lock()
+
+    def start(self):
+        for i in range(self.num_workers):
+            thread = threading.Thread(target=self._run, args=(i,), name=f"{self.name}-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def notify(self):
+        self._wakeup.set()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def join(self):
+        for thread in self._threads:
+            thread.join()
+
+    def _run(self, index):
+        worker_name = f"{socket.gethostname()}:{os.getpid()}:{index}"
+        try:
+            while not self._stop.is_set():
+                close_old_connections()
+                job = None
+                try:
+                    if index == 0:
+                        requeue_stale_jobs()
+                    job = claim_next_job(worker_name)
+                    if job is not None:
+                        run_job(job)
+                        with self._lock:
+                            self.jobs_run += 1
+                except Exception as e:
+                    logger.error(f"{worker_name}: job loop error: {str(e)}")
+                if job is None:
+                    self._wakeup.wait(self.poll_interval)
+                    self._wakeup.clear()
+        finally:
+            connection.close()
+
+    def stats(self):
+        with self._lock:
+            return {"workers": self.num_workers, "alive": sum(t.is_alive() for t in self._threads), "jobs_run": self.jobs_run}
+
+
+def get_worker_pool():
+    """
+    The in-process worker pool, started on first use in each process, or None
+    when ANALYSIS_JOB_WORKERS is 0 (jobs are then run by run_analysis_worker).
+    wsgi.py/asgi.py call it at boot (ANALYSIS_JOB_WORKERS_ON_STARTUP) so jobs
+    left queued or running by a restart are picked up without a new upload.
+    """
+    global _pool
+    num_workers = getattr(settings, "ANALYSIS_JOB_WORKERS", 2)
+    if num_workers <= 0:
+        return None
+    if _pool is None or getattr(_pool, "pid", None) != os.getpid():
+        with _pool_lock:
+            if _pool is None or getattr(_pool, "pid", None) != os.getpid():
+                pool = JobWorkerPool(num_workers, getattr(settings, "ANALYSIS_JOB_POLL_SECONDS", 2.0))
+                pool.pid = os.getpid()
+                _pool = pool.start()
+    return _pool
+
+
+def job_status(job):
+    """JSON-serializable status of an AnalysisJob for the status endpoint."""
+    from django.urls import reverse
+
+    data = {
+        "job_id": str(job.job_id),
+        "status": job.status,
+        "progress": job.progress,
+        "stage": job.stage,
+        "created_at": job.created_at.isoformat(),
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+    if job.status == AnalysisJob.STATUS_FAILED:
+        data["message"] = job.error
+    if job.status == AnalysisJob.STATUS_COMPLETED and job.report_id:
+        data["report_id"] = job.report_id
+        data["report_url"] = reverse("feetal_app:download_analysis_report", args=[job.report_id])
+    return data
@@ -0,0 +1,100 @@
+"""
+Benchmark the appointment availability engine (availability.py).
+
+Usage:
+    python manage.py benchmark_availability
+    python manage.py benchmark_availability --doctors 50 --days 31 --repeat 20
+
+Times available_slots() for every active doctor over ``--days`` days from
+today. With ``--doctors N`` that many synthetic doctors (weekday schedules
+09:00-12:00 and 14:00-17:00, about half of their slots booked) are created
+first inside a transaction that is rolled back afterwards, so nothing is
+left in the database.
+"""
+import random
+import statistics
+import time
+from datetime import datetime, time as dtime, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from feetal_app.availability import WEEKDAYS, available_slots, slot_minutes
+from feetal_app.models import Appointment, Doctor, DoctorSchedule
+
+WINDOWS = ((dtime(9, 0), dtime(12, 0)), (dtime(14, 0), dtime(17, 0)))
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Time the month-wide availability view for all doctors."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--doctors", type=int, default=0, help="Synthetic doctors to add (rolled back)")
+        parser.add_argument("--days", type=int, default=31, help="Days in the range (default: 31)")
+        parser.add_argument("--repeat", type=int, default=10, help="Timed runs (default: 10)")
+        parser.add_argument("--seed", type=int, default=0, help="Random seed for synthetic bookings")
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                if options["doctors"]:
+                    self._seed(options["doctors"], options["days"], random.Random(options["seed"]))
+                self._run(options["days"], max(1, options["repeat"]))
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _seed(self, count, days, rng):
+        User = get_user_model()
+        today = timezone.localdate()
+        step = timedelta(minutes=slot_minutes())
+        for i in range(count):
+            user = User.objects.create_user(username=f"benchmark-doctor-{i}", password=None)
+            doctor = Doctor.objects.create(user=user, phone="0000000000", specialization="obgyn")
+            DoctorSchedule.objects.bulk_create(
+                DoctorSchedule(doctor=doctor, day=day, start_time=start, end_time=end)
+                for day in WEEKDAYS[:5] for start, end in WINDOWS
+            )
+            bookings = []
+            for offset in range(days):
+                day = today + timedelta(days=offset)
+                for start, end in WINDOWS:
+                    at = datetime.combine(day, start)
+                    while at.time() < end:
+                        if rng.random() < 0.5:
+                            bookings.append(Appointment(
+                                doctor=doctor, patient_name="Benchmark", patient_email="benchmark@example.com",
+                                patient_phone="0000000000", appointment_date=day, appointment_time=at.time(),
+                                reason="consultation", status=rng.choice(("pending", "confirmed", "cancelled")),
+                            ))
+                        at += step
+            Appointment.objects.bulk_create(bookings)
+
+    def _run(self, days, repeat):
+        start = timezone.localdate()
+        end = start + timedelta(days=days - 1)
+        doctor_ids = list(Doctor.objects.filter(user__is_active=True).values_list("id", flat=True))
+
+        with CaptureQueriesContext(connection) as queries:
+            result = available_slots(doctor_ids, start, end)
+        slots = sum(len(s) for by_date in result.values() for s in by_date.values())
+
+        timings = []
+        for _ in range(repeat):
+            began = time.perf_counter()
+            available_slots(doctor_ids, start, end)
+            timings.append((time.perf_counter() - began) * 1000)
+
+        self.stdout.write(
+            f"{len(doctor_ids)} doctor(s), {start} to {end}: {slots} free slot(s), {len(queries)} queries"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"median {statistics.median(timings):.1f} ms, max {max(timings):.1f} ms over {repeat} run(s)"
+        ))
@@ -0,0 +1,304 @@
+"""
+Benchmark the single-pass report extractor against the previous
+pattern-by-pattern implementation.
+
+Usage:
+    python manage.py benchmark_extraction
+    python manage.py benchmark_extraction --reports 200 --pages 30 --repeat 5
+    python manage.py benchmark_extraction --corpus path/to/reports/
+
+Every report is extracted with both implementations; the command fails if
+any result differs.
+"""
+import os
+import random
+import re
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from feetal_app.extraction import extract_values_from_text
+
+
+def legacy_extract_values_from_text(text):
+    """Reference copy of the regex extractor that extraction.py replaced."""
+    # Value extractor using regex - try multiple patterns for each value
+    def extract(pattern, default=0, patterns=None):
+        if patterns:
+            # Try multiple patterns
+            for pat in patterns:
+                match = re.search(pat, text, re.IGNORECASE)
+                if match:
+                    try:
+                        return float(match.group(1))
+                    except (ValueError, IndexError):
+                        continue
+        else:
+            # Single pattern
+            match = re.search(pattern, text, re.IGNORECASE)
+            if match:
+                try:
+                    return float(match.group(1))
+                except (ValueError, IndexError):
+                    pass
+        return default
+
+    extracted = {
+        # Age - try multiple formats
+        "age": extract(None, 0, [
+            r"Age[:= ]+(\d+)",
+            r"Age\s+is\s+(\d+)",
+            r"(\d+)\s+years?\s+old",
+            r"Age\s*:?\s*(\d+)",
+        ]),
+        # Systolic BP - try multiple formats including combined BP format
+        "systolic_bp": extract(None, 0, [
+            r"Systolic[:= ]+(\d+)",
+            r"Systolic\s+BP[:= ]+(\d+)",
+            r"SBP[:= ]+(\d+)",
+            r"Systolic\s*:?\s*(\d+)",
+            r"BP[:= ]+(\d+)[/ ]+(\d+)",  # BP: 120/80 - capture first number
+            r"Blood\s+Pressure[:= ]+(\d+)[/ ]+(\d+)",  # Blood Pressure: 120/80
+            r"(\d+)[/ ]+(\d+)\s*mmHg",  # 120/80 mmHg
+        ]),
+        # Diastolic BP - try multiple formats including combined BP format
+        "diastolic_bp": extract(None, 0, [
+            r"Diastolic[:= ]+(\d+)",
+            r"Diastolic\s+BP[:= ]+(\d+)",
+            r"DBP[:= ]+(\d+)",
+            r"Diastolic\s*:?\s*(\d+)",
+            r"BP[:= ]+\d+[/ ]+(\d+)",  # BP: 120/80 - capture second number
+            r"Blood\s+Pressure[:= ]+\d+[/ ]+(\d+)",  # Blood Pressure: 120/80
+            r"\d+[/ ]+(\d+)\s*mmHg",  # 120/80 mmHg
+        ]),
+        # Blood Sugar - try multiple formats
+        "bs": extract(None, 0, [
+            r"Blood.?Sugar[:= ]+(\d+\.?\d*)",
+            r"BS[:= ]+(\d+\.?\d*)",
+            r"Glucose[:= ]+(\d+\.?\d*)",
+            r"Blood\s+Sugar\s*:?\s*(\d+\.?\d*)",
+            r"BS\s*:?\s*(\d+\.?\d*)",
+            r"Fasting\s+Glucose[:= ]+(\d+\.?\d*)",
+            r"Random\s+Glucose[:= ]+(\d+\.?\d*)",
+        ]),
+        # Heart Rate - try multiple formats
+        "heart_rate": extract(None, 0, [
+            r"(?:Heart.?Rate|Pulse|HR)[:= ]+(\d+)",
+            r"Heart\s+Rate[:= ]+(\d+)",
+            r"Pulse[:= ]+(\d+)",
+            r"HR[:= ]+(\d+)",
+        ]),
+        # Body Temperature - try multiple formats
+        "body_temp": extract(None, 0, [
+            r"(?:Temperature|Temp|Body\s+Temp)[:= ]+(\d+\.?\d*)",
+            r"Temp[:= ]+(\d+\.?\d*)",
+            r"Temperature[:= ]+(\d+\.?\d*)",
+        ]),
+    }
+
+    # Post-processing: Fix common extraction issues and convert units
+
+    # 0. Convert Blood Sugar from mmol/L to mg/dL if needed (Excel/CSV format often uses mmol/L)
+    bs_value = extracted.get("bs", 0)
+    if bs_value > 0 and bs_value < 30:  # Likely in mmol/L (range 4-25), convert to mg/dL
+        # Formula: mg/dL = mmol/L × 18.0182
+        # Example: 15 mmol/L = 270.27 mg/dL (high risk!)
+        bs_mgdl = bs_value * 18.0182
+        extracted["bs"] = bs_mgdl
+
+    # 1. Check for BP in "120/80" format (most common)
+    if extracted.get("systolic_bp", 0) == 0 or extracted.get("diastolic_bp", 0) == 0:
+        bp_patterns = [
+            r"BP[:= ]+(\d+)[/ ]+(\d+)",  # BP: 120/80
+            r"Blood\s+Pressure[:= ]+(\d+)[/ ]+(\d+)",  # Blood Pressure: 120/80
+            r"(\d+)[/ ]+(\d+)\s*mmHg",  # 120/80 mmHg
+            r"(\d+)\s*/\s*(\d+)\s*BP",  # 120 / 80 BP
+        ]
+        for pattern in bp_patterns:
+            match = re.search(pattern, text, re.IGNORECASE)
+            if match:
+                try:
+                    sys_val = float(match.group(1))
+                    dia_val = float(match.group(2))
+                    # Validate reasonable BP values (typically 90-200 for systolic, 50-120 for diastolic)
+                    if 80 <= sys_val <= 250 and 40 <= dia_val <= 150:
+                        extracted["systolic_bp"] = sys_val
+                        extracted["diastolic_bp"] = dia_val
+                        break
+                except (ValueError, IndexError):
+                    continue
+
+    # 2. Validate and fix Blood Sugar (should be 70-300+ typically)
+    if extracted.get("bs", 0) < 50:
+        # Try alternative patterns that might have been missed
+        bs_patterns = [
+            r"Blood\s+Sugar[:= ]+(\d+\.?\d*)",
+            r"Glucose[:= ]+(\d+\.?\d*)",
+            r"BS[:= ]+(\d+\.?\d*)",
+            r"Fasting\s+Glucose[:= ]+(\d+\.?\d*)",
+            r"Random\s+Glucose[:= ]+(\d+\.?\d*)",
+            r"Blood\s+Glucose[:= ]+(\d+\.?\d*)",
+        ]
+        for pattern in bs_patterns:
+            matches = re.finditer(pattern, text, re.IGNORECASE)
+            for match in matches:
+                try:
+                    bs_val = float(match.group(1))
+                    # Only use if it's a reasonable value (50-500)
+                    if 50 <= bs_val <= 500:
+                        extracted["bs"] = bs_val
+                        break
+                except (ValueError, IndexError):
+                    continue
+            if extracted.get("bs", 0) >= 50:
+                break
+
+    # 3. Validate Body Temperature (should be 95-105°F typically)
+    if extracted.get("body_temp", 0) < 90 or extracted.get("body_temp", 0) > 110:
+        temp_patterns = [
+            r"Temperature[:= ]+(\d+\.?\d*)",
+            r"Temp[:= ]+(\d+\.?\d*)",
+            r"Body\s+Temp[:= ]+(\d+\.?\d*)",
+            r"(\d+\.?\d*)\s*°?\s*F",  # 98.6 F or 98.6°F
+            r"(\d+\.?\d*)\s*°?\s*Fahrenheit",
+        ]
+        for pattern in temp_patterns:
+            matches = re.finditer(pattern, text, re.IGNORECASE)
+            for match in matches:
+                try:
+                    temp_val = float(match.group(1))
+                    # Only use if it's a reasonable value (90-110°F)
+                    if 90 <= temp_val <= 110:
+                        extracted["body_temp"] = temp_val
+                        break
+                except (ValueError, IndexError):
+                    continue
+            if 90 <= extracted.get("body_temp", 0) <= 110:
+                break
+
+    return extracted
+
+
+# ------------------------- SYNTHETIC CORPUS -------------------------
+LAB_TESTS = [
+    "Hemoglobin", "WBC Count", "Platelets", "Creatinine", "Urea", "Sodium",
+    "Potassium", "Chloride", "Bilirubin", "ALT", "AST", "Albumin", "Protein",
+    "Calcium", "Ferritin", "TSH", "HbA1c", "Uric Acid", "Cholesterol",
+]
+
+VITAL_TEMPLATES = [
+    ["Age: {age}", "Systolic: {sbp}", "Diastolic: {dbp}", "Blood Sugar: {bs}",
+     "Heart Rate: {hr}", "Temperature: {temp}"],
+    ["Patient is {age} years old", "BP: {sbp}/{dbp}", "Glucose: {bs}",
+     "Pulse: {hr}", "Temp: {temp} F"],
+    ["Age is {age}", "Blood Pressure: {sbp}/{dbp} mmHg", "Fasting Glucose: {bs_mmol}",
+     "HR: {hr}", "Body Temp: {temp}"],
+    ["AGE {age}", "SBP={sbp}", "DBP={dbp}", "BS: {bs_mmol}", "Heart Rate = {hr}",
+     "{temp}°F"],
+    ["Name: Test Patient", "{sbp} / {dbp} BP", "Random Glucose: {bs}",
+     "Pulse {hr} bpm", "Temperature {temp} Fahrenheit"],
+]
+
+
+def synthetic_report(rng, pages):
+    """One lab report: lab-table noise pages with a vitals block on a random page."""
+    values = {
+        "age": rng.randint(18, 45),
+        "sbp": rng.randint(95, 185),
+        "dbp": rng.randint(55, 115),
+        "bs": rng.randint(70, 320),
+        "bs_mmol": round(rng.uniform(4, 16), 1),
+        "hr": rng.randint(60, 130),
+        "temp": round(rng.uniform(97.0, 102.5), 1),
+    }
+    vitals = [line.format(**values) for line in rng.choice(VITAL_TEMPLATES)]
+    vitals_page = rng.randrange(pages)
+
+    lines = []
+    for page in range(pages):
+        lines.append(f"City Maternity Lab - Page {page + 1} of {pages}")
+        for _ in range(40):
+            test = rng.choice(LAB_TESTS)
+            lines.append(
+                f"{test} {rng.uniform(0.1, 400):.1f} units "
+                f"(ref {rng.randint(1, 50)}-{rng.randint(51, 300)})"
+            )
+        if page == vitals_page:
+            lines.extend(vitals)
+    return "\n".join(lines)
+
+
+def load_corpus(path):
+    """Read .txt/.pdf/.docx reports from a directory into plain text."""
+    texts = []
+    for name in sorted(os.listdir(path)):
+        full_path = os.path.join(path, name)
+        lower = name.lower()
+        if lower.endswith(".txt"):
+            with open(full_path, encoding="utf-8", errors="ignore") as f:
+                texts.append(f.read())
+        elif lower.endswith(".pdf"):
+            import pdfplumber
+            with pdfplumber.open(full_path) as pdf:
+                texts.append("\n".join(page.extract_text() or "" for page in pdf.pages))
+        elif lower.endswith(".docx"):
+            from docx import Document
+            texts.append("\n".join(p.text for p in Document(full_path).paragraphs))
+    return texts
+
+
+class Command(BaseCommand):
+    help = "Benchmark the single-pass medical value extractor against the legacy regex extractor."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reports", type=int, default=100, help="Synthetic reports to generate")
+        parser.add_argument("--pages", type=int, default=30, help="Pages per synthetic report")
+        parser.add_argument("--repeat", type=int, default=3, help="Timing repetitions (best is reported)")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--corpus", help="Directory of real .txt/.pdf/.docx reports to use instead")
+
+    def handle(self, *args, **options):
+        if options["corpus"]:
+            if not os.path.isdir(options["corpus"]):
+                raise CommandError(f"Corpus directory not found: {options['corpus']}")
+            texts = load_corpus(options["corpus"])
+        else:
+            rng = random.Random(options["seed"])
+            texts = [synthetic_report(rng, options["pages"]) for _ in range(options["reports"])]
+
+        if not texts:
+            raise CommandError("No reports to benchmark.")
+
+        mismatches = 0
+        for text in texts:
+            if legacy_extract_values_from_text(text) != extract_values_from_text(text):
+                mismatches += 1
+
+        total_chars = sum(len(t) for t in texts)
+        self.stdout.write(
+            f"Corpus: {len(texts)} reports, {total_chars / len(texts) / 1024:.1f} KiB average"
+        )
+
+        timings = {}
+        for label, fn in (
+            ("legacy", legacy_extract_values_from_text),
+            ("single-pass", extract_values_from_text),
+        ):
+            best = None
+            for _ in range(options["repeat"]):
+                started = time.perf_counter()
+                for text in texts:
+                    fn(text)
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            timings[label] = best
+            self.stdout.write(
+                f"{label:>12}: {best * 1000 / len(texts):8.3f} ms/report "
+                f"({len(texts) / best:8.1f} reports/s)"
+            )
+
+        self.stdout.write(f"     speedup: {timings['legacy'] / timings['single-pass']:.2f}x")
+
+        if mismatches:
+            raise CommandError(f"{mismatches} report(s) extracted differently from the legacy extractor.")
+        self.stdout.write(self.style.SUCCESS("All results identical to the legacy extractor."))
@@ -0,0 +1,278 @@
+"""
+Benchmark combined-report PDF rendering: the previous build_combined_pdf,
+which created every style and static paragraph per report, against the
+cached CombinedReportRenderer.
+
+Usage:
+    python manage.py benchmark_pdf_rendering
+    python manage.py benchmark_pdf_rendering --reports 200 --seed 7
+
+Renders the same batch of synthetic reports (random patients, risk levels
+and 1-4 scans) with both builders, prints reports/second and checks that a
+sample of the PDFs carry identical text (the timestamp lines are ignored).
+"""
+import io
+import random
+import re
+import time
+from xml.sax.saxutils import escape
+
+import pdfplumber
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+
+from feetal_app.reports import CombinedReportRenderer
+
+RISK_LEVELS = ("Low Risk", "Medium Risk", "High Risk")
+FIRST_NAMES = ("Anjali", "Meera", "Fatima", "Priya", "Sara", "Lakshmi", "Neha", "Divya", "Aisha", "Kavya")
+LAST_NAMES = ("Nair", "Menon", "Khan", "Sharma", "Thomas", "Pillai", "Joseph", "Rao", "Iyer", "Das")
+DATE_LINE = re.compile(r"^(Report Date:|Generated automatically).*$", re.MULTILINE)
+
+
+def legacy_build_combined_pdf(
+    patient_name,
+    patient_email,
+    preterm_result,
+    maternal_result,
+    combined_result,
+):
+    """Reference copy of build_combined_pdf before CombinedReportRenderer."""
+    from reportlab.platypus import SimpleDocTemplate, KeepTogether
+    from reportlab.lib.pagesizes import A4
+
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(
+        buffer,
+        pagesize=A4,
+        rightMargin=50,
+        leftMargin=50,
+        topMargin=50,
+        bottomMargin=50,
+    )
+
+    elements = []
+    styles = getSampleStyleSheet()
+
+    # >>> Correct date & time (local timezone)
+    generated_at = timezone.localtime()
+
+    from reportlab.platypus import Paragraph, Table, TableStyle, Spacer
+    from reportlab.lib import colors
+    from reportlab.lib.enums import TA_CENTER
+    from reportlab.lib.units import inch
+
+    hospital_blue = colors.HexColor("#0052CC")
+    text_black = colors.HexColor("#1A1A1A")
+    text_gray = colors.HexColor("#6B7280")
+
+    # ---------------- HEADER ----------------
+    header = Table(
+        [
+            [Paragraph("<b><font size=24 color='white'>FetoScope AI</font></b>",
+                       ParagraphStyle(name="header", alignment=TA_CENTER))]
+        ],
+        colWidths=[7 * inch],
+    )
+    header.setStyle(TableStyle([
+        ("BACKGROUND", (0, 0), (-1, -1), hospital_blue),
+        ("TOPPADDING", (0, 0), (-1, -1), 18),
+        ("BOTTOMPADDING", (0, 0), (-1, -1), 18),
+    ]))
+    elements.append(header)
+    elements.append(Spacer(1, 20))
+
+    # ---------------- PATIENT INFO ----------------
+    elements.append(Paragraph("<b>Patient Information</b>",
+                              ParagraphStyle(name="sec", fontSize=13, textColor=hospital_blue)))
+    elements.append(Spacer(1, 5))
+
+    patient_table = Table([
+        ["Name:", patient_name],
+        ["Email:", patient_email],
+        ["Report Date:", generated_at.strftime("%B %d, %Y | %I:%M %p")],
+    ], colWidths=[1.7 * inch, 4.8 * inch])
+
+    patient_table.setStyle(TableStyle([
+        ("TEXTCOLOR", (0, 0), (-1, -1), text_black),
+        ("FONTNAME", (0, 0), (-1, -1), "Helvetica"),
+        ("FONTSIZE", (0, 0), (-1, -1), 11),
+        ("BOTTOMPADDING", (0, 0), (-1, -1), 8),
+    ]))
+    elements.append(patient_table)
+    elements.append(Spacer(1, 20))
+
+    # ---------------- OVERALL RISK ----------------
+    risk = combined_result.get("risk_level")
+    conf = combined_result.get("confidence")
+
+    risk_color = {
+        "High Risk": "#D90429",
+        "Medium Risk": "#FF8800",
+        "Low Risk": "#0BA82E",
+    }.get(risk, "#000000")
+
+    elements.append(Paragraph(
+        "<b>Overall Risk Assessment</b>",
+        ParagraphStyle(name="sec_title", fontSize=13, textColor=hospital_blue)
+    ))
+    elements.append(Spacer(1, 12))
+
+    risk_section = KeepTogether([
+        Paragraph(
+            f"<b><font size=34 color='{risk_color}'>{risk}</font></b>",
+            ParagraphStyle(name="risk_big", alignment=TA_CENTER, leading=38)
+        ),
+        Spacer(1, 14),
+        Paragraph(
+            f"<b><font size=14 color='{text_black}'>Confidence Level: {conf}%</font></b>",
+            ParagraphStyle(name="risk_conf", alignment=TA_CENTER)
+        )
+    ])
+
+    elements.append(risk_section)
+    elements.append(Spacer(1, 60))  # spacing before next section
+
+    # ---------------- DETAILED ANALYSIS ----------------
+    elements.append(Paragraph(
+        "<b>Detailed Analysis</b>",
+        ParagraphStyle(name="sec2", fontSize=13, textColor=hospital_blue)
+    ))
+    elements.append(Spacer(1, 10))
+
+    pre_r = preterm_result.get("risk_level")
+    pre_p = round(preterm_result.get("probability", 0) * 100, 2)
+    mat_r = maternal_result.get("risk_level")
+    mat_p = round(maternal_result.get("prediction_proba", 0) * 100, 2)
+
+    def risk_color_hex(r):
+        return {
+            "High Risk": "#D90429",
+            "Medium Risk": "#FF8800",
+            "Low Risk": "#0BA82E",
+        }.get(r, "#000000")
+
+    def risk_paragraph(title, risk, prob):
+        return [
+            Paragraph(title, ParagraphStyle(name="cell_title", fontSize=11, textColor=text_black)),
+            Paragraph(f"<b><font color='{risk_color_hex(risk)}'>{risk}</font></b>",
+                    ParagraphStyle(name="cell_risk", fontSize=11, alignment=TA_CENTER)),
+            Paragraph(f"{prob}%" if prob is not None else "-",
+                    ParagraphStyle(name="cell_prob", fontSize=11, alignment=TA_CENTER)),
+        ]
+
+    # One row per scan when several were scored (the preterm row shows the highest-risk scan)
+    scan_rows = []
+    scans = preterm_result.get("scans") or []
+    if len(scans) > 1:
+        for i, scan in enumerate(scans, start=1):
+            label = f"&nbsp;&nbsp;&nbsp;Scan {i}: {escape(scan.get('file_name') or '')}"
+            if scan.get("success"):
+                scan_rows.append(risk_paragraph(label, scan.get("risk_level"), round(scan.get("probability", 0) * 100, 2)))
+            else:
+                scan_rows.append(risk_paragraph(label, "Unreadable", None))
+
+    analysis_table = Table(
+        [
+            [
+                Paragraph("<b><font size=12 color='white'>Analysis Type</font></b>",
+                        ParagraphStyle(name="hdr", alignment=TA_CENTER)),
+                Paragraph("<b><font size=12 color='white'>Risk Level</font></b>",
+                        ParagraphStyle(name="hdr", alignment=TA_CENTER)),
+                Paragraph("<b><font size=12 color='white'>Probability</font></b>",
+                        ParagraphStyle(name="hdr", alignment=TA_CENTER)),
+            ],
+            risk_paragraph("Preterm Delivery (Image-based)", pre_r, pre_p),
+            *scan_rows,
+            risk_paragraph("Maternal Health (Reports-based)", mat_r, mat_p),
+        ],
+        colWidths=[3.7 * inch, 1.9 * inch, 1.1 * inch]
+    )
+
+    analysis_table.setStyle(TableStyle([
+        ("BACKGROUND", (0, 0), (-1, 0), hospital_blue),
+        ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
+        ("ALIGN", (0, 0), (-1, -1), "CENTER"),
+        ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+        ("TOPPADDING", (0, 0), (-1, -1), 10),
+        ("BOTTOMPADDING", (0, 0), (-1, -1), 10),
+    ]))
+    elements.append(analysis_table)
+    elements.append(Spacer(1, 35))
+
+    # ---------------- FOOTER ----------------
+    elements.append(Paragraph(
+        f"Generated automatically by FetoScope AI · {generated_at.strftime('%B %d, %Y %I:%M %p')}",
+        ParagraphStyle(name="foot", fontSize=9, textColor=text_gray, alignment=TA_CENTER)
+    ))
+
+    doc.build(elements)
+    pdf = buffer.getvalue()
+    buffer.close()
+    return pdf
+
+
+def synthetic_report(rng):
+    """Arguments for one build_combined_pdf call."""
+    first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+    scans = []
+    for i in range(rng.randint(1, 4)):
+        name = f"scan_{i + 1}_{rng.randint(1000, 9999)}.jpg"
+        if rng.random() < 0.1:
+            scans.append({"success": False, "error": "cannot identify image file", "file_name": name})
+        else:
+            prob = rng.random()
+            scans.append({
+                "success": True,
+                "probability": prob,
+                "risk_level": RISK_LEVELS[min(2, int(prob * 3))],
+                "file_name": name,
+            })
+    scored = [s for s in scans if s["success"]] or [{"success": True, "probability": 0.0, "risk_level": "Low Risk"}]
+    preterm = dict(max(scored, key=lambda s: s["probability"]), scans=scans)
+
+    maternal_prob = rng.random()
+    maternal = {"success": True, "prediction_proba": maternal_prob, "risk_level": rng.choice(RISK_LEVELS)}
+    combined = {
+        "risk_level": max(preterm["risk_level"], maternal["risk_level"], key=RISK_LEVELS.index),
+        "confidence": int(round((preterm["probability"] + maternal_prob) * 50)),
+    }
+    return (f"{first} {last}", f"{first.lower()}.{last.lower()}@example.com", preterm, maternal, combined)
+
+
+def pdf_text(pdf_bytes):
+    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+        text = "\n".join(page.extract_text() or "" for page in pdf.pages)
+    return DATE_LINE.sub("", text)
+
+
+class Command(BaseCommand):
+    help = "Benchmark combined-report PDF rendering (per-report styles vs cached renderer)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reports", type=int, default=1000, help="Synthetic reports to render")
+        parser.add_argument("--seed", type=int, default=0, help="Random seed for the synthetic batch")
+        parser.add_argument("--check", type=int, default=10, help="Reports whose text is compared")
+
+    def _run(self, build, batch):
+        started = time.perf_counter()
+        for args in batch:
+            build(*args)
+        return len(batch) / (time.perf_counter() - started)
+
+    def handle(self, *args, **options):
+        count = max(1, options["reports"])
+        rng = random.Random(options["seed"])
+        batch = [synthetic_report(rng) for _ in range(count)]
+        renderer = CombinedReportRenderer()
+
+        for args in batch[:options["check"]]:
+            if pdf_text(legacy_build_combined_pdf(*args)) != pdf_text(renderer.render(*args)):
+                raise CommandError(f"Rendered text differs for {args[0]}")
+
+        self.stdout.write(f"Rendering {count} reports ({sum(len(a[2]['scans']) for a in batch)} scans)")
+        legacy_rate = self._run(legacy_build_combined_pdf, batch)
+        self.stdout.write(f"  legacy build_combined_pdf  {legacy_rate:8.1f} reports/s")
+        renderer_rate = self._run(renderer.render, batch)
+        self.stdout.write(f"  CombinedReportRenderer     {renderer_rate:8.1f} reports/s")
+        self.stdout.write(self.style.SUCCESS(f"Speedup: {renderer_rate / legacy_rate:.2f}x"))
@@ -0,0 +1,117 @@
+"""
+Microbenchmark the ultrasound preprocessing pipeline against the previous
+``convert("RGB").resize((224, 224))`` / ``np.array(img) / 255.0`` code.
+
+Usage:
+    python manage.py benchmark_preprocessing
+    python manage.py benchmark_preprocessing --repeat 20 --base64
+
+Synthetic scans cover the sizes we see in practice: phone/cart JPEGs and
+DICOM-exported greyscale and RGB PNGs. For each one the command reports the
+best time per image, the peak Python-side memory and the largest pixel
+difference from the legacy tensor (0 when resizing is bit-exact; the draft /
+reduce paths differ by a few grey levels out of 255).
+"""
+import base64
+import io
+import time
+import tracemalloc
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from PIL import Image, ImageDraw, ImageFilter
+
+from feetal_app.preprocessing import open_base64_image, preprocess_image
+
+# (label, width, height, PIL mode, format)
+SCAN_SIZES = (
+    ("JPEG 640x480 RGB", 640, 480, "RGB", "JPEG"),
+    ("JPEG 1280x960 RGB", 1280, 960, "RGB", "JPEG"),
+    ("JPEG 1920x1080 RGB", 1920, 1080, "RGB", "JPEG"),
+    ("JPEG 4032x3024 RGB", 4032, 3024, "RGB", "JPEG"),
+    ("PNG 1024x768 L (DICOM export)", 1024, 768, "L", "PNG"),
+    ("PNG 2048x1536 L (DICOM export)", 2048, 1536, "L", "PNG"),
+    ("PNG 2560x1920 RGB", 2560, 1920, "RGB", "PNG"),
+)
+
+
+def legacy_preprocess(data):
+    """Reference copy of the preprocessing predict_preterm_delivery used to do."""
+    if "image_file" in data:
+        img = Image.open(data["image_file"])
+    else:
+        img_bytes = base64.b64decode(data["image_data"])
+        img = Image.open(io.BytesIO(img_bytes))
+    img = img.convert("RGB").resize((224, 224))
+    return np.expand_dims(np.array(img) / 255.0, axis=0)
+
+
+def new_preprocess(data, out):
+    if "image_file" in data:
+        img = Image.open(data["image_file"])
+    else:
+        img = open_base64_image(data["image_data"])
+    return preprocess_image(img, out=out)
+
+
+def synthetic_scan(width, height, mode, fmt, seed=0):
+    """Speckled fan-shaped image that compresses roughly like a real ultrasound."""
+    rng = np.random.default_rng(seed)
+    img = Image.new("L", (width, height), 0)
+    draw = ImageDraw.Draw(img)
+    draw.pieslice((-width // 4, -height // 2, width * 5 // 4, height * 3 // 2), 55, 125, fill=90)
+    draw.ellipse((width * 2 // 5, height // 2, width * 3 // 5, height * 4 // 5), fill=30)
+    speckle = rng.gamma(2.0, 0.5, (height, width)).astype(np.float32)
+    pixels = np.clip(np.asarray(img, dtype=np.float32) * speckle, 0, 255).astype(np.uint8)
+    img = Image.fromarray(pixels, "L").filter(ImageFilter.GaussianBlur(1.2))
+    if mode == "RGB":
+        img = Image.merge("RGB", (img, img, img.point(lambda v: min(255, v + 8))))
+
+    buf = io.BytesIO()
+    img.save(buf, fmt, **({"quality": 90} if fmt == "JPEG" else {}))
+    return buf.getvalue()
+
+
+class Command(BaseCommand):
+    help = "Benchmark ultrasound image preprocessing (legacy vs draft/reduce + float32 buffer)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=10, help="Timing repetitions (best is reported)")
+        parser.add_argument("--base64", action="store_true", help="Feed images as base64 image_data")
+
+    def _measure(self, fn, repeat):
+        best = float("inf")
+        for _ in range(repeat):
+            started = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - started)
+        tracemalloc.start()
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return best, peak
+
+    def handle(self, *args, **options):
+        repeat = max(1, options["repeat"])
+        out = np.empty((1, 224, 224, 3), dtype=np.float32)
+
+        self.stdout.write(
+            f"{'scan':32} {'size':>8} {'legacy ms':>10} {'new ms':>8} {'speedup':>8} "
+            f"{'legacy MB':>10} {'new MB':>7} {'max diff':>9}"
+        )
+        for label, width, height, mode, fmt in SCAN_SIZES:
+            raw = synthetic_scan(width, height, mode, fmt)
+            if options["base64"]:
+                encoded = base64.b64encode(raw).decode("ascii")
+                make_data = lambda: {"image_data": encoded}
+            else:
+                make_data = lambda: {"image_file": io.BytesIO(raw)}
+
+            legacy_time, legacy_peak = self._measure(lambda: legacy_preprocess(make_data()), repeat)
+            new_time, new_peak = self._measure(lambda: new_preprocess(make_data(), out), repeat)
+            diff = np.abs(legacy_preprocess(make_data()) - new_preprocess(make_data(), out)).max() * 255
+
+            self.stdout.write(
+                f"{label:32} {len(raw) / 1024:>6.0f}KB {legacy_time * 1000:>10.2f} {new_time * 1000:>8.2f} "
+                f"{legacy_time / new_time:>7.1f}x {legacy_peak / 1e6:>10.2f} {new_peak / 1e6:>7.2f} {diff:>9.1f}"
+            )
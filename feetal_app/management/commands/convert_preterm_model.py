@@ -0,0 +1,131 @@
+"""
+Convert the preterm CNN (preterm_delivery_cnn.h5) for a lightweight runtime.
+
+Usage:
+    python manage.py convert_preterm_model --format tflite
+    python manage.py convert_preterm_model --format tflite --quantize int8 --calibration-dir scans/
+    python manage.py convert_preterm_model --format tflite --quantize int8   # weights only
+    python manage.py convert_preterm_model --format onnx [--quantize int8]
+
+The artifact is written next to the .h5 (ml_models/preterm_delivery_cnn.tflite
+or .onnx) unless --output is given; --model converts another Keras file. Serve it with PRETERM_MODEL_BACKEND=tflite
+or onnx. TensorFlow (and tf2onnx for ONNX) is only needed for the conversion.
+"""
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from feetal_app import ml_service
+from feetal_app.inference_backends import BACKEND_EXTENSIONS
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+def load_sample_images(directory, limit):
+    """Preprocessed (1, 224, 224, 3) float32 arrays for the images in ``directory``."""
+    from PIL import Image
+
+    samples = []
+    for name in sorted(os.listdir(directory)):
+        if name.lower().endswith(IMAGE_EXTENSIONS):
+            with Image.open(os.path.join(directory, name)) as img:
+                samples.append(ml_service.preprocess_preterm_image(img))
+        if len(samples) >= limit:
+            break
+    return samples
+
+
+def convert_to_tflite(keras_model, output, quantize=None, samples=()):
+    import tensorflow as tf
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(keras_model)
+    if quantize == "int8":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        if samples:
+            # Float input/output keep the serving code unchanged; weights and activations are int8
+            converter.representative_dataset = lambda: ([s] for s in samples)
+        # Without calibration scans only the weights are quantized (dynamic range)
+    with open(output, "wb") as f:
+        f.write(converter.convert())
+
+
+def convert_to_onnx(keras_model, output, quantize=None):
+    import tensorflow as tf
+    import tf2onnx
+
+    spec = (tf.TensorSpec((None, 224, 224, 3), tf.float32, name="input"),)
+    target = output + ".float" if quantize == "int8" else output
+
+    # Traced as a plain tf.function: tf2onnx's from_keras cannot read Keras 3 models
+    @tf.function
+    def forward(images):
+        return keras_model(images, training=False)
+
+    tf2onnx.convert.from_function(forward, input_signature=spec, output_path=target)
+    if quantize == "int8":
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(target, output, weight_type=QuantType.QInt8)
+        os.remove(target)
+
+
+class Command(BaseCommand):
+    help = "Convert the preterm CNN to TFLite or ONNX (optionally int8-quantized) for lightweight inference."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=sorted(BACKEND_EXTENSIONS), default="tflite")
+        parser.add_argument("--quantize", choices=["int8"], help="Quantize weights (and activations for TFLite) to int8")
+        parser.add_argument("--model", help="Keras model to convert (default: ml_models/preterm_delivery_cnn.h5)")
+        parser.add_argument("--output", help="Output path (default: ml_models/preterm_delivery_cnn.<ext>)")
+        parser.add_argument(
+            "--calibration-dir",
+            help=(
+                "Directory of real ultrasound scans used to calibrate int8 activations and check parity; "
+                "without it --quantize int8 quantizes the weights only"
+            ),
+        )
+        parser.add_argument("--calibration-samples", type=int, default=100)
+
+    def handle(self, *args, **options):
+        fmt = options["format"]
+        output = options["output"] or ml_service.get_model_path("preterm_delivery_cnn" + BACKEND_EXTENSIONS[fmt])
+
+        try:
+            from tensorflow import keras
+        except ImportError:
+            raise CommandError("TensorFlow is required to convert the model.")
+        model_path = options["model"] or ml_service.get_model_path("preterm_delivery_cnn.h5")
+        if not os.path.exists(model_path) or os.path.getsize(model_path) < 10000:
+            raise CommandError(f"{model_path} is missing or a Git LFS pointer; run `git lfs pull` first.")
+        keras_model = keras.models.load_model(model_path)
+
+        samples = []
+        if options["calibration_dir"]:
+            if not os.path.isdir(options["calibration_dir"]):
+                raise CommandError(f"{options['calibration_dir']} is not a directory.")
+            samples = load_sample_images(options["calibration_dir"], options["calibration_samples"])
+            if not samples:
+                raise CommandError(f"No {'/'.join(IMAGE_EXTENSIONS)} images in {options['calibration_dir']}.")
+
+        self.stdout.write(f"Converting {model_path} -> {output} ({fmt}{', int8' if options['quantize'] else ''})")
+        if options["quantize"] and fmt == "tflite" and not samples:
+            self.stdout.write("  no --calibration-dir: dynamic-range quantization (int8 weights, float activations)")
+        if fmt == "tflite":
+            convert_to_tflite(keras_model, output, options["quantize"], samples)
+        else:
+            convert_to_onnx(keras_model, output, options["quantize"])
+
+        self.stdout.write(
+            f"  size: {os.path.getsize(model_path) / 1e6:.1f} MB -> {os.path.getsize(output) / 1e6:.1f} MB"
+        )
+
+        if samples:
+            import numpy as np
+            from feetal_app.inference_backends import load_preterm_backend
+
+            converted = load_preterm_backend(fmt, output)
+            batch = np.concatenate(samples)
+            diff = np.abs(keras_model.predict(batch, verbose=0) - converted.predict(batch)).max()
+            self.stdout.write(f"  max |probability difference| on {len(samples)} image(s): {diff:.6f}")
+
+        self.stdout.write(self.style.SUCCESS(f"Set PRETERM_MODEL_BACKEND={fmt} to serve {output}"))
@@ -0,0 +1,65 @@
+"""
+Move existing report PDFs into the content-addressed store (pdf_store.py).
+
+Usage:
+    python manage.py rehash_report_pdfs --dry-run
+    python manage.py rehash_report_pdfs
+
+Every AnalysisReport whose PDF still has a timestamp name is read, stored
+under its SHA-256 (identical files collapse into one) and repointed; the old
+file is deleted once no report references it. Reports whose file is missing
+are left alone (the download view re-renders them when results are stored).
+Safe to run again; already rehashed reports are skipped.
+"""
+import hashlib
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from feetal_app.models import AnalysisReport
+from feetal_app.pdf_store import is_content_addressed, release_pdf, store_pdf
+
+
+class Command(BaseCommand):
+    help = "Rename stored report PDFs to content hashes and remove duplicates."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Report what would change without writing")
+
+    def handle(self, *args, **options):
+        dry_run = options["dry_run"]
+        moved = missing = 0
+        bytes_before = bytes_after = 0
+        seen = set()
+
+        reports = AnalysisReport.objects.exclude(pdf="").only("pk", "pdf").order_by("pk")
+        for report in reports.iterator():
+            old_name = report.pdf.name
+            if is_content_addressed(old_name):
+                continue
+            try:
+                with default_storage.open(old_name, "rb") as f:
+                    pdf_bytes = f.read()
+            except (FileNotFoundError, OSError):
+                missing += 1
+                self.stdout.write(self.style.WARNING(f"Report {report.pk}: {old_name} not found, skipped"))
+                continue
+
+            moved += 1
+            bytes_before += len(pdf_bytes)
+            digest = hashlib.sha256(pdf_bytes).hexdigest()
+            if digest not in seen:
+                seen.add(digest)
+                bytes_after += len(pdf_bytes)
+            if dry_run:
+                continue
+
+            name, fingerprint = store_pdf(pdf_bytes)
+            AnalysisReport.objects.filter(pk=report.pk, pdf=old_name).update(pdf=name, **fingerprint)
+            release_pdf(old_name)
+
+        verb = "Would rehash" if dry_run else "Rehashed"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {moved} report PDF(s) into {len(seen)} file(s): "
+            f"{bytes_before / 1024:.0f} KB -> {bytes_after / 1024:.0f} KB; {missing} missing"
+        ))
@@ -0,0 +1,41 @@
+"""
+Process queued combined analyses outside the web processes.
+
+Usage:
+    python manage.py run_analysis_worker
+    python manage.py run_analysis_worker --workers 4
+
+Pair with ANALYSIS_JOB_WORKERS=0 on the web service so uploads are only
+queued there. Several worker processes can run against the same database.
+"""
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from feetal_app import ml_service
+from feetal_app.jobs import JobWorkerPool
+
+
+class Command(BaseCommand):
+    help = "Run a pool of combined-analysis job workers."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=max(1, getattr(settings, "ANALYSIS_JOB_WORKERS", 2)))
+        parser.add_argument("--poll", type=float, default=getattr(settings, "ANALYSIS_JOB_POLL_SECONDS", 2.0),
+                            help="Seconds between queue polls when idle")
+        parser.add_argument("--no-warmup", action="store_true", help="Load models lazily on the first job")
+
+    def handle(self, *args, **options):
+        if not options["no_warmup"]:
+            ml_service.start_model_warmup()
+
+        pool = JobWorkerPool(options["workers"], options["poll"]).start()
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        self.stdout.write(self.style.SUCCESS(f"Analysis worker running with {pool.num_workers} thread(s)"))
+        try:
+            pool.join()
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping after the current jobs...")
+            pool.stop()
+        self.stdout.write(f"Processed {pool.stats()['jobs_run']} job(s).")
@@ -0,0 +1,59 @@
+"""
+Run the out-of-process model server.
+
+Usage:
+    python manage.py run_model_server
+    python manage.py run_model_server --socket /run/feetal/models.sock
+
+The process loads and warms both models once, then answers prediction
+requests from web workers (configured with ML_MODEL_SERVER_SOCKET) over a
+Unix domain socket. Preterm requests from all workers share this process's
+micro-batcher.
+"""
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from feetal_app import ml_service
+
+
+class Command(BaseCommand):
+    help = "Serve maternal health and preterm model predictions over a Unix domain socket."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--socket",
+            default=getattr(settings, "ML_MODEL_SERVER_SOCKET", ""),
+            help="Socket path (defaults to ML_MODEL_SERVER_SOCKET)",
+        )
+        parser.add_argument("--no-warmup", action="store_true", help="Load models lazily on first request")
+
+    def handle(self, *args, **options):
+        socket_path = options["socket"]
+        if not socket_path:
+            raise CommandError("No socket path: pass --socket or set ML_MODEL_SERVER_SOCKET.")
+
+        try:
+            from feetal_app.model_server import ModelServer
+        except (ImportError, AttributeError) as e:
+            raise CommandError(f"Unix domain sockets are not supported here: {str(e)}")
+
+        ml_service.serve_models_in_process()
+        if not options["no_warmup"]:
+            self.stdout.write("Loading and warming up models...")
+            ml_service.start_model_warmup(background=False)
+            for name, entry in ml_service.get_model_readiness().get("models", {}).items():
+                self.stdout.write(f"  {name}: {entry}")
+
+        server = ModelServer(socket_path)
+        # Treat SIGTERM like Ctrl+C so the socket file is removed on exit
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        self.stdout.write(self.style.SUCCESS(f"Model server listening on {socket_path}"))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write("Model server stopped.")
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feetal_app', '0008_analysisjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analysisreport',
+            name='analysis_data',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='analysisreport',
+            name='pdf',
+            field=models.FileField(blank=True, upload_to='analysis_reports/'),
+        ),
+    ]
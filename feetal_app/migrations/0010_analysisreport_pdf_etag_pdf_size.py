@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feetal_app', '0009_analysisreport_analysis_data'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analysisreport',
+            name='pdf_etag',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='analysisreport',
+            name='pdf_size',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feetal_app', '0010_analysisreport_pdf_etag_pdf_size'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='analysisreport',
+            name='pdf',
+            field=models.FileField(blank=True, db_index=True, upload_to='analysis_reports/'),
+        ),
+    ]
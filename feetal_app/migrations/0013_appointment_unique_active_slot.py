@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:26
+
+import logging
+
+from django.conf import settings
+from django.db import migrations, models
+
+logger = logging.getLogger(__name__)
+
+
+def resolve_double_bookings(apps, schema_editor):
+    """
+    The constraint cannot be added while a doctor/date/time has more than one
+    active appointment. Stop and list them, or with
+    APPOINTMENT_CANCEL_DOUBLE_BOOKINGS cancel all but the earliest and log
+    every cancelled booking.
+    """
+    Appointment = apps.get_model('feetal_app', 'Appointment')
+    first_booking = {}
+    duplicates = []
+    active = Appointment.objects.exclude(status='cancelled').order_by('pk')
+    for appointment in active.only('pk', 'doctor_id', 'appointment_date', 'appointment_time', 'patient_name', 'patient_email'):
+        slot = (appointment.doctor_id, appointment.appointment_date, appointment.appointment_time)
+        if slot in first_booking:
+            duplicates.append((first_booking[slot], appointment))
+        else:
+            first_booking[slot] = appointment
+    if not duplicates:
+        return
+
+    lines = [
+        f"appointment {dup.pk} ({dup.patient_name} <{dup.patient_email}>) doubles appointment {kept.pk} "
+        f"for doctor {dup.doctor_id} on {dup.appointment_date} at {dup.appointment_time}"
+        for kept, dup in duplicates
+    ]
+    if not getattr(settings, 'APPOINTMENT_CANCEL_DOUBLE_BOOKINGS', False):
+        raise RuntimeError(
+            "Cannot add appt_unique_active_slot: some slots have more than one active appointment.\n"
+            + "".join(f"  {line}\n" for line in lines)
+            + "Cancel or move the duplicates (or set APPOINTMENT_CANCEL_DOUBLE_BOOKINGS=True to cancel "
+            "all but the earliest booking of each slot) and run migrate again."
+        )
+    for line in lines:
+        logger.warning("Cancelling double booking: %s", line)
+    Appointment.objects.filter(pk__in=[dup.pk for _, dup in duplicates]).update(status='cancelled')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feetal_app', '0012_appointment_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(resolve_double_bookings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='appointment',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'cancelled'), _negated=True), fields=('doctor', 'appointment_date', 'appointment_time'), name='appt_unique_active_slot'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feetal_app', '0013_appointment_unique_active_slot'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='analysisreport',
+            index=models.Index(fields=['created_at', 'id'], name='report_created_id'),
+        ),
+    ]
@@ -3,8 +3,11 @@ ML Service module for loading and using maternal health & preterm delivery model
 Supports numeric form input + medical report files (TXT/PDF/DOCX) with OCR extraction.
 """
 import os
+import hashlib
 import logging
 import re
+import threading
+import time
 from django.conf import settings
 
 try:
@@ -17,11 +20,63 @@ except ImportError:
 import pdfplumber
 from docx import Document
 
+from .extraction import PATTERN_SET_VERSION, IncrementalExtractor, extract_values_from_text
+
 logger = logging.getLogger(__name__)
 
 # Lazy-loaded model instances
 _maternal_health_model = None
 _preterm_delivery_model = None
+_preterm_model_lock = threading.Lock()
+
+# Micro-batcher in front of the preterm CNN (created on first use)
+_preterm_batcher = None
+_preterm_batcher_lock = threading.Lock()
+
+# Extracted-values cache for uploaded reports (created on first use)
+_report_cache = None
+_report_cache_lock = threading.Lock()
+
+# Bump when the file parsing in extract_medical_values changes behaviour
+REPORT_EXTRACTOR_REVISION = 1
+
+# Maternal model file fingerprint ((mtime_ns, size), sha256) and prediction memo
+_maternal_model_fingerprint = None
+_maternal_model_lock = threading.Lock()
+_maternal_prediction_cache = None
+
+# Client for the out-of-process model server (ML_MODEL_SERVER_SOCKET)
+_model_server_client = None
+_model_server_client_lock = threading.Lock()
+_serving_models = False
+
+
+def _reset_after_fork():
+    """
+    Drop per-process helpers inherited across a fork (gunicorn --preload runs
+    the warm-up in the master). The batcher's worker thread, the model
+    server sockets and the report cache's SQLite connections do not survive
+    a fork; the child creates its own on first use.
+    """
+    global _preterm_batcher, _preterm_batcher_lock
+    global _model_server_client, _model_server_client_lock
+    global _report_cache, _report_cache_lock
+    global _preterm_model_lock, _maternal_model_lock, _warmup_lock
+    _preterm_batcher = None
+    _model_server_client = None
+    _report_cache = None
+    # A lock held by another parent thread at fork time (a model load or the
+    # warm-up still running) would stay locked forever in the child
+    _preterm_batcher_lock = threading.Lock()
+    _model_server_client_lock = threading.Lock()
+    _report_cache_lock = threading.Lock()
+    _preterm_model_lock = threading.Lock()
+    _maternal_model_lock = threading.Lock()
+    _warmup_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
 
 
 # ------------------------- MODEL LOADING -------------------------
@@ -29,9 +84,40 @@ def get_model_path(filename):
     return os.path.join(settings.BASE_DIR, "feetal_app", "ml_models", filename)
 
 
+def get_maternal_model_hash():
+    """
+    SHA-256 of model_maternal_health_v2.pkl. The file is only re-hashed when
+    its mtime or size changes; a changed file drops the loaded model and
+    every memoized prediction.
+    """
+    global _maternal_model_fingerprint, _maternal_health_model
+    try:
+        st = os.stat(get_model_path("model_maternal_health_v2.pkl"))
+    except OSError:
+        return None
+    state = (st.st_mtime_ns, st.st_size)
+
+    if _maternal_model_fingerprint is None or _maternal_model_fingerprint[0] != state:
+        with _maternal_model_lock:
+            if _maternal_model_fingerprint is None or _maternal_model_fingerprint[0] != state:
+                digest = hashlib.sha256()
+                with open(get_model_path("model_maternal_health_v2.pkl"), "rb") as f:
+                    for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                        digest.update(chunk)
+                digest = digest.hexdigest()
+                if _maternal_model_fingerprint is not None and _maternal_model_fingerprint[1] != digest:
+                    logger.info("Maternal health model file changed; reloading and clearing prediction cache")
+                    _maternal_health_model = None
+                    if _maternal_prediction_cache is not None:
+                        _maternal_prediction_cache.clear()
+                _maternal_model_fingerprint = (state, digest)
+    return _maternal_model_fingerprint[1]
+
+
 def load_maternal_health_model():
     """Load the maternal health prediction model"""
     global _maternal_health_model
+    get_maternal_model_hash()
     if _maternal_health_model is None:
         try:
             import joblib
@@ -46,6 +132,40 @@ def load_maternal_health_model():
 def load_preterm_delivery_model():
     """Load the preterm delivery CNN model"""
     global _preterm_delivery_model
+    if _preterm_delivery_model is not None:
+        return _preterm_delivery_model
+    # Serialize loading so a warm-up thread and a request never load TensorFlow twice
+    with _preterm_model_lock:
+        if _preterm_delivery_model is None:
+            _load_preterm_delivery_model()
+    return _preterm_delivery_model
+
+
+def get_preterm_backend_path(backend):
+    """Path of the converted preterm CNN artifact for ``backend`` (tflite/onnx)."""
+    from .inference_backends import BACKEND_EXTENSIONS
+    return getattr(settings, "PRETERM_MODEL_ARTIFACT", "") or get_model_path(
+        "preterm_delivery_cnn" + BACKEND_EXTENSIONS[backend]
+    )
+
+
+def _load_preterm_delivery_model():
+    global _preterm_delivery_model
+    backend = getattr(settings, "PRETERM_MODEL_BACKEND", "keras")
+    if _preterm_delivery_model is None and backend != "keras":
+        # Converted model on a lightweight runtime: TensorFlow is never imported
+        try:
+            from .inference_backends import load_preterm_backend
+            model_path = get_preterm_backend_path(backend)
+            _preterm_delivery_model = load_preterm_backend(
+                backend, model_path, num_threads=getattr(settings, "PRETERM_MODEL_THREADS", None)
+            )
+            logger.info(f"Preterm delivery model loaded with {backend} backend from {model_path}")
+            return _preterm_delivery_model
+        except Exception as e:
+            logger.error(f"Preterm {backend} backend load error: {str(e)}; falling back to Keras")
+            _preterm_delivery_model = None
+
     if _preterm_delivery_model is None:
         try:
             # Optimize memory usage for Render Free Tier
@@ -77,10 +197,244 @@ def load_preterm_delivery_model():
     return _preterm_delivery_model
 
 
+# ------------------------- PRETERM MICRO-BATCHING -------------------------
+def get_preterm_batcher():
+    """
+    Return the process-wide MicroBatcher wrapping the preterm CNN, or None
+    when batching is disabled or the model is unavailable.
+    """
+    global _preterm_batcher
+    if not getattr(settings, "PRETERM_BATCHING_ENABLED", True):
+        return None
+    if _preterm_batcher is None:
+        with _preterm_batcher_lock:
+            if _preterm_batcher is None:
+                model = load_preterm_delivery_model()
+                if model is None:
+                    return None
+                from .batching import MicroBatcher
+                _preterm_batcher = MicroBatcher(
+                    lambda batch: model.predict(batch, verbose=0),
+                    max_batch_size=getattr(settings, "PRETERM_BATCH_MAX_SIZE", 8),
+                    max_wait_ms=getattr(settings, "PRETERM_BATCH_MAX_WAIT_MS", 5),
+                    name="preterm-cnn",
+                )
+    return _preterm_batcher
+
+
+def _run_preterm_model(model, img_batch):
+    """Run an (N, 224, 224, 3) batch through the CNN, batching across threads when enabled."""
+    batcher = get_preterm_batcher()
+    if batcher is not None:
+        return batcher.predict(img_batch, timeout=getattr(settings, "PRETERM_BATCH_TIMEOUT", 60))
+    return model.predict(img_batch, verbose=0)
+
+
+def get_inference_stats():
+    """Runtime counters for the ML layer (used by the admin stats endpoint)."""
+    return {
+        "preterm_batcher": _preterm_batcher.stats() if _preterm_batcher is not None else None,
+        "report_cache": _report_cache.stats() if _report_cache is not None else None,
+        "maternal_prediction_cache": (
+            _maternal_prediction_cache.stats() if _maternal_prediction_cache is not None else None
+        ),
+        "model_server_client": _model_server_client.stats() if _model_server_client else None,
+    }
+
+
+# ------------------------- MODEL SERVER CLIENT -------------------------
+def get_model_server_client():
+    """
+    Return the pooled client for the out-of-process model server, or None
+    when ML_MODEL_SERVER_SOCKET is unset (models are then loaded in-process).
+    """
+    global _model_server_client
+    socket_path = getattr(settings, "ML_MODEL_SERVER_SOCKET", "")
+    if not socket_path or _serving_models:
+        return None
+    if _model_server_client is None:
+        with _model_server_client_lock:
+            if _model_server_client is None:
+                from .model_server import ModelServerClient
+                _model_server_client = ModelServerClient(
+                    socket_path,
+                    pool_size=getattr(settings, "ML_MODEL_SERVER_POOL_SIZE", 4),
+                    timeout=getattr(settings, "ML_MODEL_SERVER_TIMEOUT", 60),
+                )
+    return _model_server_client
+
+
+def serve_models_in_process():
+    """Mark this process as the model server so predictions never loop back to the socket."""
+    global _serving_models
+    _serving_models = True
+
+
+# ------------------------- STARTUP WARM-UP -------------------------
+_warmup_state = {"status": "disabled"}
+_warmup_lock = threading.Lock()
+
+
+def warm_up_models():
+    """
+    Load both models and run a dummy forward pass on zero inputs so the
+    first real request does not pay for TensorFlow import and graph tracing.
+    Updates the readiness state reported by get_model_readiness().
+    """
+    state = {
+        "status": "warming",
+        "pid": os.getpid(),
+        "started_at": time.time(),
+        "models": {},
+    }
+    _warmup_state.clear()
+    _warmup_state.update(state)
+
+    client = get_model_server_client()
+    if client is not None:
+        # Models live in the model server; ready once it answers
+        try:
+            remote = client.ping()
+            _warmup_state["models"] = remote.get("readiness", {}).get("models", {})
+            _warmup_state["model_server"] = {"pid": remote.get("pid"), "ready": remote.get("readiness", {}).get("ready")}
+        except Exception as e:
+            logger.error(f"Model server ping failed: {str(e)}")
+            _warmup_state["model_server"] = {"error": str(e)}
+        _warmup_state["finished_at"] = time.time()
+        _warmup_state["total_seconds"] = round(_warmup_state["finished_at"] - _warmup_state["started_at"], 3)
+        _warmup_state["status"] = "ready"
+        return
+
+    for name, load, dummy_pass in (
+        ("maternal_health", load_maternal_health_model,
+         lambda m: m.predict_proba(np.zeros((1, len(MATERNAL_FEATURES))))),
+        ("preterm_delivery", load_preterm_delivery_model,
+         lambda m: _run_preterm_model(m, np.zeros((1, 224, 224, 3), dtype=np.float32))),
+    ):
+        started = time.monotonic()
+        entry = {"loaded": False}
+        try:
+            model = load()
+            entry["load_seconds"] = round(time.monotonic() - started, 3)
+            if model is None:
+                entry["error"] = "model unavailable"
+            else:
+                entry["loaded"] = True
+                started = time.monotonic()
+                dummy_pass(model)
+                entry["warmup_seconds"] = round(time.monotonic() - started, 3)
+        except Exception as e:
+            logger.error(f"Warm-up of {name} model failed: {str(e)}")
+            entry["error"] = str(e)
+        _warmup_state["models"][name] = entry
+
+    _warmup_state["finished_at"] = time.time()
+    _warmup_state["total_seconds"] = round(_warmup_state["finished_at"] - _warmup_state["started_at"], 3)
+    _warmup_state["status"] = "ready"
+    logger.info(f"ML warm-up finished in {_warmup_state['total_seconds']}s: {_warmup_state['models']}")
+
+
+def start_model_warmup(background=True):
+    """Start warm-up once per process (in a daemon thread by default)."""
+    if np is None:
+        return
+    with _warmup_lock:
+        if _warmup_state.get("pid") == os.getpid():
+            return
+        _warmup_state.clear()
+        _warmup_state.update({"status": "pending", "pid": os.getpid()})
+
+    if background:
+        threading.Thread(target=warm_up_models, name="ml-warmup", daemon=True).start()
+    else:
+        warm_up_models()
+
+
+def get_model_readiness():
+    """
+    Warm-up state for the health endpoint. ``ready`` is False only while
+    warm-up is pending or running in this process.
+    """
+    state = dict(_warmup_state)
+    if state.get("pid") not in (None, os.getpid()):
+        # Inherited from the parent across a fork (gunicorn --preload): warm up here too
+        start_model_warmup()
+        state = {"status": "pending"}
+    state.pop("pid", None)
+    state["ready"] = state.get("status") in ("ready", "disabled")
+    return state
+
+
 # ------------------------- MEDICAL REPORT OCR EXTRACTOR -------------------------
+def iter_pdf_pages(file, max_pages=None, with_page=False):
+    """
+    Yield (page_number, text) for each PDF page, parsing pages lazily and
+    releasing each page's layout cache once its text has been read.
+    With ``with_page`` the still-open pdfplumber page is yielded as well.
+    """
+    pages = list(range(1, max_pages + 1)) if max_pages else None
+    with pdfplumber.open(file, pages=pages) as pdf:
+        for page in pdf.pages:
+            try:
+                if with_page:
+                    yield page.page_number, page.extract_text(), page
+                else:
+                    yield page.page_number, page.extract_text()
+            finally:
+                page.close()
+
+
+def get_report_cache():
+    """Return the process-wide ReportValueCache, or None when disabled."""
+    global _report_cache
+    if not getattr(settings, "REPORT_CACHE_ENABLED", True):
+        return None
+    if _report_cache is None:
+        with _report_cache_lock:
+            if _report_cache is None:
+                from .ocr import ocr_config_tag
+                from .report_cache import ReportValueCache
+                max_pages = getattr(settings, "REPORT_PDF_MAX_PAGES", 50)
+                try:
+                    _report_cache = ReportValueCache(
+                        getattr(settings, "REPORT_CACHE_PATH",
+                                os.path.join(settings.BASE_DIR, "cache", "report_values.sqlite3")),
+                        version=f"{PATTERN_SET_VERSION}-r{REPORT_EXTRACTOR_REVISION}-p{max_pages}-{ocr_config_tag()}",
+                        max_entries=getattr(settings, "REPORT_CACHE_MAX_ENTRIES", 5000),
+                    )
+                except Exception as e:
+                    logger.error(f"Report cache unavailable: {str(e)}")
+                    return None
+    return _report_cache
+
+
 def extract_medical_values(file):
-    """Extract structured numeric values from TXT / PDF / DOCX reports."""
+    """
+    Extract structured numeric values from TXT / PDF / DOCX reports.
+    PDF and DOCX results are cached by the SHA-256 of the file bytes, so a
+    re-uploaded report is never parsed twice.
+    """
+    file_type = os.path.splitext(file.name.lower())[1]
+    cache = get_report_cache() if file_type in (".pdf", ".docx") else None
+    if cache is None:
+        return _extract_medical_values_uncached(file)
+
+    from .report_cache import file_sha256
+    digest = file_sha256(file)
+    cached = cache.get(digest, file_type)
+    if cached is not None:
+        logger.debug("Report cache hit (%s)", digest[:12])
+        return cached
+
+    extracted = _extract_medical_values_uncached(file)
+    if extracted is not None:
+        cache.set(digest, file_type, extracted)
+    return extracted
+
+
+def _extract_medical_values_uncached(file):
     text = ""
+    extracted = None
 
     # TXT or CSV
     if file.name.lower().endswith((".txt", ".csv")):
@@ -143,13 +497,35 @@ def extract_medical_values(file):
                 # Fall back to text extraction
                 pass
 
-    # PDF
+    # PDF (page by page; stop as soon as every vital has been found)
     elif file.name.lower().endswith(".pdf"):
-        with pdfplumber.open(file) as pdf:
-            for page in pdf.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n"
+        from .ocr import PageOCR
+
+        max_pages = getattr(settings, "REPORT_PDF_MAX_PAGES", 50)
+        extractor = IncrementalExtractor()
+        ocr = PageOCR()
+        page_texts = {}
+        for page_number, page_text, page in iter_pdf_pages(file, max_pages=max_pages, with_page=True):
+            page_texts[page_number] = page_text
+            if not (page_text or "").strip():
+                # Scanned page without a text layer: OCR it in the background
+                ocr.submit(page)
+            if extractor.feed(page_text):
+                logger.debug("All vitals found on page %s; skipping remaining pages", page_number)
+                break
+
+        if extractor.complete:
+            ocr.cancel()
+        elif len(ocr):
+            logger.info("Running OCR on %d page(s) without a text layer", len(ocr))
+            page_texts.update(ocr.results())
+            # Re-read in page order so OCR'd pages keep their place in the report
+            extractor = IncrementalExtractor()
+            for page_number in sorted(page_texts):
+                if extractor.feed(page_texts[page_number]):
+                    break
+        text = extractor.text
+        extracted = extractor.result()
 
     # DOCX
     elif file.name.lower().endswith(".docx"):
@@ -160,180 +536,110 @@ def extract_medical_values(file):
     else:
         return None
 
-    # Value extractor using regex - try multiple patterns for each value
-    def extract(pattern, default=0, patterns=None):
-        if patterns:
-            # Try multiple patterns
-            for pat in patterns:
-                match = re.search(pat, text, re.IGNORECASE)
-                if match:
-                    try:
-                        return float(match.group(1))
-                    except (ValueError, IndexError):
-                        continue
-        else:
-            # Single pattern
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                try:
-                    return float(match.group(1))
-                except (ValueError, IndexError):
-                    pass
-        return default
-
-    extracted = {
-        # Age - try multiple formats
-        "age": extract(None, 0, [
-            r"Age[:= ]+(\d+)",
-            r"Age\s+is\s+(\d+)",
-            r"(\d+)\s+years?\s+old",
-            r"Age\s*:?\s*(\d+)",
-        ]),
-        # Systolic BP - try multiple formats including combined BP format
-        "systolic_bp": extract(None, 0, [
-            r"Systolic[:= ]+(\d+)",
-            r"Systolic\s+BP[:= ]+(\d+)",
-            r"SBP[:= ]+(\d+)",
-            r"Systolic\s*:?\s*(\d+)",
-            r"BP[:= ]+(\d+)[/ ]+(\d+)",  # BP: 120/80 - capture first number
-            r"Blood\s+Pressure[:= ]+(\d+)[/ ]+(\d+)",  # Blood Pressure: 120/80
-            r"(\d+)[/ ]+(\d+)\s*mmHg",  # 120/80 mmHg
-        ]),
-        # Diastolic BP - try multiple formats including combined BP format
-        "diastolic_bp": extract(None, 0, [
-            r"Diastolic[:= ]+(\d+)",
-            r"Diastolic\s+BP[:= ]+(\d+)",
-            r"DBP[:= ]+(\d+)",
-            r"Diastolic\s*:?\s*(\d+)",
-            r"BP[:= ]+\d+[/ ]+(\d+)",  # BP: 120/80 - capture second number
-            r"Blood\s+Pressure[:= ]+\d+[/ ]+(\d+)",  # Blood Pressure: 120/80
-            r"\d+[/ ]+(\d+)\s*mmHg",  # 120/80 mmHg
-        ]),
-        # Blood Sugar - try multiple formats
-        "bs": extract(None, 0, [
-            r"Blood.?Sugar[:= ]+(\d+\.?\d*)",
-            r"BS[:= ]+(\d+\.?\d*)",
-            r"Glucose[:= ]+(\d+\.?\d*)",
-            r"Blood\s+Sugar\s*:?\s*(\d+\.?\d*)",
-            r"BS\s*:?\s*(\d+\.?\d*)",
-            r"Fasting\s+Glucose[:= ]+(\d+\.?\d*)",
-            r"Random\s+Glucose[:= ]+(\d+\.?\d*)",
-        ]),
-        # Heart Rate - try multiple formats
-        "heart_rate": extract(None, 0, [
-            r"(?:Heart.?Rate|Pulse|HR)[:= ]+(\d+)",
-            r"Heart\s+Rate[:= ]+(\d+)",
-            r"Pulse[:= ]+(\d+)",
-            r"HR[:= ]+(\d+)",
-        ]),
-        # Body Temperature - try multiple formats
-        "body_temp": extract(None, 0, [
-            r"(?:Temperature|Temp|Body\s+Temp)[:= ]+(\d+\.?\d*)",
-            r"Temp[:= ]+(\d+\.?\d*)",
-            r"Temperature[:= ]+(\d+\.?\d*)",
-        ]),
-    }
-
-    # Debug: print extracted values and sample text
-    import os
+    # Single-pass extraction with precompiled patterns (see extraction.py)
     print(f"[DEBUG] Sample text (first 500 chars): {text[:500]}")
-    print(f"[DEBUG] Initial extracted values: {extracted}")
-    
-    # Post-processing: Fix common extraction issues and convert units
-    
-    # 0. Convert Blood Sugar from mmol/L to mg/dL if needed (Excel/CSV format often uses mmol/L)
-    bs_value = extracted.get("bs", 0)
-    if bs_value > 0 and bs_value < 30:  # Likely in mmol/L (range 4-25), convert to mg/dL
-        # Formula: mg/dL = mmol/L × 18.0182
-        # Example: 15 mmol/L = 270.27 mg/dL (high risk!)
-        bs_mgdl = bs_value * 18.0182
-        print(f"[INFO] Converted BS from {bs_value} mmol/L to {bs_mgdl:.1f} mg/dL")
-        extracted["bs"] = bs_mgdl
-    
-    # 1. Check for BP in "120/80" format (most common)
-    if extracted.get("systolic_bp", 0) == 0 or extracted.get("diastolic_bp", 0) == 0:
-        print(f"[INFO] BP values missing or incomplete. Searching for combined BP format...")
-        bp_patterns = [
-            r"BP[:= ]+(\d+)[/ ]+(\d+)",  # BP: 120/80
-            r"Blood\s+Pressure[:= ]+(\d+)[/ ]+(\d+)",  # Blood Pressure: 120/80
-            r"(\d+)[/ ]+(\d+)\s*mmHg",  # 120/80 mmHg
-            r"(\d+)\s*/\s*(\d+)\s*BP",  # 120 / 80 BP
-        ]
-        for pattern in bp_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                try:
-                    sys_val = float(match.group(1))
-                    dia_val = float(match.group(2))
-                    # Validate reasonable BP values (typically 90-200 for systolic, 50-120 for diastolic)
-                    if 80 <= sys_val <= 250 and 40 <= dia_val <= 150:
-                        print(f"[INFO] Found BP in format '{match.group(0)}': SBP={sys_val}, DBP={dia_val}")
-                        extracted["systolic_bp"] = sys_val
-                        extracted["diastolic_bp"] = dia_val
-                        break
-                except (ValueError, IndexError):
-                    continue
-    
-    # 2. Validate and fix Blood Sugar (should be 70-300+ typically)
-    if extracted.get("bs", 0) < 50:
-        print(f"[WARNING] Blood Sugar value ({extracted.get('bs', 0)}) seems unusually low. Re-searching...")
-        # Try alternative patterns that might have been missed
-        bs_patterns = [
-            r"Blood\s+Sugar[:= ]+(\d+\.?\d*)",
-            r"Glucose[:= ]+(\d+\.?\d*)",
-            r"BS[:= ]+(\d+\.?\d*)",
-            r"Fasting\s+Glucose[:= ]+(\d+\.?\d*)",
-            r"Random\s+Glucose[:= ]+(\d+\.?\d*)",
-            r"Blood\s+Glucose[:= ]+(\d+\.?\d*)",
-        ]
-        for pattern in bs_patterns:
-            matches = re.finditer(pattern, text, re.IGNORECASE)
-            for match in matches:
-                try:
-                    bs_val = float(match.group(1))
-                    # Only use if it's a reasonable value (50-500)
-                    if 50 <= bs_val <= 500:
-                        print(f"[INFO] Found better BS value: {bs_val} from pattern '{match.group(0)}'")
-                        extracted["bs"] = bs_val
-                        break
-                except (ValueError, IndexError):
-                    continue
-            if extracted.get("bs", 0) >= 50:
-                break
-    
-    # 3. Validate Body Temperature (should be 95-105°F typically)
-    if extracted.get("body_temp", 0) < 90 or extracted.get("body_temp", 0) > 110:
-        print(f"[WARNING] Body Temperature value ({extracted.get('body_temp', 0)}) seems unusual. Re-searching...")
-        temp_patterns = [
-            r"Temperature[:= ]+(\d+\.?\d*)",
-            r"Temp[:= ]+(\d+\.?\d*)",
-            r"Body\s+Temp[:= ]+(\d+\.?\d*)",
-            r"(\d+\.?\d*)\s*°?\s*F",  # 98.6 F or 98.6°F
-            r"(\d+\.?\d*)\s*°?\s*Fahrenheit",
-        ]
-        for pattern in temp_patterns:
-            matches = re.finditer(pattern, text, re.IGNORECASE)
-            for match in matches:
-                try:
-                    temp_val = float(match.group(1))
-                    # Only use if it's a reasonable value (90-110°F)
-                    if 90 <= temp_val <= 110:
-                        print(f"[INFO] Found better Temp value: {temp_val} from pattern '{match.group(0)}'")
-                        extracted["body_temp"] = temp_val
-                        break
-                except (ValueError, IndexError):
-                    continue
-            if 90 <= extracted.get("body_temp", 0) <= 110:
-                break
-    
+    if extracted is None:
+        extracted = extract_values_from_text(text)
+
     print(f"[DEBUG] Final extracted values after validation: {extracted}")
 
     return extracted
 
 
 # ------------------------- MATERNAL HEALTH PREDICTION -------------------------
+# Quantization step per feature for the prediction memo key
+MATERNAL_CACHE_STEPS = {
+    "age": 1,
+    "systolic_bp": 1,
+    "diastolic_bp": 1,
+    "bs": 0.1,
+    "heart_rate": 1,
+    "body_temp": 0.1,
+}
+
+
+def _get_maternal_prediction_cache():
+    global _maternal_prediction_cache
+    if not getattr(settings, "MATERNAL_PREDICTION_CACHE_ENABLED", True):
+        return None
+    if _maternal_prediction_cache is None:
+        with _maternal_model_lock:
+            if _maternal_prediction_cache is None:
+                from .ttl_cache import TTLCache
+                _maternal_prediction_cache = TTLCache(
+                    max_size=getattr(settings, "MATERNAL_PREDICTION_CACHE_SIZE", 4096),
+                    ttl=getattr(settings, "MATERNAL_PREDICTION_CACHE_TTL", 600),
+                )
+    return _maternal_prediction_cache
+
+
+# The rule-based overrides in _predict_maternal_health_uncached compare these
+# features against fixed thresholds; which side of each a value falls on is
+# part of the memo key, so rounding can never move a value across one
+MATERNAL_RISK_THRESHOLDS = {
+    "systolic_bp": (0, 140, 160),
+    "diastolic_bp": (0, 90, 100),
+    "bs": (0, 200, 250),
+    "heart_rate": (0, 100, 120),
+}
+
+
+def _maternal_cache_key(data):
+    """
+    Memo key for a feature dict: each feature rounded to MATERNAL_CACHE_STEPS
+    plus the threshold side of every MATERNAL_RISK_THRESHOLDS comparison
+    (raises on non-numeric input).
+    """
+    quantized = []
+    sides = []
+    for name in MATERNAL_FEATURES:
+        value = data.get(name)
+        if value is None:
+            value = MATERNAL_FEATURE_DEFAULTS.get(name, 0)
+        value = float(value)
+        step = MATERNAL_CACHE_STEPS[name]
+        quantized.append(round(round(value / step) * step, 6))
+        sides.extend(value > 0 if limit == 0 else value >= limit for limit in MATERNAL_RISK_THRESHOLDS.get(name, ()))
+    return tuple(quantized) + tuple(sides)
+
+
 def predict_maternal_health(data):
-    """Predict maternal health risk based on structured values."""
+    """
+    Predict maternal health risk based on structured values.
+    Results are memoized per model file hash and quantized feature vector;
+    the key also records which side of each rule threshold the raw values
+    fall on, so a cached result never has a different rule outcome.
+    """
+    client = get_model_server_client()
+    if client is not None:
+        try:
+            return client.predict_maternal(data)
+        except Exception as e:
+            logger.error(f"Maternal prediction via model server failed: {str(e)}")
+            return {"success": False, "error": str(e)}
+
+    cache = _get_maternal_prediction_cache()
+    if cache is None:
+        return _predict_maternal_health_uncached(data)
+
+    try:
+        key = _maternal_cache_key(data)
+    except (ValueError, TypeError):
+        return _predict_maternal_health_uncached(data)
+
+    model_hash = get_maternal_model_hash()
+    key = (model_hash,) + key
+    cached = cache.get(key)
+    if cached is not None:
+        return dict(cached)
+
+    result = _predict_maternal_health_uncached(data)
+    if result.get("success") and model_hash is not None:
+        cache.set(key, dict(result))
+    return result
+
+
+def _predict_maternal_health_uncached(data):
     if np is None:
         return {"success": False, "error": "NumPy not installed"}
 
@@ -466,49 +772,227 @@ def predict_maternal_health(data):
         return {"success": False, "error": str(e)}
 
 
+# ------------------------- BULK MATERNAL HEALTH PREDICTION -------------------------
+MATERNAL_FEATURES = ("age", "systolic_bp", "diastolic_bp", "bs", "heart_rate", "body_temp")
+MATERNAL_FEATURE_DEFAULTS = {"body_temp": 98.6}
+_RISK_LABELS = np.array(["Low Risk", "Medium Risk", "High Risk"]) if np is not None else None
+
+
+def _maternal_feature_row(record):
+    """Coerce one record into the 6-feature row used by the model (raises ValueError/TypeError)."""
+    row = []
+    for name in MATERNAL_FEATURES:
+        value = record.get(name)
+        if value is None or value == "":
+            value = MATERNAL_FEATURE_DEFAULTS.get(name, 0)
+        row.append(float(value))
+    return row
+
+
+def _interpret_maternal_health_risk_array(p, has_high_risk_values):
+    """Vectorised _interpret_maternal_health_risk: returns 0=Low, 1=Medium, 2=High."""
+    high_cut = np.where(has_high_risk_values, 0.60, 0.80)
+    medium_cut = np.where(has_high_risk_values, 0.35, 0.60)
+    return np.where(p >= high_cut, 2, np.where(p >= medium_cut, 1, 0))
+
+
+def predict_maternal_health_batch(records):
+    """
+    Score many maternal health records with a single predict_proba call.
+
+    Applies the same class selection, thresholds and high-risk / normal-value
+    overrides as predict_maternal_health, as NumPy masks over an N x 6 matrix.
+    Returns one dict per input record, in order, with the same shape as
+    predict_maternal_health (rows that cannot be parsed get success=False).
+    """
+    client = get_model_server_client()
+    if client is not None:
+        try:
+            return client.predict_maternal_batch(list(records))
+        except Exception as e:
+            logger.error(f"Maternal batch prediction via model server failed: {str(e)}")
+            return [{"success": False, "error": str(e)} for _ in records]
+
+    if np is None:
+        return [{"success": False, "error": "NumPy not installed"} for _ in records]
+
+    model = load_maternal_health_model()
+    if model is None:
+        return [{"success": False, "error": "Maternal model missing"} for _ in records]
+
+    results = [None] * len(records)
+    rows, index = [], []
+    for i, record in enumerate(records):
+        try:
+            rows.append(_maternal_feature_row(record))
+            index.append(i)
+        except (ValueError, TypeError, AttributeError) as e:
+            results[i] = {"success": False, "error": f"Invalid record: {str(e)}"}
+
+    if not rows:
+        return results
+
+    try:
+        features = np.asarray(rows, dtype=float)
+        proba_array = np.asarray(model.predict_proba(features), dtype=float)
+    except Exception as e:
+        logger.error(f"Maternal batch prediction error: {str(e)}")
+        for i in index:
+            results[i] = {"success": False, "error": str(e)}
+        return results
+
+    sbp, dbp, bs, hr = features[:, 1], features[:, 2], features[:, 3], features[:, 4]
+    p0, p1 = proba_array[:, 0], proba_array[:, 1]
+
+    has_high_risk_values = (sbp >= 140) | (dbp >= 90) | (bs >= 200) | (hr >= 100)
+    has_normal_values = (
+        (sbp > 0) & (sbp < 140) &
+        (dbp > 0) & (dbp < 90) &
+        (bs > 0) & (bs < 200) &
+        (hr > 0) & (hr < 100)
+    )
+
+    # High-risk rows take the larger class probability; so do normal rows
+    proba = np.where(has_high_risk_values & (p0 > p1), p0, np.maximum(p0, p1))
+    risk = _interpret_maternal_health_risk_array(proba, has_high_risk_values)
+
+    # Severe-indicator upgrades (mirrors the if/elif chain in predict_maternal_health)
+    severe_indicators = (
+        (sbp >= 160).astype(int) + (dbp >= 100).astype(int) +
+        (bs >= 250).astype(int) + (hr >= 120).astype(int)
+    )
+    severe_bp_or_bs = (sbp >= 160) | (dbp >= 100) | (bs >= 250)
+    to_high = has_high_risk_values & (severe_indicators >= 2) & (risk != 2)
+    to_medium = has_high_risk_values & ~to_high & (severe_indicators >= 1) & (risk == 0)
+    medium_to_high = has_high_risk_values & ~to_high & ~to_medium & (risk == 1) & severe_bp_or_bs
+    to_low = ~has_high_risk_values & has_normal_values & (risk == 1)
+    risk = np.where(to_high | medium_to_high, 2, np.where(to_medium, 1, np.where(to_low, 0, risk)))
+
+    # Final validation: high-risk inputs scored Low Risk may switch to the other class
+    proba_alt = np.where(proba == p1, p0, p1)
+    use_alt = has_high_risk_values & (risk == 0) & (proba < 0.50) & (proba_alt > proba)
+    proba = np.where(use_alt, proba_alt, proba)
+    risk = np.where(use_alt, _interpret_maternal_health_risk_array(proba, has_high_risk_values), risk)
+
+    labels = _RISK_LABELS[risk]
+    for row, i in enumerate(index):
+        p = float(proba[row])
+        label = str(labels[row])
+        results[i] = {
+            "success": True,
+            "prediction_proba": p,
+            "probability": p,
+            "risk_level": label,
+            "prediction": f"Maternal health risk: {label} (Probability: {p:.2%})",
+        }
+    return results
+
+
 # ------------------------- PRETERM DELIVERY PREDICTION -------------------------
+_preprocess_buffers = threading.local()
+
+
+def preprocess_preterm_image(img, out=None):
+    """PIL image -> (1, 224, 224, 3) float32 array scaled to [0, 1], as the CNN was trained."""
+    from .preprocessing import preprocess_image
+    return preprocess_image(img, out=out, draft=getattr(settings, "PRETERM_JPEG_DRAFT", True))
+
+
+def _preprocess_buffer():
+    """Per-thread input buffer, reused across requests (predictions are synchronous)."""
+    buf = getattr(_preprocess_buffers, "buf", None)
+    if buf is None:
+        buf = _preprocess_buffers.buf = np.empty((1, 224, 224, 3), dtype=np.float32)
+    return buf
+
+
 def predict_preterm_delivery(data):
     """Predict preterm delivery using ultrasound image."""
     if np is None:
         return {"success": False, "error": "NumPy not installed"}
 
-    model = load_preterm_delivery_model()
-    if model is None:
-        return {"success": False, "error": "Preterm model missing"}
+    client = get_model_server_client()
+    model = None
+    if client is None:
+        model = load_preterm_delivery_model()
+        if model is None:
+            return {"success": False, "error": "Preterm model missing"}
 
     try:
-        from PIL import Image
-        import io
+        from .preprocessing import open_upload_image
 
-        if "image_file" in data:
-            img = Image.open(data["image_file"])
-        elif "image_data" in data:
-            import base64
-            img_bytes = base64.b64decode(data["image_data"])
-            img = Image.open(io.BytesIO(img_bytes))
-        else:
+        img = open_upload_image(data)
+        if img is None:
             return {"success": False, "error": "Image is required"}
 
-        img = img.convert("RGB").resize((224, 224))
-        img_array = np.expand_dims(np.array(img) / 255.0, axis=0)
+        img_array = preprocess_preterm_image(img, out=_preprocess_buffer())
 
-        prediction = model.predict(img_array, verbose=0)
-        probability = float(prediction[0][0])
-        probability = max(0.0, min(1.0, probability))
-        risk = _interpret_preterm_risk(probability)
-
-        return {
-            "success": True,
-            "probability": probability,
-            "risk_level": risk,
-            "prediction": f"Preterm delivery risk: {risk}",
-        }
+        if client is not None:
+            prediction = client.predict_preterm(img_array)
+        else:
+            prediction = _run_preterm_model(model, img_array)
+        return _preterm_result(prediction[0][0])
 
     except Exception as e:
         logger.error(f"Preterm prediction error: {str(e)}")
         return {"success": False, "error": str(e)}
 
 
+def _preterm_result(raw_probability):
+    probability = max(0.0, min(1.0, float(raw_probability)))
+    risk = _interpret_preterm_risk(probability)
+    return {
+        "success": True,
+        "probability": probability,
+        "risk_level": risk,
+        "prediction": f"Preterm delivery risk: {risk}",
+    }
+
+
+def preprocess_preterm_upload(data):
+    """
+    Open and preprocess one scan (``image_file`` or ``image_data``) into a new
+    (1, 224, 224, 3) float32 array. Raises ValueError when no image is given.
+    Safe to call from several threads at once.
+    """
+    from .preprocessing import open_upload_image
+
+    img = open_upload_image(data)
+    if img is None:
+        raise ValueError("Image is required")
+    return preprocess_preterm_image(img)
+
+
+def predict_preterm_delivery_batch(img_arrays):
+    """
+    Score several preprocessed scans with one CNN call.
+
+    ``img_arrays`` is a list of (1, 224, 224, 3) arrays from
+    preprocess_preterm_upload; returns one result dict per scan, in order,
+    shaped like predict_preterm_delivery's.
+    """
+    if np is None:
+        return [{"success": False, "error": "NumPy not installed"} for _ in img_arrays]
+    if not img_arrays:
+        return []
+
+    client = get_model_server_client()
+    try:
+        batch = np.concatenate(img_arrays)
+        if client is not None:
+            prediction = client.predict_preterm(batch)
+        else:
+            model = load_preterm_delivery_model()
+            if model is None:
+                return [{"success": False, "error": "Preterm model missing"} for _ in img_arrays]
+            prediction = _run_preterm_model(model, batch)
+    except Exception as e:
+        logger.error(f"Preterm batch prediction error: {str(e)}")
+        return [{"success": False, "error": str(e)} for _ in img_arrays]
+
+    return [_preterm_result(row[0]) for row in prediction]
+
+
 # ------------------------- RISK INTERPRETATION THRESHOLDS -------------------------
 def _interpret_maternal_health_risk(p, has_high_risk_values=False):
     """
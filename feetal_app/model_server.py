@@ -0,0 +1,239 @@
+"""
+Out-of-process model server over a Unix domain socket.
+
+``python manage.py run_model_server`` starts a process that owns both the
+maternal health model and the preterm CNN. Web workers configured with
+``ML_MODEL_SERVER_SOCKET`` send requests through a pooled
+ModelServerClient instead of loading TensorFlow themselves, so the number
+of web workers no longer multiplies model memory.
+
+Wire format (both directions): a 4-byte big-endian header length, a JSON
+header, then ``payload_size`` bytes of raw payload (used for image tensors).
+"""
+import json
+import logging
+import os
+import queue
+import socket
+import socketserver
+import struct
+import threading
+
+logger = logging.getLogger(__name__)
+
+_HEADER_SIZE = struct.Struct("!I")
+
+
+class ModelServerError(Exception):
+    """Raised by the client when the model server cannot be reached or fails."""
+
+
+class ClosedBeforeMessage(ConnectionError):
+    """The peer closed the connection before sending any byte of the next message."""
+
+
+# ------------------------- FRAMING -------------------------
+def _recv_exact(sock, size, message_start=False):
+    buf = bytearray(size)
+    view = memoryview(buf)
+    received = 0
+    while received < size:
+        n = sock.recv_into(view[received:], size - received)
+        if n == 0:
+            if message_start and received == 0:
+                raise ClosedBeforeMessage("connection closed by peer")
+            raise ConnectionError("connection closed by peer")
+        received += n
+    return bytes(buf)
+
+
+def send_message(sock, header, payload=b""):
+    header = dict(header, payload_size=len(payload))
+    raw = json.dumps(header).encode("utf-8")
+    sock.sendall(_HEADER_SIZE.pack(len(raw)) + raw)
+    if payload:
+        sock.sendall(payload)
+
+
+def recv_message(sock):
+    (size,) = _HEADER_SIZE.unpack(_recv_exact(sock, _HEADER_SIZE.size, message_start=True))
+    header = json.loads(_recv_exact(sock, size).decode("utf-8"))
+    payload_size = header.pop("payload_size", 0)
+    payload = _recv_exact(sock, payload_size) if payload_size else b""
+    return header, payload
+
+
+# ------------------------- SERVER -------------------------
+class _ModelRequestHandler(socketserver.BaseRequestHandler):
+    """Serve requests on one persistent client connection until it closes."""
+
+    def handle(self):
+        while True:
+            try:
+                header, payload = recv_message(self.request)
+            except (ConnectionError, OSError):
+                return
+            try:
+                response = self.server.dispatch(header, payload)
+            except Exception as e:
+                logger.error(f"Model server request failed: {str(e)}")
+                response = {"success": False, "error": str(e)}
+            try:
+                send_message(self.request, response)
+            except OSError:
+                return
+
+
+class ModelServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Threaded Unix-socket server that runs predictions with the local models."""
+
+    daemon_threads = True
+
+    def __init__(self, socket_path):
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        super().__init__(socket_path, _ModelRequestHandler)
+        os.chmod(socket_path, 0o660)
+        self.socket_path = socket_path
+
+    def dispatch(self, header, payload):
+        from . import ml_service
+        import numpy as np
+
+        op = header.get("op")
+        if op == "maternal":
+            return ml_service.predict_maternal_health(header.get("data") or {})
+        if op == "maternal_batch":
+            return {"success": True, "results": ml_service.predict_maternal_health_batch(header.get("records") or [])}
+        if op == "preterm":
+            model = ml_service.load_preterm_delivery_model()
+            if model is None:
+                return {"success": False, "error": "Preterm model missing"}
+            batch = np.frombuffer(payload, dtype=header.get("dtype", "float32")).reshape(header["shape"])
+            prediction = ml_service._run_preterm_model(model, batch)
+            return {"success": True, "predictions": np.asarray(prediction, dtype=float).tolist()}
+        if op == "ping":
+            return {
+                "success": True,
+                "pid": os.getpid(),
+                "readiness": ml_service.get_model_readiness(),
+                "stats": ml_service.get_inference_stats(),
+            }
+        return {"success": False, "error": f"Unknown operation: {op}"}
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+# ------------------------- CLIENT -------------------------
+class ModelServerClient:
+    """Thread-safe client keeping up to ``pool_size`` idle connections open."""
+
+    def __init__(self, socket_path, pool_size=4, timeout=60):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._pool = queue.LifoQueue(maxsize=max(1, int(pool_size)))
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.connects = 0
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        with self._lock:
+            self.connects += 1
+        return sock
+
+    def _checkout(self):
+        try:
+            return self._pool.get_nowait(), True
+        except queue.Empty:
+            return self._connect(), False
+
+    def _checkin(self, sock):
+        try:
+            self._pool.put_nowait(sock)
+        except queue.Full:
+            sock.close()
+
+    def _fail(self, message):
+        with self._lock:
+            self.errors += 1
+        return ModelServerError(message)
+
+    def request(self, header, payload=b""):
+        """
+        Send one request. A pooled connection the server has closed in the
+        meantime (the send fails, or the reply is EOF before any byte) is
+        retried once on a fresh connection. Anything else, timeouts included,
+        raises: the server may already be running the request.
+        """
+        with self._lock:
+            self.requests += 1
+        for attempt in range(2):
+            try:
+                sock, reused = self._checkout()
+            except OSError as e:
+                raise self._fail(f"Model server unavailable at {self.socket_path}: {str(e)}")
+            stale = reused and attempt == 0
+            try:
+                try:
+                    send_message(sock, header, payload)
+                except socket.timeout:
+                    raise
+                except OSError:
+                    if stale:
+                        sock.close()
+                        continue
+                    raise
+                try:
+                    response, _ = recv_message(sock)
+                except ClosedBeforeMessage:
+                    if stale:
+                        sock.close()
+                        continue
+                    raise
+            except (OSError, ValueError) as e:
+                sock.close()
+                raise self._fail(f"Model server request failed: {str(e)}")
+            self._checkin(sock)
+            return response
+
+    # Convenience wrappers used by ml_service
+    def predict_maternal(self, data):
+        return self.request({"op": "maternal", "data": data})
+
+    def predict_maternal_batch(self, records):
+        response = self.request({"op": "maternal_batch", "records": records})
+        if not response.get("success"):
+            raise ModelServerError(response.get("error", "Batch prediction failed"))
+        return response["results"]
+
+    def predict_preterm(self, img_batch):
+        import numpy as np
+
+        batch = np.ascontiguousarray(img_batch, dtype=np.float32)
+        response = self.request(
+            {"op": "preterm", "shape": list(batch.shape), "dtype": "float32"},
+            batch.tobytes(),
+        )
+        if not response.get("success"):
+            raise ModelServerError(response.get("error", "Preterm prediction failed"))
+        return np.asarray(response["predictions"], dtype=float)
+
+    def ping(self):
+        return self.request({"op": "ping"})
+
+    def stats(self):
+        with self._lock:
+            return {
+                "socket": self.socket_path,
+                "requests": self.requests,
+                "errors": self.errors,
+                "connects": self.connects,
+                "idle_connections": self._pool.qsize(),
+            }
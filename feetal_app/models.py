@@ -1,3 +1,5 @@
+import uuid
+
 from django.db import models
 from django.contrib.auth.models import User
 
@@ -82,6 +84,23 @@ class Appointment(models.Model):
         verbose_name = "Appointment"
         verbose_name_plural = "Appointments"
         ordering = ['-appointment_date', '-appointment_time']
+        # Doctor/patient listings filter by the FK and sort by date and time; the admin
+        # dashboard sorts all appointments the same way and counts them by status
+        indexes = [
+            models.Index(fields=['doctor', 'appointment_date', 'appointment_time'], name='appt_doctor_date_time'),
+            models.Index(fields=['doctor', 'status'], name='appt_doctor_status'),
+            models.Index(fields=['patient', 'appointment_date', 'appointment_time'], name='appt_patient_date_time'),
+            models.Index(fields=['appointment_date', 'appointment_time'], name='appt_date_time'),
+            models.Index(fields=['status', 'appointment_date'], name='appt_status_date'),
+        ]
+        # A doctor's slot can be held by one active appointment; cancelling frees it
+        constraints = [
+            models.UniqueConstraint(
+                fields=['doctor', 'appointment_date', 'appointment_time'],
+                condition=~models.Q(status='cancelled'),
+                name='appt_unique_active_slot',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.patient_name} - Dr. {self.doctor.user.get_full_name()} - {self.appointment_date} {self.appointment_time}"
@@ -90,11 +109,71 @@ class AnalysisReport(models.Model):
     patient_name = models.CharField(max_length=255)
     patient_email = models.EmailField(blank=True)
     combined_risk_level = models.CharField(max_length=50)
-    pdf = models.FileField(upload_to="analysis_reports/")
+    # Content-addressed: analysis_reports/ab/cd/<sha256>.pdf, shared by identical reports (see pdf_store.py)
+    pdf = models.FileField(upload_to="analysis_reports/", blank=True, db_index=True)
+    # Preterm/maternal/combined results the PDF is rendered from (see reports.report_data)
+    analysis_data = models.JSONField(null=True, blank=True)
+    # Resolved once per stored PDF, so downloads need no stat calls (see downloads.py)
+    pdf_size = models.PositiveIntegerField(null=True, blank=True)
+    pdf_etag = models.CharField(max_length=64, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # The admin listings page through reports newest first (see pagination.py)
+        indexes = [models.Index(fields=['created_at', 'id'], name='report_created_id')]
+
     def __str__(self):
         return f"{self.patient_name} - {self.combined_risk_level} ({self.created_at.date()})"
+
+    @property
+    def has_pdf(self):
+        """True when a PDF is stored or can be rendered from the saved results."""
+        return bool(self.pdf) or bool(self.analysis_data)
+
+
+class AnalysisJob(models.Model):
+    """Queued combined analysis: uploads are persisted to storage and processed by a job worker."""
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_COMPLETED = 'completed'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_COMPLETED, 'Completed'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    job_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    progress = models.PositiveSmallIntegerField(default=0)
+    stage = models.CharField(max_length=100, blank=True)
+
+    patient_name = models.CharField(max_length=255)
+    patient_email = models.EmailField(blank=True)
+    # Storage names of the persisted uploads
+    scanning_files = models.JSONField(default=list)
+    medical_files = models.JSONField(default=list)
+
+    report = models.ForeignKey(AnalysisReport, on_delete=models.SET_NULL, null=True, blank=True, related_name='jobs')
+    error = models.TextField(blank=True)
+    error_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    worker = models.CharField(max_length=100, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Analysis Job"
+        verbose_name_plural = "Analysis Jobs"
+        ordering = ['created_at']
+        indexes = [models.Index(fields=['status', 'created_at'], name='analysisjob_status_created')]
+
+    def __str__(self):
+        return f"{self.job_id} - {self.patient_name} ({self.status})"
 from django.db import models
 
 class MLReport(models.Model):
@@ -0,0 +1,159 @@
+"""
+Tesseract OCR fallback for scanned (image-only) PDF reports.
+
+Only pages whose text layer is empty are rasterized (greyscale PNG at
+OCR_DPI), and at most OCR_MAX_PAGES of them per document. Each page is
+recognized by a separate ``tesseract`` run (settings.TESSERACT_CMD) on a
+bounded process pool shared by the whole process, with a per-page timeout,
+so a burst of scanned uploads cannot take over the machine.
+"""
+import io
+import logging
+import multiprocessing
+import os
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_tesseract_cmd():
+    """Resolved Tesseract executable, or None when OCR is disabled or not installed."""
+    if not getattr(settings, "OCR_ENABLED", True):
+        return None
+    cmd = getattr(settings, "TESSERACT_CMD", "tesseract")
+    if os.path.isfile(cmd):
+        return cmd
+    return shutil.which(cmd)
+
+
+def ocr_config_tag():
+    """Short description of the OCR settings, used in the report cache version."""
+    if get_tesseract_cmd() is None:
+        return "ocr-off"
+    return f"ocr{getattr(settings, 'OCR_DPI', 200)}x{getattr(settings, 'OCR_MAX_PAGES', 5)}"
+
+
+def run_tesseract(png_bytes, tesseract_cmd, lang="eng", timeout=30):
+    """
+    Process-pool entry point: OCR one PNG page and return its text ("" on
+    failure or timeout). Tesseract reads the image from stdin.
+    """
+    env = dict(os.environ, OMP_THREAD_LIMIT="1")  # one core per page; the pool provides parallelism
+    try:
+        completed = subprocess.run(
+            [tesseract_cmd, "stdin", "stdout", "-l", lang],
+            input=png_bytes,
+            capture_output=True,
+            timeout=timeout,
+            env=env,
+        )
+    except subprocess.TimeoutExpired:
+        logger.warning(f"Tesseract timed out after {timeout}s")
+        return ""
+    except OSError as e:
+        logger.warning(f"Could not run Tesseract: {str(e)}")
+        return ""
+    if completed.returncode != 0:
+        logger.warning(f"Tesseract failed: {completed.stderr.decode('utf-8', errors='ignore')[:200]}")
+        return ""
+    return completed.stdout.decode("utf-8", errors="ignore")
+
+
+def get_ocr_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # spawn: forking a multi-threaded web worker is unsafe
+                _pool = ProcessPoolExecutor(
+                    max_workers=getattr(settings, "OCR_MAX_WORKERS", 2),
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+    return _pool
+
+
+def rasterize_page(page, dpi):
+    """Render a pdfplumber page to greyscale PNG bytes."""
+    image = page.to_image(resolution=dpi).original.convert("L")
+    buf = io.BytesIO()
+    image.save(buf, "PNG")
+    return buf.getvalue()
+
+
+class PageOCR:
+    """
+    Collects text-less pages of one PDF and OCRs them in the background.
+
+    ``submit(page)`` rasterizes the page and queues it immediately, so OCR
+    overlaps with parsing the rest of the document; ``results()`` waits for
+    the queued pages and returns {page_number: text}.
+    """
+
+    # Seconds on top of the per-page timeouts before results() gives up on the pool
+    slack = 10
+
+    def __init__(self):
+        self.tesseract_cmd = get_tesseract_cmd()
+        self.dpi = getattr(settings, "OCR_DPI", 200)
+        self.max_pages = getattr(settings, "OCR_MAX_PAGES", 5)
+        self.timeout = getattr(settings, "OCR_PAGE_TIMEOUT", 30)
+        self.lang = getattr(settings, "OCR_LANG", "eng")
+        self._futures = {}
+
+    @property
+    def enabled(self):
+        return self.tesseract_cmd is not None
+
+    def submit(self, page):
+        """Queue one page for OCR; returns False once the page limit is reached."""
+        if not self.enabled or len(self._futures) >= self.max_pages:
+            return False
+        try:
+            png = rasterize_page(page, self.dpi)
+        except Exception as e:
+            logger.warning(f"Could not rasterize page {page.page_number}: {str(e)}")
+            return False
+        self._futures[page.page_number] = get_ocr_pool().submit(
+            run_tesseract, png, self.tesseract_cmd, self.lang, self.timeout
+        )
+        return True
+
+    def __len__(self):
+        return len(self._futures)
+
+    def _deadline(self):
+        # Workers enforce the per-page timeout; pages beyond the pool size wait
+        # for a free worker, so allow one timeout per round plus some slack
+        workers = max(1, getattr(settings, "OCR_MAX_WORKERS", 2))
+        rounds = -(-len(self._futures) // workers)
+        return time.monotonic() + rounds * self.timeout + self.slack
+
+    def results(self):
+        """{page_number: text} for the queued pages, waiting at most one deadline for all of them."""
+        texts = {}
+        deadline = self._deadline()
+        for page_number, future in self._futures.items():
+            try:
+                texts[page_number] = future.result(timeout=max(0, deadline - time.monotonic()))
+            except TimeoutError:
+                logger.warning(f"OCR of page {page_number} did not finish in time")
+                texts[page_number] = ""
+            except Exception as e:
+                logger.warning(f"OCR of page {page_number} failed: {str(e)}")
+                texts[page_number] = ""
+        # Queued pages nobody waits for any more would keep the shared pool busy
+        self.cancel()
+        return texts
+
+    def cancel(self):
+        for future in self._futures.values():
+            future.cancel()
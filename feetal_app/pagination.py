@@ -0,0 +1,78 @@
+"""
+Keyset (cursor) pagination for the JSON listing endpoints.
+
+Pages are ordered newest first by a fixed list of fields ending in the
+primary key. Instead of an OFFSET, the next page starts after the last row
+of the previous one: the cursor carries that row's values, and the query
+asks for rows that sort after them. With an index on the ordering fields,
+page N costs the same as page 1.
+"""
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values):
+    # Full isoformat: DjangoJSONEncoder would cut microseconds and break ties
+    values = [value.isoformat() if hasattr(value, "isoformat") else value for value in values]
+    data = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def decode_cursor(model, fields, cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(fields):
+            raise ValueError("wrong length")
+        return [model._meta.get_field(name).to_python(value) for name, value in zip(fields, values)]
+    except (ValueError, TypeError, ValidationError) as e:
+        raise InvalidCursor("Invalid cursor.") from e
+
+
+def _after(fields, values):
+    """
+    Rows that sort after ``values`` in descending ``fields`` order:
+    a <= x AND (a < x OR (a = x AND (b < y OR (b = y AND ...)))). The leading
+    a <= x gives the database an index range to start from.
+    """
+    condition = Q(**{f"{fields[-1]}__lt": values[-1]})
+    for name, value in zip(reversed(fields[:-1]), reversed(values[:-1])):
+        condition = Q(**{f"{name}__lt": value}) | (Q(**{name: value}) & condition)
+    return Q(**{f"{fields[0]}__lte": values[0]}) & condition
+
+
+def parse_limit(raw, default=DEFAULT_LIMIT):
+    try:
+        limit = int(raw) if raw else default
+    except (TypeError, ValueError):
+        limit = default
+    return max(1, min(limit, MAX_LIMIT))
+
+
+def keyset_page(queryset, fields, cursor=None, limit=DEFAULT_LIMIT):
+    """
+    One page of ``queryset`` ordered by ``fields`` descending (model field
+    names, the last one unique, normally "id"). Returns (rows, next_cursor);
+    next_cursor is None on the last page. Raises InvalidCursor.
+    """
+    queryset = queryset.order_by(*(f"-{name}" for name in fields))
+    if cursor:
+        queryset = queryset.filter(_after(fields, decode_cursor(queryset.model, fields, cursor)))
+
+    rows = list(queryset[:limit + 1])
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([getattr(last, name) for name in fields])
+    return rows, next_cursor
@@ -0,0 +1,66 @@
+"""
+Content-addressed storage for AnalysisReport PDFs.
+
+A PDF is stored once under the SHA-256 of its bytes, sharded by the first two
+byte pairs of the digest (``analysis_reports/ab/cd/abcd....pdf``), so names
+never collide and identical PDFs share one file. The AnalysisReport rows that
+point at a file are its references: the file is deleted together with the
+last of them (see signals.py).
+
+Existing timestamp-named files are moved in with
+``python manage.py rehash_report_pdfs``.
+"""
+import hashlib
+import logging
+import re
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from .models import AnalysisReport
+
+logger = logging.getLogger(__name__)
+
+PDF_ROOT = "analysis_reports"
+CONTENT_NAME_RE = re.compile(rf"^{PDF_ROOT}/[0-9a-f]{{2}}/[0-9a-f]{{2}}/([0-9a-f]{{64}})\.pdf$")
+
+
+def content_name(digest):
+    return f"{PDF_ROOT}/{digest[:2]}/{digest[2:4]}/{digest}.pdf"
+
+
+def is_content_addressed(name):
+    return bool(name and CONTENT_NAME_RE.match(name))
+
+
+def store_pdf(pdf_bytes):
+    """
+    Store a PDF under its content hash unless an identical one is already
+    stored. Returns (name, fingerprint) where fingerprint holds the
+    pdf_etag / pdf_size field values.
+    """
+    digest = hashlib.sha256(pdf_bytes).hexdigest()
+    name = content_name(digest)
+    if not default_storage.exists(name):
+        saved = default_storage.save(name, ContentFile(pdf_bytes))
+        if saved != name:
+            # Written concurrently by another worker: same bytes, keep theirs
+            default_storage.delete(saved)
+    return name, {"pdf_etag": digest, "pdf_size": len(pdf_bytes)}
+
+
+def release_pdf(name, exclude_pk=None):
+    """Delete a stored PDF unless another AnalysisReport still references it."""
+    if not name:
+        return False
+    others = AnalysisReport.objects.filter(pdf=name)
+    if exclude_pk is not None:
+        others = others.exclude(pk=exclude_pk)
+    if others.exists():
+        return False
+    try:
+        default_storage.delete(name)
+    except Exception as e:
+        logger.warning(f"Could not delete report PDF {name}: {str(e)}")
+        return False
+    return True
@@ -0,0 +1,140 @@
+"""
+Ultrasound image preprocessing for the preterm CNN.
+
+The original pipeline (``convert("RGB")`` -> ``resize`` -> ``np.array / 255.0``)
+decoded every scan at full resolution, converted it to RGB at full size and
+went through a float64 array. Here:
+
+- base64 uploads are decoded lazily by a seekable reader, so no full copy of
+  the image bytes is made before PIL starts reading;
+- JPEGs are decoded with ``draft`` so libjpeg scales by 1/2, 1/4 or 1/8
+  during decoding, and other formats are shrunk with ``reduce`` via
+  ``reducing_gap`` before the final resample;
+- RGB/greyscale images are resized before the mode conversion, so the
+  conversion touches 224x224 pixels only;
+- pixels are scaled straight into a caller-provided float32 buffer.
+"""
+import base64
+import binascii
+import io
+import re
+
+import numpy as np
+from PIL import Image
+
+TARGET_SIZE = (224, 224)
+
+# Larger gaps are closer to a single full-quality resample; 3.0 is
+# indistinguishable from it in practice (see Pillow's Image.resize docs).
+REDUCING_GAP = 3.0
+
+# Modes that can be resampled before conversion with the same result as
+# converting first ("P"/"1" would be resampled with NEAREST, RGBA premultiplied)
+_RESIZE_BEFORE_CONVERT_MODES = ("RGB", "L")
+
+_DATA_URL_PREFIX = re.compile(r"^data:[\w/+.-]*;base64,")
+_CLEAN_BASE64 = re.compile(rb"[A-Za-z0-9+/]*={0,2}")
+_PIXEL_SCALE = np.float32(255.0)
+
+
+class Base64Reader(io.RawIOBase):
+    """
+    Seekable read-only file over base64 text that decodes only the bytes
+    being read. Requires unbroken base64 (no whitespace); use
+    ``open_base64_image`` which falls back to a full decode otherwise.
+    """
+
+    def __init__(self, encoded):
+        super().__init__()
+        self._encoded = encoded
+        padding = len(encoded) - len(encoded.rstrip(b"="))
+        self._size = len(encoded) // 4 * 3 - padding
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self._size + offset
+        else:
+            raise ValueError(f"invalid whence ({whence})")
+        if pos < 0:
+            raise ValueError(f"negative seek position {pos}")
+        self._pos = pos
+        return pos
+
+    def readinto(self, buffer):
+        end = min(self._pos + len(buffer), self._size)
+        if end <= self._pos:
+            return 0
+        # Decode the whole 4-character groups covering [pos, end)
+        first_group = self._pos // 3
+        last_group = (end + 2) // 3
+        chunk = binascii.a2b_base64(self._encoded[first_group * 4:last_group * 4])
+        skip = self._pos - first_group * 3
+        n = end - self._pos
+        buffer[:n] = chunk[skip:skip + n]
+        self._pos = end
+        return n
+
+
+def open_base64_image(data):
+    """Open base64 image data (str or bytes, optional ``data:`` URL prefix) with PIL."""
+    if isinstance(data, str):
+        data = _DATA_URL_PREFIX.sub("", data, count=1).encode("ascii")
+    if len(data) % 4 == 0 and _CLEAN_BASE64.fullmatch(data):
+        return Image.open(Base64Reader(data))
+    # Wrapped lines or other noise: decode the same way base64.b64decode always did
+    return Image.open(io.BytesIO(base64.b64decode(data)))
+
+
+def open_upload_image(data):
+    """PIL image from ``image_file`` (upload/file object) or ``image_data`` (base64)."""
+    if "image_file" in data:
+        return Image.open(data["image_file"])
+    if "image_data" in data:
+        return open_base64_image(data["image_data"])
+    return None
+
+
+def resize_for_model(img, size=TARGET_SIZE, draft=True):
+    """Decode and shrink ``img`` to ``size`` RGB, doing as little full-size work as possible."""
+    if draft and img.format == "JPEG" and img.mode in ("RGB", "L", "YCbCr"):
+        # libjpeg DCT scaling; the result is still at least ``size``
+        img.draft(img.mode, size)
+
+    if img.mode not in _RESIZE_BEFORE_CONVERT_MODES:
+        img = img.convert("RGB")
+    if img.size != size:
+        img = img.resize(size, Image.Resampling.BICUBIC, reducing_gap=REDUCING_GAP if draft else None)
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    return img
+
+
+def image_to_tensor(img, out=None):
+    """
+    Scale an RGB image into ``out`` (float32, shape H x W x 3, or 1 x H x W x 3)
+    as pixel / 255. Allocates a new (1, H, W, 3) buffer when ``out`` is None.
+    """
+    pixels = np.asarray(img, dtype=np.uint8)
+    if out is None:
+        out = np.empty((1,) + pixels.shape, dtype=np.float32)
+    np.divide(pixels, _PIXEL_SCALE, out=out.reshape(pixels.shape), dtype=np.float32)
+    return out
+
+
+def preprocess_image(img, out=None, size=TARGET_SIZE, draft=True):
+    """PIL image -> (1, H, W, 3) float32 tensor in [0, 1], written into ``out`` if given."""
+    return image_to_tensor(resize_for_model(img, size=size, draft=draft), out=out)
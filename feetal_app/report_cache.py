@@ -0,0 +1,145 @@
+"""
+Disk cache of values extracted from uploaded medical reports.
+
+Entries are keyed by the SHA-256 of the uploaded file bytes (plus the file
+type) and tagged with the extractor version, so re-uploads of the same
+PDF/DOCX skip parsing entirely and a change to the extraction patterns
+invalidates every old entry. The store is a small SQLite database with
+least-recently-used eviction once it holds more than ``max_entries`` rows.
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(file):
+    """SHA-256 hex digest of an uploaded file, read in chunks; rewinds the file."""
+    digest = hashlib.sha256()
+    if hasattr(file, "seek"):
+        file.seek(0)
+    if hasattr(file, "chunks"):
+        for chunk in file.chunks(_HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    else:
+        for chunk in iter(lambda: file.read(_HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    if hasattr(file, "seek"):
+        file.seek(0)
+    return digest.hexdigest()
+
+
+class ReportValueCache:
+    """SQLite-backed LRU cache: (sha256, file type) -> extracted values dict."""
+
+    def __init__(self, path, version, max_entries=5000):
+        self.path = str(path)
+        self.version = version
+        self.max_entries = max(1, int(max_entries))
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS report_values (
+                    digest TEXT NOT NULL,
+                    file_type TEXT NOT NULL,
+                    version TEXT NOT NULL,
+                    report_values TEXT NOT NULL,
+                    last_used REAL NOT NULL,
+                    PRIMARY KEY (digest, file_type)
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS report_values_last_used ON report_values (last_used)"
+            )
+            # Entries from another pattern set can never be hit again
+            conn.execute("DELETE FROM report_values WHERE version != ?", (self.version,))
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def get(self, digest, file_type):
+        try:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT report_values FROM report_values WHERE digest = ? AND file_type = ? AND version = ?",
+                (digest, file_type, self.version),
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE report_values SET last_used = ? WHERE digest = ? AND file_type = ?",
+                    (time.time(), digest, file_type),
+                )
+        except sqlite3.Error as e:
+            logger.warning(f"Report cache read failed: {str(e)}")
+            row = None
+
+        if row is None:
+            self._count("misses")
+            return None
+        self._count("hits")
+        return json.loads(row[0])
+
+    def set(self, digest, file_type, values):
+        try:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO report_values (digest, file_type, version, report_values, last_used) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (digest, file_type, self.version, json.dumps(values), time.time()),
+            )
+            self._count("stores")
+
+            (count,) = conn.execute("SELECT COUNT(*) FROM report_values").fetchone()
+            excess = count - self.max_entries
+            if excess > 0:
+                conn.execute(
+                    "DELETE FROM report_values WHERE rowid IN "
+                    "(SELECT rowid FROM report_values ORDER BY last_used LIMIT ?)",
+                    (excess,),
+                )
+                with self._lock:
+                    self.evictions += excess
+        except sqlite3.Error as e:
+            logger.warning(f"Report cache write failed: {str(e)}")
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "version": self.version,
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "stores": self.stores,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,323 @@
+"""
+PDF rendering for combined analysis reports.
+
+CombinedReportRenderer builds the styles, table styles and static paragraphs
+(header, section titles, table header, risk labels) once; each report only
+lays out the per-patient rows. Platypus flowables keep layout state while a
+document is built, so every thread uses its own renderer (get_report_renderer).
+
+The results a PDF is rendered from are saved on AnalysisReport.analysis_data
+(report_data), so a report whose PDF was deferred (ANALYSIS_DEFER_PDF) or
+lost can be rendered identically later (store_report_pdf). Rendering is
+deterministic (``invariant``), so a re-rendered PDF gets the same content
+hash in pdf_store.
+"""
+import io
+import threading
+from datetime import datetime
+from xml.sax.saxutils import escape
+
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.platypus import KeepTogether, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+from .models import AnalysisReport
+from .pdf_store import release_pdf, store_pdf
+
+_renderers = threading.local()
+
+
+class CombinedReportRenderer:
+    """
+    Hospital-theme PDF: Blue + White minimal clinical report
+    """
+
+    HOSPITAL_BLUE = colors.HexColor("#0052CC")
+    TEXT_BLACK = colors.HexColor("#1A1A1A")
+    TEXT_GRAY = colors.HexColor("#6B7280")
+    RISK_COLORS = {
+        "High Risk": "#D90429",
+        "Medium Risk": "#FF8800",
+        "Low Risk": "#0BA82E",
+    }
+
+    def __init__(self):
+        blue = self.HOSPITAL_BLUE
+        self.styles = {
+            "header": ParagraphStyle(name="header", alignment=TA_CENTER),
+            "sec": ParagraphStyle(name="sec", fontSize=13, textColor=blue),
+            "sec_title": ParagraphStyle(name="sec_title", fontSize=13, textColor=blue),
+            "sec2": ParagraphStyle(name="sec2", fontSize=13, textColor=blue),
+            "risk_big": ParagraphStyle(name="risk_big", alignment=TA_CENTER, leading=38),
+            "risk_conf": ParagraphStyle(name="risk_conf", alignment=TA_CENTER),
+            "hdr": ParagraphStyle(name="hdr", alignment=TA_CENTER),
+            "cell_title": ParagraphStyle(name="cell_title", fontSize=11, textColor=self.TEXT_BLACK),
+            "cell_risk": ParagraphStyle(name="cell_risk", fontSize=11, alignment=TA_CENTER),
+            "cell_prob": ParagraphStyle(name="cell_prob", fontSize=11, alignment=TA_CENTER),
+            "foot": ParagraphStyle(name="foot", fontSize=9, textColor=self.TEXT_GRAY, alignment=TA_CENTER),
+        }
+
+        self.header_style = TableStyle([
+            ("BACKGROUND", (0, 0), (-1, -1), blue),
+            ("TOPPADDING", (0, 0), (-1, -1), 18),
+            ("BOTTOMPADDING", (0, 0), (-1, -1), 18),
+        ])
+        self.patient_style = TableStyle([
+            ("TEXTCOLOR", (0, 0), (-1, -1), self.TEXT_BLACK),
+            ("FONTNAME", (0, 0), (-1, -1), "Helvetica"),
+            ("FONTSIZE", (0, 0), (-1, -1), 11),
+            ("BOTTOMPADDING", (0, 0), (-1, -1), 8),
+        ])
+        self.analysis_style = TableStyle([
+            ("BACKGROUND", (0, 0), (-1, 0), blue),
+            ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
+            ("ALIGN", (0, 0), (-1, -1), "CENTER"),
+            ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+            ("TOPPADDING", (0, 0), (-1, -1), 10),
+            ("BOTTOMPADDING", (0, 0), (-1, -1), 10),
+        ])
+
+        # Static paragraphs: the markup is parsed once and re-laid out per report
+        self.header_cell = Paragraph("<b><font size=24 color='white'>FetoScope AI</font></b>", self.styles["header"])
+        self.patient_title = Paragraph("<b>Patient Information</b>", self.styles["sec"])
+        self.risk_title = Paragraph("<b>Overall Risk Assessment</b>", self.styles["sec_title"])
+        self.analysis_title = Paragraph("<b>Detailed Analysis</b>", self.styles["sec2"])
+        self.analysis_header = [
+            Paragraph(f"<b><font size=12 color='white'>{label}</font></b>", self.styles["hdr"])
+            for label in ("Analysis Type", "Risk Level", "Probability")
+        ]
+        self.row_titles = {
+            title: Paragraph(title, self.styles["cell_title"])
+            for title in ("Preterm Delivery (Image-based)", "Maternal Health (Reports-based)")
+        }
+        self.risk_cells = {}
+        self.risk_banners = {}
+        for risk in list(self.RISK_COLORS) + ["Unreadable"]:
+            self.risk_cells[risk] = self._risk_cell(risk)
+            self.risk_banners[risk] = self._risk_banner(risk)
+
+    def risk_color_hex(self, r):
+        return self.RISK_COLORS.get(r, "#000000")
+
+    def _risk_cell(self, risk):
+        return Paragraph(f"<b><font color='{self.risk_color_hex(risk)}'>{risk}</font></b>", self.styles["cell_risk"])
+
+    def _risk_banner(self, risk):
+        return Paragraph(f"<b><font size=34 color='{self.risk_color_hex(risk)}'>{risk}</font></b>", self.styles["risk_big"])
+
+    def risk_paragraph(self, title, risk, prob):
+        title_cell = self.row_titles.get(title) or Paragraph(title, self.styles["cell_title"])
+        risk_cell = self.risk_cells.get(risk) or self._risk_cell(risk)
+        return [
+            title_cell,
+            risk_cell,
+            Paragraph(f"{prob}%" if prob is not None else "-", self.styles["cell_prob"]),
+        ]
+
+    def render(self, patient_name, patient_email, preterm_result, maternal_result, combined_result, generated_at=None):
+        """Build one report and return the PDF bytes."""
+        buffer = io.BytesIO()
+        doc = SimpleDocTemplate(
+            buffer,
+            pagesize=A4,
+            rightMargin=50,
+            leftMargin=50,
+            topMargin=50,
+            bottomMargin=50,
+            invariant=True,  # same results -> same bytes (pdf_store deduplicates by hash)
+        )
+
+        elements = []
+
+        # >>> Correct date & time (local timezone)
+        generated_at = generated_at or timezone.localtime()
+
+        # ---------------- HEADER ----------------
+        header = Table([[self.header_cell]], colWidths=[7 * inch])
+        header.setStyle(self.header_style)
+        elements.append(header)
+        elements.append(Spacer(1, 20))
+
+        # ---------------- PATIENT INFO ----------------
+        elements.append(self.patient_title)
+        elements.append(Spacer(1, 5))
+
+        patient_table = Table([
+            ["Name:", patient_name],
+            ["Email:", patient_email],
+            ["Report Date:", generated_at.strftime("%B %d, %Y | %I:%M %p")],
+        ], colWidths=[1.7 * inch, 4.8 * inch])
+        patient_table.setStyle(self.patient_style)
+        elements.append(patient_table)
+        elements.append(Spacer(1, 20))
+
+        # ---------------- OVERALL RISK ----------------
+        risk = combined_result.get("risk_level")
+        conf = combined_result.get("confidence")
+
+        elements.append(self.risk_title)
+        elements.append(Spacer(1, 12))
+
+        risk_section = KeepTogether([
+            self.risk_banners.get(risk) or self._risk_banner(risk),
+            Spacer(1, 14),
+            Paragraph(
+                f"<b><font size=14 color='{self.TEXT_BLACK}'>Confidence Level: {conf}%</font></b>",
+                self.styles["risk_conf"]
+            )
+        ])
+
+        elements.append(risk_section)
+        elements.append(Spacer(1, 60))  # spacing before next section
+
+        # ---------------- DETAILED ANALYSIS ----------------
+        elements.append(self.analysis_title)
+        elements.append(Spacer(1, 10))
+
+        pre_r = preterm_result.get("risk_level")
+        pre_p = round(preterm_result.get("probability", 0) * 100, 2)
+        mat_r = maternal_result.get("risk_level")
+        mat_p = round(maternal_result.get("prediction_proba", 0) * 100, 2)
+
+        # One row per scan when several were scored (the preterm row shows the highest-risk scan)
+        scan_rows = []
+        scans = preterm_result.get("scans") or []
+        if len(scans) > 1:
+            for i, scan in enumerate(scans, start=1):
+                label = f"&nbsp;&nbsp;&nbsp;Scan {i}: {escape(scan.get('file_name') or '')}"
+                if scan.get("success"):
+                    scan_rows.append(self.risk_paragraph(label, scan.get("risk_level"), round(scan.get("probability", 0) * 100, 2)))
+                else:
+                    scan_rows.append(self.risk_paragraph(label, "Unreadable", None))
+
+        analysis_table = Table(
+            [
+                self.analysis_header,
+                self.risk_paragraph("Preterm Delivery (Image-based)", pre_r, pre_p),
+                *scan_rows,
+                self.risk_paragraph("Maternal Health (Reports-based)", mat_r, mat_p),
+            ],
+            colWidths=[3.7 * inch, 1.9 * inch, 1.1 * inch]
+        )
+        analysis_table.setStyle(self.analysis_style)
+        elements.append(analysis_table)
+        elements.append(Spacer(1, 35))
+
+        # ---------------- FOOTER ----------------
+        elements.append(Paragraph(
+            f"Generated automatically by FetoScope AI · {generated_at.strftime('%B %d, %Y %I:%M %p')}",
+            self.styles["foot"]
+        ))
+
+        doc.build(elements)
+        pdf = buffer.getvalue()
+        buffer.close()
+        return pdf
+
+
+def get_report_renderer():
+    """This thread's CombinedReportRenderer, created on first use."""
+    renderer = getattr(_renderers, "renderer", None)
+    if renderer is None:
+        renderer = _renderers.renderer = CombinedReportRenderer()
+    return renderer
+
+
+def build_combined_pdf(
+    patient_name,
+    patient_email,
+    preterm_result,
+    maternal_result,
+    combined_result,
+    generated_at=None,
+):
+    """
+    Hospital-theme PDF: Blue + White minimal clinical report
+    """
+    return get_report_renderer().render(
+        patient_name,
+        patient_email,
+        preterm_result,
+        maternal_result,
+        combined_result,
+        generated_at=generated_at,
+    )
+
+
+# ------------------------- STORED RESULTS -------------------------
+def _plain(result, keys):
+    """JSON-safe copy of the given keys (model outputs may be numpy scalars)."""
+    data = {}
+    for key in keys:
+        value = result.get(key)
+        if value is None:
+            continue
+        data[key] = value if isinstance(value, (str, bool)) else float(value)
+    return data
+
+
+def report_data(preterm_result, maternal_result, combined_result, generated_at):
+    """The parts of the analysis results the PDF shows, for AnalysisReport.analysis_data."""
+    preterm = _plain(preterm_result, ("risk_level", "probability"))
+    preterm["scans"] = [
+        _plain(scan, ("success", "risk_level", "probability", "file_name"))
+        for scan in preterm_result.get("scans") or []
+    ]
+    combined = _plain(combined_result, ("risk_level",))
+    combined["confidence"] = combined_result.get("confidence")
+    return {
+        "preterm": preterm,
+        "maternal": _plain(maternal_result, ("risk_level", "prediction_proba")),
+        "combined": combined,
+        "generated_at": generated_at.isoformat(),
+    }
+
+
+def render_report_pdf(report):
+    """Render an AnalysisReport's PDF from its saved analysis_data."""
+    data = report.analysis_data
+    return build_combined_pdf(
+        report.patient_name,
+        report.patient_email,
+        data["preterm"],
+        data["maternal"],
+        data["combined"],
+        generated_at=timezone.localtime(datetime.fromisoformat(data["generated_at"])),
+    )
+
+
+def report_file_name(report):
+    """File name a report PDF is downloaded as (stored files are named by content hash)."""
+    if report.analysis_data:
+        generated_at = datetime.fromisoformat(report.analysis_data["generated_at"])
+    else:
+        generated_at = timezone.localtime(report.created_at)
+    return f"combined_report_{generated_at.strftime('%Y%m%d_%H%M%S')}.pdf"
+
+
+def store_report_pdf(report):
+    """
+    Storage name of the report's PDF. When no stored file exists it is rendered
+    from analysis_data and saved first; returns None when that is not possible
+    (reports created before analysis_data was kept).
+    """
+    if report.pdf and default_storage.exists(report.pdf.name):
+        return report.pdf.name
+    if not report.analysis_data:
+        return None
+
+    previous = report.pdf.name or ""
+    name, fingerprint = store_pdf(render_report_pdf(report))
+    # Two first downloads may render at once: the first stored file wins
+    if not AnalysisReport.objects.filter(pk=report.pk, pdf=previous).update(pdf=name, **fingerprint):
+        release_pdf(name)
+        report.refresh_from_db(fields=["pdf", "pdf_etag", "pdf_size"])
+        return report.pdf.name
+    report.pdf.name = name
+    report.pdf_etag, report.pdf_size = fingerprint["pdf_etag"], fingerprint["pdf_size"]
+    return name
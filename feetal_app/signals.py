@@ -0,0 +1,52 @@
+"""
+Model signal handlers (connected in FeetalAppConfig.ready).
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .directory import invalidate_directory
+from .models import AnalysisReport, Appointment, Doctor, Patient
+from .pdf_store import release_pdf
+from .stats import invalidate_stats
+
+
+@receiver(post_delete, sender=AnalysisReport)
+def release_report_pdf(sender, instance, **kwargs):
+    """Delete the report's PDF once no other report shares it (content-addressed storage)."""
+    name = instance.pdf.name
+    if name:
+        transaction.on_commit(lambda: release_pdf(name))
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+def invalidate_appointment_stats(sender, instance, **kwargs):
+    """An appointment only changes the admin counters and its doctor's (see stats.py)."""
+    invalidate_stats(doctor_id=instance.doctor_id)
+
+
+@receiver(post_save, sender=Doctor)
+@receiver(post_delete, sender=Doctor)
+@receiver(post_save, sender=Patient)
+@receiver(post_delete, sender=Patient)
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def invalidate_dashboard_stats(sender, update_fields=None, **kwargs):
+    """Dashboard counters change with these models (see stats.py)."""
+    if update_fields is not None and set(update_fields) <= {"last_login"}:
+        return  # every login saves last_login; no counter depends on it
+    invalidate_stats()
+
+
+@receiver(post_save, sender=Doctor)
+@receiver(post_delete, sender=Doctor)
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def invalidate_doctor_directory(sender, update_fields=None, **kwargs):
+    """Doctor names, specializations and active flags are in the directory (see directory.py)."""
+    if update_fields is not None and set(update_fields) <= {"last_login"}:
+        return
+    # After commit, so a request in between cannot cache the old rows under the new version
+    transaction.on_commit(invalidate_directory)
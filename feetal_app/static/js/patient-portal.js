@@ -245,7 +245,17 @@ async function processCombinedAnalysis() {
             return;
         }
 
-        const data = await response.json();
+        let data = await response.json();
+
+        // Queued analysis: keep the loader up and poll the job until it finishes
+        if (data.success && data.status_url) {
+            showLoadingModal(data.message || "Analyzing your reports...");
+            const job = await waitForAnalysisJob(data.status_url);
+            hideLoadingModal();
+            data = job.status === "completed"
+                ? { success: true }
+                : { success: false, message: job.message };
+        }
 
         if (data.success) {
             // Show success message only - patient doesn't see results
@@ -288,6 +298,31 @@ async function processCombinedAnalysis() {
     }
 }
 
+async function waitForAnalysisJob(statusUrl, timeoutMs = 10 * 60 * 1000) {
+    const started = Date.now();
+    const progressFill = document.getElementById("progressFill");
+    const loadingText = document.getElementById("loadingText");
+
+    while (Date.now() - started < timeoutMs) {
+        await new Promise((resolve) => setTimeout(resolve, 1500));
+        let job;
+        try {
+            const response = await fetch(statusUrl, { headers: { "Accept": "application/json" } });
+            job = await response.json();
+        } catch (e) {
+            continue; // transient network error: keep polling
+        }
+        if (!job.success) return { status: "failed", message: job.message };
+        if (job.stage && loadingText) loadingText.textContent = job.stage + "...";
+        if (progressFill) progressFill.style.width = (job.progress || 0) + "%";
+        if (job.status === "completed" || job.status === "failed") return job;
+    }
+    return {
+        status: "failed",
+        message: "Your reports are still being analyzed. Our medical team will receive the report when it is ready."
+    };
+}
+
 /* ====================== RESULT MODAL ====================== */
 
 function showResults(results, type) {
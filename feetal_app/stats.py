@@ -0,0 +1,124 @@
+"""
+Dashboard statistics.
+
+The admin dashboard counters come from two conditional-aggregation queries
+(one over users, one over appointments) and each doctor's counters from one
+query over that doctor's appointments, instead of a count() per number. Both
+are cached in-process for ADMIN_STATS_CACHE_TTL seconds. Saving or deleting a
+user, doctor or patient clears the cache of the process that made the change,
+an appointment change clears the admin entry and that doctor's entry
+(signals.py); other processes pick changes up when the TTL runs out.
+"""
+import threading
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .models import Appointment, Patient
+from .ttl_cache import TTLCache
+
+_stats_cache = None
+_stats_cache_lock = threading.Lock()
+
+
+def _get_stats_cache():
+    global _stats_cache
+    if _stats_cache is None:
+        with _stats_cache_lock:
+            if _stats_cache is None:
+                _stats_cache = TTLCache(max_size=256, ttl=getattr(settings, "ADMIN_STATS_CACHE_TTL", 30))
+    return _stats_cache
+
+
+def invalidate_stats(doctor_id=None):
+    """Drop cached counters: everything, or only those affected by one doctor's appointments."""
+    if _stats_cache is None:
+        return
+    if doctor_id is None:
+        _stats_cache.clear()
+        return
+    today = timezone.now().date()
+    _stats_cache.delete(("admin", today))
+    _stats_cache.delete(("doctor", doctor_id, today))
+
+
+def _cached(key, compute):
+    if getattr(settings, "ADMIN_STATS_CACHE_TTL", 30) <= 0:
+        return compute()
+    cache = _get_stats_cache()
+    stats = cache.get(key)
+    if stats is None:
+        stats = compute()
+        cache.set(key, stats)
+    return stats
+
+
+def compute_admin_stats():
+    """All admin dashboard counters in two queries."""
+    now = timezone.now()
+    today = now.date()
+
+    users = get_user_model().objects.aggregate(
+        total_users=Count("pk"),
+        new_users_week=Count("pk", filter=Q(date_joined__gte=now - timedelta(days=7))),
+        doctor_count=Count("doctor_profile"),
+        patient_count=Count("patient_profile"),
+    )
+    appointments = Appointment.objects.aggregate(
+        total_appointments=Count("pk"),
+        pending_appointments=Count("pk", filter=Q(status="pending")),
+        confirmed_appointments=Count("pk", filter=Q(status="confirmed")),
+        today_appointments_count=Count("pk", filter=Q(appointment_date=today)),
+    )
+    return {**users, **appointments}
+
+
+def get_admin_stats():
+    """Cached compute_admin_stats(); the key includes the date so 'today' rolls over at midnight."""
+    return _cached(("admin", timezone.now().date()), compute_admin_stats)
+
+
+def compute_doctor_stats(doctor_id):
+    """One doctor's dashboard counters in one query (plus the registered patient count)."""
+    current_month_start = datetime.now().replace(day=1).date()
+    stats = Appointment.objects.filter(doctor_id=doctor_id).aggregate(
+        total_appointments=Count("pk"),
+        pending_appointments=Count("pk", filter=Q(status="pending")),
+        completed_appointments=Count("pk", filter=Q(status="completed")),
+        this_month_appointments=Count("pk", filter=Q(appointment_date__gte=current_month_start)),
+        unique_patients=Count("patient_email", distinct=True),
+    )
+    stats["total_patients"] = Patient.objects.count()
+    return stats
+
+
+def get_doctor_stats(doctor_id):
+    return _cached(("doctor", doctor_id, timezone.now().date()), lambda: compute_doctor_stats(doctor_id))
+
+
+def doctor_dashboard_appointments(doctor_id, today, upcoming_limit=20, recent_limit=50):
+    """
+    Today's, upcoming and most recent non-cancelled appointments of a doctor
+    from a single query: today's appointments plus the next
+    ``upcoming_limit`` and the latest ``recent_limit``, split in Python.
+    """
+    active = Appointment.objects.filter(doctor_id=doctor_id).exclude(status="cancelled")
+    upcoming = active.filter(appointment_date__gte=today).order_by("appointment_date", "appointment_time")
+    latest = active.order_by("-appointment_date", "-appointment_time")
+    rows = list(
+        active.filter(
+            Q(appointment_date=today)
+            | Q(pk__in=upcoming.values("pk")[:upcoming_limit])
+            | Q(pk__in=latest.values("pk")[:recent_limit])
+        ).order_by("-appointment_date", "-appointment_time")
+    )
+
+    ascending = [a for a in reversed(rows) if a.appointment_date >= today]
+    return {
+        "today_appointments": [a for a in ascending if a.appointment_date == today],
+        "upcoming_appointments": ascending[:upcoming_limit],
+        "all_appointments": rows[:recent_limit],
+    }
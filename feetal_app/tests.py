@@ -1,3 +1,1159 @@
-from django.test import TestCase
+import contextlib
+import csv
+import hashlib
+import importlib.util
+import io
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time as time_module
+import unittest
+import unittest.mock
+import zipfile
+from concurrent.futures import Future
+from datetime import time, timedelta
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import directory, ml_service, stats
+from .availability import WEEKDAYS
+from .batching import MicroBatcher
+from .downloads import UNSATISFIABLE, parse_range, serve_report_pdf
+from .jobs import delete_uploads
+from .model_server import ModelServer, ModelServerClient, ModelServerError, recv_message, send_message
+from .models import AnalysisJob, AnalysisReport, Appointment, Doctor, DoctorSchedule, Patient
+from .ocr import PageOCR
+from .pagination import InvalidCursor, decode_cursor, encode_cursor, keyset_page, parse_limit
+from .pdf_store import content_name, release_pdf, store_pdf
+
+
+def _has_module(name):
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+def _real_preterm_model_available():
+    path = ml_service.get_model_path("preterm_delivery_cnn.h5")
+    # Less than 10KB is a Git LFS pointer, not the model
+    return os.path.exists(path) and os.path.getsize(path) >= 10000
+
+
+def _build_fixture_preterm_model(path, inputs):
+    """
+    Small CNN with the preterm model's input and output shapes, saved to
+    ``path``. Stands in for preterm_delivery_cnn.h5 when that is only a Git
+    LFS pointer, so the conversions are still checked end to end.
+    """
+    from tensorflow import keras
+
+    keras.utils.set_random_seed(0)
+    model = keras.Sequential([
+        keras.Input((224, 224, 3)),
+        keras.layers.Conv2D(8, 3, strides=2, activation="relu"),
+        keras.layers.MaxPooling2D(4),
+        keras.layers.Conv2D(16, 3, activation="relu"),
+        keras.layers.GlobalAveragePooling2D(),
+        keras.layers.Dense(16, activation="relu"),
+        keras.layers.Dense(1, activation="sigmoid"),
+    ])
+    # Random weights put every output near 0.5: rescale the last layer so the
+    # logits on ``inputs`` are centred with a spread of about 2, and the
+    # probabilities (and any conversion error in them) cover most of [0, 1]
+    features = keras.Model(model.inputs, model.layers[-2].output).predict(inputs, verbose=0)
+    kernel, bias = model.layers[-1].get_weights()
+    logits = features @ kernel + bias
+    scale = 2.0 / logits.std()
+    model.layers[-1].set_weights([kernel * scale, (bias - logits.mean()) * scale])
+    model.save(path)
+    return model
+
+
+@unittest.skipUnless(_has_module("tensorflow"), "TensorFlow is not installed")
+class PretermBackendParityTests(SimpleTestCase):
+    """
+    Converted preterm CNN artifacts must match the Keras model's probabilities.
+    Runs against the real model when it is checked out, else a fixture CNN.
+    """
+
+    SCANS = 12
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        import numpy as np
+        from PIL import Image
+        from tensorflow import keras
+        from .management.commands.convert_preterm_model import load_sample_images
+
+        cls.tmpdir = tempfile.mkdtemp()
+        # Synthetic scans (greyscale speckle, as in ultrasound) written as images, so they
+        # go through the serving preprocessing; one set calibrates int8, the other checks parity
+        rng = np.random.default_rng(0)
+        for kind in ("calibration", "parity"):
+            directory = os.path.join(cls.tmpdir, kind)
+            os.mkdir(directory)
+            for i in range(cls.SCANS):
+                pixels = (rng.gamma(2.0, 40.0, (320, 400)) + 30 * (i % 4)).clip(0, 255).astype(np.uint8)
+                Image.fromarray(pixels).convert("RGB").save(os.path.join(directory, f"scan{i:02d}.png"))
+        cls.calibration_dir = os.path.join(cls.tmpdir, "calibration")
+        cls.samples = load_sample_images(os.path.join(cls.tmpdir, "parity"), cls.SCANS)
+        # Out-of-distribution noise as well, for the float conversions
+        cls.samples += [rng.random((1, 224, 224, 3), dtype=np.float32) for _ in range(4)]
+        cls.batch = np.concatenate(cls.samples)
+
+        if _real_preterm_model_available():
+            cls.model_path = ml_service.get_model_path("preterm_delivery_cnn.h5")
+            keras_model = keras.models.load_model(cls.model_path)
+        else:
+            cls.model_path = os.path.join(cls.tmpdir, "fixture_cnn.h5")
+            keras_model = _build_fixture_preterm_model(cls.model_path, cls.batch)
+        cls.expected = keras_model.predict(cls.batch, verbose=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmpdir, ignore_errors=True)
+        super().tearDownClass()
+
+    def _convert_and_predict(self, fmt, quantize=None, calibration_dir=None):
+        from .inference_backends import load_preterm_backend
+
+        output = os.path.join(self.tmpdir, f"model-{quantize or 'float'}-{bool(calibration_dir)}.{fmt}")
+        options = {"format": fmt, "model": self.model_path, "output": output, "stdout": open(os.devnull, "w")}
+        if quantize:
+            options["quantize"] = quantize
+        if calibration_dir:
+            options["calibration_dir"] = calibration_dir
+        call_command("convert_preterm_model", **options)
+        model = load_preterm_backend(fmt, output)
+        # Single-image calls too: the batcher sends batches of varying size
+        single = [model.predict(sample)[0] for sample in self.samples[:3]]
+        return model.predict(self.batch), single
+
+    def _assert_close(self, fmt, quantize, tolerance, calibration_dir=None, scans_only=False):
+        import numpy as np
+
+        batch_out, single = self._convert_and_predict(fmt, quantize, calibration_dir)
+        self.assertEqual(batch_out.shape, self.expected.shape)
+        checked = slice(self.SCANS) if scans_only else slice(None)
+        np.testing.assert_allclose(batch_out[checked], self.expected[checked], atol=tolerance)
+        np.testing.assert_allclose(np.array(single), self.expected[:3], atol=tolerance)
+
+    def test_tflite_float_matches_keras(self):
+        self._assert_close("tflite", None, 1e-4)
+
+    def test_tflite_dynamic_range_int8_matches_keras(self):
+        self._assert_close("tflite", "int8", 0.05)
+
+    def test_tflite_calibrated_int8_matches_keras(self):
+        # Activation ranges come from scans, so only scan-like inputs are held to the tolerance
+        self._assert_close("tflite", "int8", 0.05, calibration_dir=self.calibration_dir, scans_only=True)
+
+    @unittest.skipUnless(_has_module("tf2onnx") and _has_module("onnxruntime"), "tf2onnx/onnxruntime not installed")
+    def test_onnx_float_matches_keras(self):
+        self._assert_close("onnx", None, 1e-4)
+
+
+@unittest.skipUnless(connection.vendor == "sqlite", "EXPLAIN QUERY PLAN is SQLite-specific")
+@override_settings(ADMIN_STATS_CACHE_TTL=0)
+class AppointmentQueryPlanTests(TestCase):
+    """The appointment queries behind the dashboards and listings must be served by an index."""
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.admin = User.objects.create_superuser("plan-admin", "admin@example.com", "x")
+        doctor_user = User.objects.create_user("plan-doctor", "doctor@example.com", "x")
+        patient_user = User.objects.create_user("plan-patient", "patient@example.com", "x")
+        cls.doctor = Doctor.objects.create(user=doctor_user, specialization="obstetrics", phone="1")
+        cls.patient = Patient.objects.create(user=patient_user, phone="1")
+        today = timezone.now().date()
+        Appointment.objects.bulk_create([
+            Appointment(
+                doctor=cls.doctor,
+                patient=cls.patient if i % 2 else None,
+                patient_name=f"Patient {i}",
+                patient_email=f"patient{i % 7}@example.com",
+                patient_phone="1",
+                appointment_date=today + timedelta(days=i - 20),
+                appointment_time=time(9 + i % 8),
+                reason="routine-checkup",
+                status=("pending", "confirmed", "completed", "cancelled")[i % 4],
+            )
+            for i in range(40)
+        ])
+
+    def _plan(self, sql, params=()):
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def _assert_indexed(self, sql, plan, label):
+        for step in plan:
+            if "feetal_app_appointment" in step:
+                self.assertRegex(step, r"USING (COVERING )?INDEX", f"{label}: full scan\n{sql}\n{plan}")
+        self.assertFalse(
+            any("TEMP B-TREE FOR ORDER BY" in step for step in plan),
+            f"{label}: sorts without an index\n{sql}\n{plan}",
+        )
+
+    def _assert_view_indexed(self, user, url_name):
+        self.client.force_login(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(url_name))
+        self.assertEqual(response.status_code, 200)
+
+        checked = 0
+        for query in queries.captured_queries:
+            sql = query["sql"]
+            if '"feetal_app_appointment"' in sql and sql.lstrip().upper().startswith("SELECT"):
+                self._assert_indexed(sql, self._plan(sql), url_name)
+                checked += 1
+        self.assertTrue(checked, f"no appointment queries captured for {url_name}")
+
+    def _assert_queryset_indexed(self, queryset, label):
+        sql, params = queryset.query.sql_with_params()
+        self._assert_indexed(sql, self._plan(sql, params), label)
+
+    def test_dashboard_doctor(self):
+        self._assert_view_indexed(self.doctor.user, "feetal_app:dashboard_doctor")
+
+    def test_dashboard_admin(self):
+        self._assert_view_indexed(self.admin, "feetal_app:dashboard_admin")
+
+    def test_doctor_appointments(self):
+        # Same queryset as views.doctor_appointments
+        self._assert_queryset_indexed(
+            Appointment.objects.filter(doctor=self.doctor).order_by("-appointment_date", "-appointment_time"),
+            "doctor_appointments",
+        )
+
+    def test_patient_appointments(self):
+        # Same queryset as views.patient_appointments
+        self._assert_queryset_indexed(
+            Appointment.objects.filter(patient=self.patient).order_by("-appointment_date", "-appointment_time"),
+            "patient_appointments",
+        )
+
+    def test_keyset_pages(self):
+        # Second pages of the JSON listings (pagination.keyset_page) seek through the index
+        order = ("appointment_date", "appointment_time", "id")
+        for label, queryset in (
+            ("doctor_appointments_api", Appointment.objects.filter(doctor=self.doctor)),
+            ("patient_appointments_api", Appointment.objects.filter(patient=self.patient)),
+        ):
+            _, cursor = keyset_page(queryset, order, limit=5)
+            with CaptureQueriesContext(connection) as queries:
+                rows, _ = keyset_page(queryset, order, cursor, limit=5)
+            self.assertEqual(len(rows), 5)
+            sql = queries.captured_queries[-1]["sql"]
+            self._assert_indexed(sql, self._plan(sql), label)
+
+
+class ConcurrentBookingTests(TransactionTestCase):
+    """Simultaneous bookings of one slot must leave exactly one appointment."""
+
+    THREADS = 200
+
+    def setUp(self):
+        doctor_user = get_user_model().objects.create_user("race-doctor", "race@example.com", "x")
+        self.doctor = Doctor.objects.create(user=doctor_user, specialization="obgyn", phone="1")
+        self.day = timezone.localdate() + timedelta(days=7)
+        DoctorSchedule.objects.create(
+            doctor=self.doctor, day=WEEKDAYS[self.day.weekday()], start_time=time(9), end_time=time(12)
+        )
+
+    def _book(self, client, i):
+        return client.post(
+            reverse("feetal_app:book_appointment"),
+            {
+                "doctor": self.doctor.id,
+                "patientName": f"Patient {i}",
+                "patientEmail": f"patient{i}@example.com",
+                "patientPhone": "1",
+                "date": self.day.isoformat(),
+                "time": "09:30",
+                "reason": "consultation",
+            },
+            content_type="application/json",
+        )
+
+    def test_one_booking_wins(self):
+        barrier = threading.Barrier(self.THREADS)
+        statuses = []
+        lock = threading.Lock()
+
+        def worker(i):
+            client = Client()
+            try:
+                barrier.wait()
+                status = self._book(client, i).status_code
+            finally:
+                connection.close()
+            with lock:
+                statuses.append(status)
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(self.THREADS)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(statuses.count(200), 1, sorted(statuses))
+        self.assertEqual(statuses.count(409), self.THREADS - 1, sorted(statuses))
+        self.assertEqual(Appointment.objects.filter(doctor=self.doctor).exclude(status="cancelled").count(), 1)
+
+    def test_retried_booking_returns_same_appointment(self):
+        first = self._book(self.client, 0).json()
+        retry = self._book(self.client, 0).json()
+        self.assertTrue(retry["success"])
+        self.assertEqual(first["appointment_id"], retry["appointment_id"])
+        self.assertEqual(self._book(self.client, 1).status_code, 409)
+
+    def test_cancelled_slot_can_be_booked_again(self):
+        appointment_id = self._book(self.client, 0).json()["appointment_id"]
+        Appointment.objects.filter(pk=appointment_id).update(status="cancelled")
+        self.assertEqual(self._book(self.client, 1).status_code, 200)
+
+
+@override_settings(ANALYSIS_JOBS_ENABLED=True, ANALYSIS_JOB_WORKERS=0)
+class AnalysisJobAccessTests(TestCase):
+    """Only the uploader can read a queued analysis."""
+
+    def _upload(self, client):
+        response = client.post(
+            reverse("feetal_app:combined_analysis_api"),
+            {
+                "scanning_files": SimpleUploadedFile("scan.jpg", b"scan"),
+                "medical_files": SimpleUploadedFile("report.txt", b"Blood pressure: 120/80"),
+                "patient_name": "Job Patient",
+                "patient_email": "job@example.com",
+            },
+        )
+        self.assertEqual(response.status_code, 202)
+        job = AnalysisJob.objects.get(job_id=response.json()["job_id"])
+        self.addCleanup(delete_uploads, job)
+        return job, response.json()["status_url"]
+
+    def test_uploading_session_reads_its_job(self):
+        _, status_url = self._upload(self.client)
+        response = self.client.get(status_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["status"], AnalysisJob.STATUS_QUEUED)
+
+    def test_other_visitors_get_404(self):
+        _, status_url = self._upload(self.client)
+        self.assertEqual(Client().get(status_url).status_code, 404)
+
+        stranger = get_user_model().objects.create_user("stranger", "stranger@example.com", "x")
+        client = Client()
+        client.force_login(stranger)
+        self.assertEqual(client.get(status_url).status_code, 404)
+
+    def test_patient_with_job_email_reads_it(self):
+        _, status_url = self._upload(Client())
+        patient = get_user_model().objects.create_user("job-patient", "JOB@example.com", "x")
+        self.client.force_login(patient)
+        self.assertEqual(self.client.get(status_url).status_code, 200)
+
+    @override_settings(DEBUG=True)
+    def test_failure_message_has_no_traceback(self):
+        from . import jobs
+
+        job, status_url = self._upload(self.client)
+        job = jobs.claim_next_job("test")
+        with unittest.mock.patch("feetal_app.analysis.run_combined_analysis", side_effect=RuntimeError("boom")):
+            with self.assertLogs("feetal_app.jobs", "ERROR") as logs:
+                jobs.run_job(job)
+        self.assertIn("Traceback", logs.output[0])
+        data = self.client.get(status_url).json()
+        self.assertEqual(data["status"], AnalysisJob.STATUS_FAILED)
+        self.assertEqual(data["message"], "An error occurred while running combined analysis.")
+
+
+@override_settings(OCR_PAGE_TIMEOUT=0.2, OCR_MAX_WORKERS=2)
+class PageOCRTimeoutTests(SimpleTestCase):
+    """Stuck OCR pages share one deadline and are cancelled afterwards."""
+
+    def test_stuck_pages_share_one_deadline(self):
+        ocr = PageOCR()
+        ocr.slack = 0.1
+        done = Future()
+        done.set_result("page two")
+        stuck = [Future() for _ in range(3)]
+        ocr._futures = {1: stuck[0], 2: done, 3: stuck[1], 4: stuck[2]}
+
+        began = time_module.monotonic()
+        with self.assertLogs("feetal_app.ocr", "WARNING"):
+            texts = ocr.results()
+        elapsed = time_module.monotonic() - began
+
+        self.assertEqual(texts, {1: "", 2: "page two", 3: "", 4: ""})
+        # Two rounds of 0.2s plus 0.1s slack, not 0.2s + slack per stuck page
+        self.assertLess(elapsed, 0.8)
+        self.assertTrue(all(future.cancelled() for future in stuck))
+
+
+class _CountingModelServer(ModelServer):
+    """Model server that echoes requests, optionally after a delay, and counts them."""
+
+    delay = 0
+
+    def __init__(self, socket_path):
+        super().__init__(socket_path)
+        self.calls = 0
+
+    def dispatch(self, header, payload):
+        self.calls += 1
+        time_module.sleep(self.delay)
+        return {"success": True, "echo": header.get("value"), "payload_size": len(payload)}
+
+
+class ModelServerClientTests(SimpleTestCase):
+    """Framing, connection reuse and when a request may be sent twice."""
+
+    def setUp(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir, True)
+        self.server = _CountingModelServer(os.path.join(tmpdir, "model.sock"))
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def test_framing_round_trip(self):
+        left, right = socket.socketpair()
+        with left, right:
+            payload = bytes(range(256)) * 16
+            send_message(left, {"op": "preterm", "shape": [1, 2]}, payload)
+            header, received = recv_message(right)
+        self.assertEqual(header, {"op": "preterm", "shape": [1, 2]})
+        self.assertEqual(received, payload)
+
+    def test_pooled_connection_is_reused(self):
+        client = ModelServerClient(self.server.socket_path)
+        for i in range(3):
+            self.assertEqual(client.request({"value": i}, b"abc")["echo"], i)
+        self.assertEqual(client.stats()["connects"], 1)
+        self.assertEqual(self.server.calls, 3)
+
+    def test_connection_closed_by_server_is_retried_once(self):
+        client = ModelServerClient(self.server.socket_path)
+        # An idle pooled connection whose server end has gone away (e.g. a restart)
+        pooled, server_end = socket.socketpair()
+        server_end.close()
+        client._pool.put_nowait(pooled)
+
+        self.assertEqual(client.request({"value": 2})["echo"], 2)
+        self.assertEqual(self.server.calls, 1)
+        self.assertEqual(client.stats()["errors"], 0)
+
+    def test_timeout_is_not_retried(self):
+        self.server.delay = 0.5
+        client = ModelServerClient(self.server.socket_path, timeout=0.1)
+        with self.assertRaises(ModelServerError):
+            client.request({"value": 1})
+        time_module.sleep(0.6)
+        self.assertEqual(self.server.calls, 1)
+
+    def test_timeout_on_reused_connection_is_not_retried(self):
+        client = ModelServerClient(self.server.socket_path, timeout=0.1)
+        client.request({"value": 1})
+        self.server.delay = 0.5
+        with self.assertRaises(ModelServerError):
+            client.request({"value": 2})
+        time_module.sleep(0.6)
+        self.assertEqual(self.server.calls, 2)
+
+
+@unittest.skipUnless(hasattr(os, "fork"), "needs os.fork")
+class ForkResetTests(SimpleTestCase):
+    """Locks held in the parent at fork time must not deadlock the child."""
+
+    LOCKS = (
+        "_preterm_model_lock", "_maternal_model_lock", "_warmup_lock",
+        "_preterm_batcher_lock", "_model_server_client_lock", "_report_cache_lock",
+    )
+
+    def test_child_gets_fresh_locks(self):
+        held = [getattr(ml_service, name) for name in self.LOCKS]
+        for lock in held:
+            lock.acquire()
+        try:
+            pid = os.fork()
+            if pid == 0:
+                ok = all(getattr(ml_service, name).acquire(timeout=1) for name in self.LOCKS)
+                os._exit(0 if ok else 1)
+            _, status = os.waitpid(pid, 0)
+        finally:
+            for lock in held:
+                lock.release()
+        self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+
+
+class MicroBatcherTests(SimpleTestCase):
+    """Concurrent callers share one predict call and each get their own rows back."""
+
+    def _batcher(self, predict_fn, **kwargs):
+        batcher = MicroBatcher(predict_fn, **kwargs)
+        self.addCleanup(batcher.shutdown, 1)
+        return batcher
+
+    def test_fan_out(self):
+        import numpy as np
+
+        batch_sizes = []
+
+        def predict(rows):
+            batch_sizes.append(len(rows))
+            return rows * 2
+
+        batcher = self._batcher(predict, max_batch_size=64, max_wait_ms=50)
+        callers = 16
+        barrier = threading.Barrier(callers)
+        results = {}
+
+        def call(i):
+            rows = np.full((i % 3 + 1, 2), i, dtype=np.float32)
+            barrier.wait()
+            results[i] = batcher.predict(rows, timeout=5)
+
+        threads = [threading.Thread(target=call, args=(i,)) for i in range(callers)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        for i in range(callers):
+            np.testing.assert_array_equal(results[i], np.full((i % 3 + 1, 2), i * 2, dtype=np.float32))
+        self.assertEqual(sum(batch_sizes), sum(i % 3 + 1 for i in range(callers)))
+        self.assertLess(len(batch_sizes), callers)
+        self.assertEqual(batcher.stats()["batch_size"]["count"], len(batch_sizes))
+
+    def test_max_batch_size_splits_batches(self):
+        import numpy as np
+
+        release = threading.Event()
+        batch_sizes = []
+
+        def predict(rows):
+            release.wait(5)
+            batch_sizes.append(len(rows))
+            return rows
+
+        batcher = self._batcher(predict, max_batch_size=4, max_wait_ms=20)
+        futures = [batcher.submit(np.zeros((1, 1))) for _ in range(10)]
+        release.set()
+        for future in futures:
+            future.result(timeout=5)
+        self.assertTrue(all(size <= 4 for size in batch_sizes), batch_sizes)
+        self.assertEqual(sum(batch_sizes), 10)
+
+    def test_error_reaches_every_caller_in_the_batch(self):
+        import numpy as np
+
+        calls = []
+
+        def predict(rows):
+            calls.append(len(rows))
+            if len(calls) == 1:
+                raise RuntimeError("model failed")
+            return rows
+
+        batcher = self._batcher(predict, max_batch_size=8, max_wait_ms=50)
+        with self.assertLogs("feetal_app.batching", "ERROR"):
+            futures = [batcher.submit(np.zeros((1, 1))) for _ in range(3)]
+            for future in futures:
+                with self.assertRaisesMessage(RuntimeError, "model failed"):
+                    future.result(timeout=5)
+        self.assertEqual(calls, [3])
+        # The worker survives a failed batch
+        np.testing.assert_array_equal(batcher.predict(np.ones((2, 1)), timeout=5), np.ones((2, 1)))
+
+
+class _StubMaternalModel:
+    """predict_proba stand-in that only sees the features rounded to the memo steps."""
+
+    steps = [ml_service.MATERNAL_CACHE_STEPS[name] for name in ml_service.MATERNAL_FEATURES]
+    weights = (0.02, 0.03, 0.04, 0.01, 0.03, 0.2)
+    offsets = (30, 130, 85, 150, 95, 98.6)
+
+    def predict_proba(self, features):
+        import numpy as np
+
+        features = np.round(np.asarray(features, dtype=float) / self.steps) * self.steps
+        z = ((features - self.offsets) * self.weights).sum(axis=1)
+        p1 = 1 / (1 + np.exp(-z))
+        return np.column_stack([1 - p1, p1])
+
+
+@override_settings(ML_MODEL_SERVER_SOCKET="", MATERNAL_PREDICTION_CACHE_ENABLED=True)
+class MaternalPredictionTests(SimpleTestCase):
+    """Batch scoring and the prediction memo must agree with the scalar path."""
+
+    def setUp(self):
+        for name, value in (
+            ("_maternal_health_model", _StubMaternalModel()),
+            ("_maternal_prediction_cache", None),
+            ("get_maternal_model_hash", lambda: "stub"),
+        ):
+            patcher = unittest.mock.patch.object(ml_service, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _records(self, count, seed=0):
+        import random
+
+        rng = random.Random(seed)
+        # Values cluster around the rule thresholds so every branch is exercised
+        return [
+            {
+                "age": rng.randint(15, 50),
+                "systolic_bp": rng.choice((rng.uniform(90, 180), rng.uniform(138, 162))),
+                "diastolic_bp": rng.choice((rng.uniform(55, 115), rng.uniform(88, 102))),
+                "bs": rng.choice((rng.uniform(60, 300), rng.uniform(198, 252))),
+                "heart_rate": rng.choice((rng.uniform(55, 140), rng.uniform(98, 122))),
+                "body_temp": rng.uniform(97, 103),
+            }
+            for _ in range(count)
+        ]
+
+    def _scalar(self, record):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return ml_service._predict_maternal_health_uncached(record)
+
+    def test_batch_matches_scalar(self):
+        records = self._records(500)
+        records += [{"systolic_bp": "n/a"}, {}]
+        batch = ml_service.predict_maternal_health_batch(records)
+
+        self.assertFalse(batch[-2]["success"])
+        for record, result in zip(records[:-2] + records[-1:], batch[:-2] + batch[-1:]):
+            expected = self._scalar(record)
+            self.assertEqual(result["risk_level"], expected["risk_level"], record)
+            self.assertAlmostEqual(result["probability"], expected["probability"], places=9)
+
+    def test_memo_matches_uncached(self):
+        import random
+
+        rng = random.Random(2)
+        records = []
+        for record in self._records(1000, seed=1):
+            # A near-duplicate lands in the same memo bucket unless a threshold separates them
+            jitter = {name: value + rng.uniform(-0.2, 0.2) * ml_service.MATERNAL_CACHE_STEPS[name]
+                      for name, value in record.items()}
+            records += [record, jitter]
+        # Pairs in one rounding bucket on either side of a rule threshold
+        for i, (name, limits) in enumerate(ml_service.MATERNAL_RISK_THRESHOLDS.items()):
+            for limit in limits[1:]:
+                step = ml_service.MATERNAL_CACHE_STEPS[name]
+                for record in records[i * 40:(i + 1) * 40:2]:
+                    records += [dict(record, **{name: limit - 0.3 * step}), dict(record, **{name: limit + 0.2 * step})]
+        with contextlib.redirect_stdout(io.StringIO()):
+            cached = [ml_service.predict_maternal_health(record) for record in records]
+        stats = ml_service._maternal_prediction_cache.stats()
+        for record, result in zip(records, cached):
+            self.assertEqual(result["risk_level"], self._scalar(record)["risk_level"], record)
+        self.assertGreater(stats["hits"], 0)
+
+    def test_memo_key_records_threshold_sides(self):
+        key = ml_service._maternal_cache_key
+        base = {"age": 30, "systolic_bp": 120, "diastolic_bp": 80, "bs": 100, "heart_rate": 80, "body_temp": 98.6}
+        # Same rounding bucket, same side of every threshold: one entry
+        self.assertEqual(key(dict(base, systolic_bp=120.2)), key(dict(base, systolic_bp=119.8)))
+        # Same rounding bucket, opposite sides of a threshold: separate entries
+        for name, below, above in (
+            ("systolic_bp", 139.8, 140.2),
+            ("systolic_bp", 159.9, 160.0),
+            ("diastolic_bp", 89.6, 90.0),
+            ("bs", 199.99, 200.01),
+            ("heart_rate", 119.7, 120.3),
+            ("heart_rate", 0.0, 0.2),
+        ):
+            with self.subTest(name=name, below=below):
+                self.assertNotEqual(key(dict(base, **{name: below})), key(dict(base, **{name: above})))
+
+
+class TempMediaMixin:
+    """Point MEDIA_ROOT (and so default_storage) at a temporary directory."""
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def _report(self, pdf_bytes, **fields):
+        name, fingerprint = store_pdf(pdf_bytes)
+        fields.setdefault("patient_name", "Report Patient")
+        fields.setdefault("combined_risk_level", "Low Risk")
+        return AnalysisReport.objects.create(pdf=name, **fingerprint, **fields)
+
+
+class ParseRangeTests(SimpleTestCase):
+    def test_ranges(self):
+        for header, expected in (
+            (None, None),
+            ("", None),
+            ("bytes=0-9", (0, 9)),
+            ("bytes=10-", (10, 99)),
+            ("bytes=-10", (90, 99)),
+            ("bytes=-1000", (0, 99)),
+            ("bytes=90-500", (90, 99)),
+            ("bytes=100-", UNSATISFIABLE),
+            ("bytes=-0", UNSATISFIABLE),
+            ("bytes=9-0", None),
+            ("bytes=0-1,5-6", None),
+            ("items=0-9", None),
+            ("bytes=-", None),
+        ):
+            with self.subTest(header=header):
+                self.assertEqual(parse_range(header, 100), expected)
+
+
+class ReportDownloadTests(TempMediaMixin, TestCase):
+    """serve_report_pdf: stored ETag, 304s and single byte ranges."""
+
+    PDF = b"%PDF-1.4 " + bytes(range(256)) * 8
+
+    def setUp(self):
+        super().setUp()
+        self.report = self._report(self.PDF)
+        self.etag = f'"{self.report.pdf_etag}"'
+
+    def _get(self, **headers):
+        request = RequestFactory().get("/", **headers)
+        report = AnalysisReport.objects.get(pk=self.report.pk)
+        with self.assertNumQueries(0):
+            return serve_report_pdf(request, report)
+
+    def test_full_download(self):
+        response = self._get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), self.PDF)
+        self.assertEqual(response["ETag"], self.etag)
+        self.assertEqual(response["Content-Length"], str(len(self.PDF)))
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertEqual(response["Cache-Control"], "private, no-cache")
+
+    def test_if_none_match_gets_304(self):
+        for header in (self.etag, f"W/{self.etag}", f'"other", {self.etag}', "*"):
+            with self.subTest(header=header):
+                response = self._get(HTTP_IF_NONE_MATCH=header)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b"")
+                self.assertEqual(response["ETag"], self.etag)
+        self.assertEqual(self._get(HTTP_IF_NONE_MATCH='"other"').status_code, 200)
+
+    def test_byte_range(self):
+        response = self._get(HTTP_RANGE="bytes=100-199")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.content, self.PDF[100:200])
+        self.assertEqual(response["Content-Range"], f"bytes 100-199/{len(self.PDF)}")
+
+        suffix = self._get(HTTP_RANGE="bytes=-16", HTTP_IF_RANGE=self.etag)
+        self.assertEqual(suffix.status_code, 206)
+        self.assertEqual(suffix.content, self.PDF[-16:])
+
+    def test_stale_if_range_sends_whole_file(self):
+        response = self._get(HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE='"old"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), self.PDF)
+
+    def test_unsatisfiable_range(self):
+        response = self._get(HTTP_RANGE=f"bytes={len(self.PDF)}-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], f"bytes */{len(self.PDF)}")
+
+    @override_settings(REPORT_SENDFILE="x-accel", REPORT_SENDFILE_PREFIX="/protected-media/")
+    def test_sendfile(self):
+        response = self._get()
+        self.assertEqual(response["X-Accel-Redirect"], f"/protected-media/{self.report.pdf.name}")
+        self.assertEqual(response.content, b"")
+
+
+class PdfStoreTests(TempMediaMixin, TestCase):
+    """Identical PDFs share one file, which goes away with its last report."""
+
+    def _exists(self, name):
+        from django.core.files.storage import default_storage
+
+        return default_storage.exists(name)
+
+    def test_identical_pdfs_share_one_file(self):
+        first = self._report(b"%PDF same")
+        second = self._report(b"%PDF same")
+        other = self._report(b"%PDF other")
+        self.assertEqual(first.pdf.name, second.pdf.name)
+        self.assertNotEqual(first.pdf.name, other.pdf.name)
+        self.assertEqual(first.pdf.name, content_name(first.pdf_etag))
+        self.assertEqual(first.pdf_size, len(b"%PDF same"))
+
+    def test_file_deleted_with_last_reference(self):
+        first = self._report(b"%PDF shared")
+        second = self._report(b"%PDF shared")
+        name = first.pdf.name
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(self._exists(name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(self._exists(name))
+
+    def test_release_pdf_skips_referenced_files(self):
+        report = self._report(b"%PDF kept")
+        name = report.pdf.name
+        self.assertFalse(release_pdf(name))
+        self.assertTrue(self._exists(name))
+        # The row about to point elsewhere does not count as a reference
+        self.assertTrue(release_pdf(name, exclude_pk=report.pk))
+        self.assertFalse(self._exists(name))
+
+    def test_bulk_delete_releases_files(self):
+        names = {self._report(f"%PDF {i}".encode()).pdf.name for i in range(3)}
+        with self.captureOnCommitCallbacks(execute=True):
+            AnalysisReport.objects.all().delete()
+        self.assertFalse(any(self._exists(name) for name in names))
+
+
+class ReportExportTests(TempMediaMixin, TestCase):
+    """The admin ZIP export holds every stored PDF and a manifest describing each report."""
+
+    def setUp(self):
+        super().setUp()
+        self.admin = get_user_model().objects.create_superuser("export-admin", "admin@example.com", "x")
+        self.pdfs = {}
+        for i, risk in enumerate(("High Risk", "Low Risk")):
+            pdf = b"%PDF-1.4 " + bytes([i]) * (200 * 1024)
+            self.pdfs[self._report(pdf, combined_risk_level=risk).pk] = pdf
+        self.missing = AnalysisReport.objects.create(patient_name="No PDF", combined_risk_level="Low Risk")
+
+    def _export(self, **params):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse("feetal_app:admin_reports_export"), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/zip")
+        chunks = list(response.streaming_content)
+        archive = zipfile.ZipFile(io.BytesIO(b"".join(chunks)))
+        self.assertIsNone(archive.testzip())
+        manifest = list(csv.DictReader(io.StringIO(archive.read("manifest.csv").decode("utf-8"))))
+        return chunks, archive, manifest
+
+    def test_archive_and_manifest(self):
+        chunks, archive, manifest = self._export()
+        # Streamed in pieces, not built in memory first
+        self.assertGreater(len(chunks), 2)
+
+        rows = {int(row["report_id"]): row for row in manifest}
+        self.assertEqual(set(rows), set(self.pdfs) | {self.missing.pk})
+        for pk, pdf in self.pdfs.items():
+            row = rows[pk]
+            self.assertEqual(row["status"], "ok")
+            self.assertEqual(archive.read(row["file"]), pdf)
+            self.assertEqual(int(row["size"]), len(pdf))
+            self.assertEqual(row["sha256"], hashlib.sha256(pdf).hexdigest())
+        self.assertEqual(rows[self.missing.pk]["status"], "missing")
+        self.assertEqual(rows[self.missing.pk]["file"], "")
+        self.assertEqual(len(archive.namelist()), len(self.pdfs) + 1)
+
+    def test_risk_filter(self):
+        _, archive, manifest = self._export(risk="High Risk")
+        self.assertEqual([row["combined_risk_level"] for row in manifest], ["High Risk"])
+        self.assertEqual(len(archive.namelist()), 2)
+
+
+def _create_appointments(doctor, count, today, patient=None):
+    """``count`` appointments spread over 60 days around ``today``, in every status."""
+    return Appointment.objects.bulk_create([
+        Appointment(
+            doctor=doctor,
+            patient=patient if i % 2 else None,
+            patient_name=f"Patient {i}",
+            patient_email=f"patient{i % 9}@example.com",
+            patient_phone="1",
+            appointment_date=today + timedelta(days=i % 60 - 30),
+            appointment_time=time(8 + i // 60 % 10, 30 * (i // 600 % 2)),
+            reason="routine-checkup",
+            status=("pending", "confirmed", "completed", "cancelled")[i % 4],
+        )
+        for i in range(count)
+    ])
+
+
+@override_settings(ADMIN_STATS_CACHE_TTL=30)
+class AdminStatsTests(TestCase):
+    """Admin dashboard counters: two aggregate queries, cached until a change."""
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.today = timezone.now().date()
+        cls.doctor = Doctor.objects.create(
+            user=User.objects.create_user("stats-doctor", "d@example.com", "x"), specialization="obgyn", phone="1"
+        )
+        Patient.objects.create(user=User.objects.create_user("stats-patient", "p@example.com", "x"), phone="1")
+        User.objects.create_user("stats-plain", "u@example.com", "x")
+        _create_appointments(cls.doctor, 120, cls.today)
+
+    def setUp(self):
+        stats.invalidate_stats()
+
+    def test_two_queries_with_the_right_counts(self):
+        User = get_user_model()
+        with self.assertNumQueries(2):
+            result = stats.compute_admin_stats()
+        week_ago = timezone.now() - timedelta(days=7)
+        self.assertEqual(result, {
+            "total_users": User.objects.count(),
+            "new_users_week": User.objects.filter(date_joined__gte=week_ago).count(),
+            "doctor_count": Doctor.objects.count(),
+            "patient_count": Patient.objects.count(),
+            "total_appointments": Appointment.objects.count(),
+            "pending_appointments": Appointment.objects.filter(status="pending").count(),
+            "confirmed_appointments": Appointment.objects.filter(status="confirmed").count(),
+            "today_appointments_count": Appointment.objects.filter(appointment_date=self.today).count(),
+        })
+
+    def test_cached_until_an_appointment_changes(self):
+        first = stats.get_admin_stats()
+        with self.assertNumQueries(0):
+            self.assertEqual(stats.get_admin_stats(), first)
+
+        Appointment.objects.filter(status="pending").first().delete()
+        with self.assertNumQueries(2):
+            self.assertEqual(stats.get_admin_stats()["total_appointments"], first["total_appointments"] - 1)
+
+
+@override_settings(ADMIN_STATS_CACHE_TTL=30)
+class DoctorDashboardTests(TestCase):
+    """Doctor dashboard: one listing query and one counter query, matching the plain querysets."""
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.today = timezone.now().date()
+        cls.doctor, other = (
+            Doctor.objects.create(
+                user=User.objects.create_user(f"dash-doctor-{i}", f"d{i}@example.com", "x"),
+                specialization="obgyn",
+                phone="1",
+            )
+            for i in range(2)
+        )
+        _create_appointments(cls.doctor, 600, cls.today)
+        _create_appointments(other, 60, cls.today)
+
+    def setUp(self):
+        stats.invalidate_stats()
+
+    def test_listings_in_one_query(self):
+        active = Appointment.objects.filter(doctor=self.doctor).exclude(status="cancelled")
+        expected = {
+            "today_appointments": list(active.filter(appointment_date=self.today).order_by("appointment_time")),
+            "upcoming_appointments": list(
+                active.filter(appointment_date__gte=self.today).order_by("appointment_date", "appointment_time")[:20]
+            ),
+            "all_appointments": list(active.order_by("-appointment_date", "-appointment_time")[:50]),
+        }
+        with self.assertNumQueries(1):
+            result = stats.doctor_dashboard_appointments(self.doctor.id, self.today)
+        self.assertEqual(result, expected)
+
+    def test_counters(self):
+        appointments = Appointment.objects.filter(doctor=self.doctor)
+        month_start = timezone.now().date().replace(day=1)
+        with self.assertNumQueries(2):
+            result = stats.get_doctor_stats(self.doctor.id)
+        self.assertEqual(result, {
+            "total_appointments": appointments.count(),
+            "pending_appointments": appointments.filter(status="pending").count(),
+            "completed_appointments": appointments.filter(status="completed").count(),
+            "this_month_appointments": appointments.filter(appointment_date__gte=month_start).count(),
+            "unique_patients": appointments.values("patient_email").distinct().count(),
+            "total_patients": Patient.objects.count(),
+        })
+        with self.assertNumQueries(0):
+            stats.get_doctor_stats(self.doctor.id)
+
+    def test_view_query_count(self):
+        self.client.force_login(self.doctor.user)
+        self.client.get(reverse("feetal_app:dashboard_doctor"))
+        with CaptureQueriesContext(connection) as warm:
+            response = self.client.get(reverse("feetal_app:dashboard_doctor"))
+        self.assertEqual(response.status_code, 200)
+        appointment_queries = [q for q in warm.captured_queries if '"feetal_app_appointment"' in q["sql"]]
+        # Counters are cached; only the listing query remains
+        self.assertEqual(len(appointment_queries), 1, [q["sql"] for q in appointment_queries])
+
+
+@override_settings(DOCTOR_DIRECTORY_CACHE_TTL=3600)
+class DoctorDirectoryTests(TestCase):
+    """get_doctors: cached body, conditional GETs and a new version after every doctor change."""
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.doctors = [
+            Doctor.objects.create(
+                user=User.objects.create_user(f"dir-doctor-{i}", f"dir{i}@example.com", "x", first_name=f"Name{i}"),
+                specialization=spec,
+                phone="1",
+            )
+            for i, spec in enumerate(("obgyn", "obgyn", Doctor.SPECIALIZATION_CHOICES[-1][0]))
+        ]
+
+    def setUp(self):
+        cache.clear()
+        patcher = unittest.mock.patch.object(directory, "_local_cache", None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _get(self, **params_and_headers):
+        headers = {k: v for k, v in params_and_headers.items() if k.startswith("HTTP_")}
+        params = {k: v for k, v in params_and_headers.items() if not k.startswith("HTTP_")}
+        return self.client.get(reverse("feetal_app:get_doctors"), params, **headers)
+
+    def test_cached_body_and_validators(self):
+        first = self._get()
+        self.assertEqual(first.status_code, 200)
+        names = [d["name"] for d in first.json()["doctors"]]
+        self.assertEqual(len(names), 3)
+        self.assertIn("Dr. Name0", names)
+        self.assertEqual(first["Cache-Control"], "private, no-cache")
+
+        with self.assertNumQueries(0):
+            second = self._get()
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second["ETag"], first["ETag"])
+        self.assertEqual(second["Last-Modified"], first["Last-Modified"])
+
+    def test_conditional_get(self):
+        first = self._get()
+        with self.assertNumQueries(0):
+            response = self._get(HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        self.assertEqual(self._get(HTTP_IF_MODIFIED_SINCE=first["Last-Modified"]).status_code, 304)
+        self.assertEqual(self._get(HTTP_IF_NONE_MATCH='"stale"').status_code, 200)
+
+    def test_specialization_filter(self):
+        doctors = self._get(specialization="obgyn").json()["doctors"]
+        self.assertEqual([d["id"] for d in doctors], [d.id for d in self.doctors[:2]])
+        self.assertEqual(self._get(specialization="nonsense").json()["doctors"], [])
+
+    def test_saving_a_doctor_changes_the_directory(self):
+        first = self._get()
+        user = self.doctors[0].user
+        user.first_name = "Renamed"
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save()
+
+        response = self._get(HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], first["ETag"])
+        self.assertIn("Dr. Renamed", [d["name"] for d in response.json()["doctors"]])
+
+    def test_deactivated_doctor_leaves_the_directory(self):
+        self._get()
+        user = self.doctors[1].user
+        user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save()
+        ids = [d["id"] for d in self._get().json()["doctors"]]
+        self.assertNotIn(self.doctors[1].id, ids)
+
+    def test_login_does_not_change_the_directory(self):
+        first = self._get()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.force_login(self.doctors[0].user)
+        self.assertEqual(self._get(HTTP_IF_NONE_MATCH=first["ETag"]).status_code, 304)
+
+
+class KeysetPaginationTests(TestCase):
+    """Cursors round-trip exactly and paging visits every row once, in order."""
+
+    ORDER = ("appointment_date", "appointment_time", "id")
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.doctor = Doctor.objects.create(
+            user=User.objects.create_user("page-doctor", "page@example.com", "x"), specialization="obgyn", phone="1"
+        )
+        # Cancelled rows may share a date and time: ties are broken by id
+        _create_appointments(cls.doctor, 137, timezone.now().date())
+        Appointment.objects.bulk_create([
+            Appointment(
+                doctor=cls.doctor, patient_name="Tie", patient_email="tie@example.com", patient_phone="1",
+                appointment_date=timezone.now().date(), appointment_time=time(9), reason="consultation",
+                status="cancelled",
+            )
+            for _ in range(7)
+        ])
+
+    def test_cursor_round_trip(self):
+        from datetime import datetime
+
+        created = datetime(2026, 3, 1, 12, 30, 15, 123456, tzinfo=timezone.get_current_timezone())
+        fields = ("created_at", "id")
+        cursor = encode_cursor([created, 42])
+        self.assertNotIn("=", cursor)
+        self.assertEqual(decode_cursor(AnalysisReport, fields, cursor), [created, 42])
+
+        appointment = Appointment.objects.first()
+        values = [getattr(appointment, name) for name in self.ORDER]
+        self.assertEqual(decode_cursor(Appointment, self.ORDER, encode_cursor(values)), values)
+
+    def test_invalid_cursors(self):
+        for cursor in ("!!!", encode_cursor([1]), encode_cursor(["not-a-date", "09:00", 1]), "e30"):
+            with self.subTest(cursor=cursor), self.assertRaises(InvalidCursor):
+                decode_cursor(Appointment, self.ORDER, cursor)
+
+    def test_pages_cover_every_row_once(self):
+        queryset = Appointment.objects.filter(doctor=self.doctor)
+        expected = list(queryset.order_by(*(f"-{name}" for name in self.ORDER)).values_list("id", flat=True))
+
+        seen, cursor = [], None
+        while True:
+            rows, cursor = keyset_page(queryset, self.ORDER, cursor, limit=10)
+            seen += [row.id for row in rows]
+            if cursor is None:
+                break
+        self.assertEqual(seen, expected)
+
+    def test_parse_limit(self):
+        for raw, expected in ((None, 50), ("", 50), ("x", 50), ("0", 1), ("-5", 1), ("20", 20), ("5000", 200)):
+            with self.subTest(raw=raw):
+                self.assertEqual(parse_limit(raw), expected)
+
+    def test_api_pages(self):
+        self.client.force_login(self.doctor.user)
+        url = reverse("feetal_app:doctor_appointments_api")
+        ids, params = [], {"limit": 25}
+        while True:
+            data = self.client.get(url, params).json()
+            ids += [row["id"] for row in data["appointments"]]
+            if not data["next_cursor"]:
+                break
+            params["cursor"] = data["next_cursor"]
+        self.assertEqual(len(ids), Appointment.objects.filter(doctor=self.doctor).count())
+        self.assertEqual(len(set(ids)), len(ids))
+
+        response = self.client.get(url, {"cursor": "garbage"})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.json()["success"])
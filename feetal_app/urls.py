@@ -30,14 +30,24 @@ urlpatterns = [
     path('dashboard/admin/patients/<int:patient_id>/view/', views.admin_patient_view, name='admin_patient_view'),
     path('dashboard/admin/patients/<int:patient_id>/delete/', views.admin_patient_delete, name='admin_patient_delete'),
     path('api/doctors/', views.get_doctors, name='get_doctors'),
+    path('api/doctors/availability/', views.doctors_availability, name='doctors_availability'),
+    path('api/doctors/<int:doctor_id>/availability/', views.doctor_availability, name='doctor_availability'),
     path('api/appointments/book/', views.book_appointment, name='book_appointment'),
+    path('api/patient/appointments/', views.patient_appointments_api, name='patient_appointments_api'),
+    path('api/doctor/appointments/', views.doctor_appointments_api, name='doctor_appointments_api'),
+    path('api/admin/reports/', views.admin_reports_api, name='admin_reports_api'),
     path('api/appointments/<int:appointment_id>/update-status/', views.admin_update_appointment_status, name='admin_update_appointment_status'),
     path('api/predict/maternal-health/', views.predict_maternal_health_api, name='predict_maternal_health'),
+    path('api/predict/maternal-health/batch/', views.predict_maternal_health_batch_api, name='predict_maternal_health_batch'),
     path('api/predict/preterm-delivery/', views.predict_preterm_delivery_api, name='predict_preterm_delivery'),
     path("api/predict/combined-analysis/", views.combined_analysis_api, name="combined_analysis_api"),
+    path("api/analysis/jobs/<uuid:job_id>/", views.analysis_job_status, name="analysis_job_status"),
     path("api/save-combined-report/", views.save_combined_report, name="save_combined_report"),
+    path("api/ml/stats/", views.ml_stats_api, name="ml_stats_api"),
+    path("health/ready/", views.health_ready, name="health_ready"),
 
     path('dashboard/admin/reports/', views.admin_reports, name='admin_reports'),
+    path('dashboard/admin/reports/export/', views.admin_reports_export, name='admin_reports_export'),
     path('dashboard/admin/reports/download/<int:report_id>/', views.download_report, name='download_report'),
     path('reports/download/<int:report_id>/', views.download_report, name='download_analysis_report'),
 
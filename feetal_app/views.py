@@ -12,7 +12,8 @@ from django.contrib.auth import authenticate, get_user_model, login, logout
 from django.contrib.auth.decorators import login_required
 from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage
-from django.http import JsonResponse, HttpResponse, Http404, FileResponse
+from django.db import IntegrityError, transaction
+from django.http import JsonResponse, HttpResponse, Http404, FileResponse, StreamingHttpResponse
 from django.shortcuts import redirect, render
 from django.utils import timezone
 from django.utils.dateparse import parse_date, parse_time
@@ -21,7 +22,8 @@ from django.views.decorators.http import require_http_methods
 from django.urls import reverse
 
 from django.contrib.auth.tokens import default_token_generator
-from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes, force_str
 from django.core.mail import send_mail
 
@@ -39,12 +41,22 @@ from .forms import (
     AdminUserUpdateForm,
     DoctorAdminForm,
 )
-from .models import Doctor, Patient, Appointment, AnalysisReport, MLReport,DoctorSchedule
+from .models import Doctor, Patient, Appointment, AnalysisReport, AnalysisJob, MLReport,DoctorSchedule
 from .ml_service import (
     predict_maternal_health,
+    predict_maternal_health_batch,
     predict_preterm_delivery,
-    extract_medical_values,
+    get_inference_stats,
+    get_model_readiness,
 )
+from .analysis import AnalysisError, run_combined_analysis
+from .jobs import can_view_job, enqueue_combined_analysis, get_worker_pool, job_status, remember_job
+from .downloads import serve_report_pdf
+from .exports import stream_reports_zip
+from .stats import doctor_dashboard_appointments, get_admin_stats, get_doctor_stats
+from .directory import get_directory
+from .pagination import InvalidCursor, keyset_page, parse_limit
+from .availability import SlotUnavailable, available_slots, fits_schedule, reserve_appointment, slot_minutes
 
 from django.contrib.auth.models import User     # <-- ADD THIS
 from .models import Doctor            
@@ -266,17 +278,20 @@ def admin_add_appointment(request):
         patient = Patient.objects.get(id=data["patient_id"])
         doctor = Doctor.objects.get(id=data["doctor_id"])
 
-        Appointment.objects.create(
-            patient=patient,
-            doctor=doctor,
-            patient_name=patient.user.get_full_name(),
-            patient_email=patient.user.email,
-            patient_phone=patient.phone,
-            appointment_date=data["date"],
-            appointment_time=data["time"],
-            reason=data["reason"],
-            notes=data.get("notes", "")
-        )
+        try:
+            reserve_appointment(
+                patient=patient,
+                doctor=doctor,
+                patient_name=patient.user.get_full_name(),
+                patient_email=patient.user.email,
+                patient_phone=patient.phone,
+                appointment_date=data["date"],
+                appointment_time=data["time"],
+                reason=data["reason"],
+                notes=data.get("notes", "")
+            )
+        except SlotUnavailable as e:
+            return JsonResponse({"success": False, "message": str(e)}, status=409)
 
         return JsonResponse({"success": True})
 
@@ -537,70 +552,19 @@ def dashboard_doctor(request):
         return redirect("feetal_app:index")
 
     today = timezone.now().date()
-    today_appointments = (
-        Appointment.objects.filter(
-            doctor=doctor_profile,
-            appointment_date=today,
-        )
-        .exclude(status="cancelled")
-        .order_by("appointment_time")
-    )
-
-    upcoming_appointments = (
-        Appointment.objects.filter(
-            doctor=doctor_profile,
-            appointment_date__gte=today,
-        )
-        .exclude(status="cancelled")
-        .order_by("appointment_date", "appointment_time")[:20]
-    )
-
-    total_appointments = Appointment.objects.filter(doctor=doctor_profile).count()
-    pending_appointments = Appointment.objects.filter(
-        doctor=doctor_profile, status="pending"
-    ).count()
+    listings = doctor_dashboard_appointments(doctor_profile.pk, today)
 
     recent_reports = AnalysisReport.objects.order_by("-created_at")[:10]
-    total_patients = Patient.objects.count()
-
-    unique_patients = (
-        Appointment.objects.filter(doctor=doctor_profile)
-        .values("patient_email")
-        .distinct()
-        .count()
-    )
-
-    completed_appointments = Appointment.objects.filter(
-        doctor=doctor_profile, status="completed"
-    ).count()
-
-    from datetime import datetime
-    current_month_start = datetime.now().replace(day=1).date()
-    this_month_appointments = Appointment.objects.filter(
-        doctor=doctor_profile, appointment_date__gte=current_month_start
-    ).count()
-
     all_patients = Patient.objects.select_related("user").order_by("-created_at")[:20]
 
-    all_appointments = (
-        Appointment.objects.filter(doctor=doctor_profile)
-        .exclude(status="cancelled")
-        .order_by("-appointment_date", "-appointment_time")[:50]
-    )
-
     context = {
         "doctor": doctor_profile,
         "user": request.user,
         "today": today,
-        "today_appointments": today_appointments,
-        "upcoming_appointments": upcoming_appointments,
-        "all_appointments": all_appointments,
-        "total_appointments": total_appointments,
-        "pending_appointments": pending_appointments,
-        "completed_appointments": completed_appointments,
-        "this_month_appointments": this_month_appointments,
-        "total_patients": total_patients,
-        "unique_patients": unique_patients,
+        # today_appointments, upcoming_appointments, all_appointments
+        **listings,
+        # total/pending/completed/this-month appointments, total_patients, unique_patients
+        **get_doctor_stats(doctor_profile.pk),
         "all_patients": all_patients,
         "recent_reports": recent_reports,
     }
@@ -620,13 +584,8 @@ def dashboard_admin(request):
         return redirect("feetal_app:index")
 
     User = get_user_model()
-    total_users = User.objects.count()
-    doctor_count = Doctor.objects.count()
-    patient_count = Patient.objects.count()
-    week_start = timezone.now() - timedelta(days=7)
-    new_users_week = User.objects.filter(date_joined__gte=week_start).count()
 
-    recent_users_raw = User.objects.order_by("-date_joined")[:5]
+    recent_users_raw = User.objects.select_related("doctor_profile", "patient_profile").order_by("-date_joined")[:5]
     user_rows = []
     for user in recent_users_raw:
         if user.is_superuser:
@@ -686,14 +645,6 @@ def dashboard_admin(request):
         )[:5]
     ]
 
-    today = timezone.now().date()
-    total_appointments = Appointment.objects.count()
-    pending_appointments = Appointment.objects.filter(status="pending").count()
-    confirmed_appointments = Appointment.objects.filter(status="confirmed").count()
-    today_appointments_count = Appointment.objects.filter(
-        appointment_date=today
-    ).count()
-
     appointment_rows = []
     for appointment in Appointment.objects.select_related(
         "doctor__user", "patient__user"
@@ -719,18 +670,12 @@ def dashboard_admin(request):
 
     context = {
         "user": request.user,
-        "total_users": total_users,
-        "doctor_count": doctor_count,
-        "patient_count": patient_count,
-        "new_users_week": new_users_week,
         "user_rows": user_rows,
         "doctor_rows": doctor_rows,
         "patient_rows": patient_rows,
         "appointment_rows": appointment_rows,
-        "total_appointments": total_appointments,
-        "pending_appointments": pending_appointments,
-        "confirmed_appointments": confirmed_appointments,
-        "today_appointments_count": today_appointments_count,
+        # total_users, doctor_count, patient_count, new_users_week and the appointment counters
+        **get_admin_stats(),
     }
     return render(request, "dashboard/admin-dashboard.html", context)
 
@@ -749,6 +694,41 @@ def admin_reports(request):
     return render(request, "dashboard/admin-reports.html", {"reports": reports})
 
 
+@login_required
+def admin_reports_export(request):
+    """
+    Admin-only streaming ZIP of report PDFs plus a CSV manifest.
+    URL example: /dashboard/admin/reports/export/?from=2025-12-01&to=2025-12-31&risk=High+Risk
+    """
+    if not request.user.is_superuser:
+        messages.error(request, "Admin reports are restricted to the superuser.")
+        return redirect("feetal_app:index")
+
+    reports = AnalysisReport.objects.order_by("created_at")
+    date_from = request.GET.get("from") or ""
+    date_to = request.GET.get("to") or ""
+    risk = request.GET.get("risk") or ""
+    try:
+        start = parse_date(date_from) if date_from else None
+        end = parse_date(date_to) if date_to else None
+    except ValueError:
+        start = end = None
+    if (date_from and start is None) or (date_to and end is None):
+        messages.error(request, "Invalid date range. Use YYYY-MM-DD.")
+        return redirect("feetal_app:admin_reports")
+    if start:
+        reports = reports.filter(created_at__date__gte=start)
+    if end:
+        reports = reports.filter(created_at__date__lte=end)
+    if risk:
+        reports = reports.filter(combined_risk_level=risk)
+
+    response = StreamingHttpResponse(stream_reports_zip(reports), content_type="application/zip")
+    file_name = f"analysis_reports_{date_from or 'all'}_{date_to or timezone.localdate().isoformat()}.zip"
+    response["Content-Disposition"] = f'attachment; filename="{file_name}"'
+    return response
+
+
 @login_required
 def admin_user_edit(request, user_id):
     """Allow the superuser to edit a user profile."""
@@ -956,25 +936,80 @@ def admin_patient_delete(request, patient_id):
 def get_doctors(request):
     """Get list of active doctors, optionally filtered by specialization."""
     try:
-        specialization = request.GET.get("specialization", "")
-        doctors = Doctor.objects.filter(user__is_active=True).select_related("user")
+        entry = get_directory(request.GET.get("specialization", ""))
+        last_modified = int(entry.last_modified)
+        response = get_conditional_response(request, etag=entry.etag, last_modified=last_modified)
+        if response is None:
+            response = HttpResponse(entry.content, content_type="application/json")
+        response["ETag"] = entry.etag
+        response["Last-Modified"] = http_date(last_modified)
+        # Stored by the browser only (the response may set the CSRF cookie), revalidated on every use
+        response["Cache-Control"] = "private, no-cache"
+        return response
+    except Exception as e:
+        return JsonResponse({"success": False, "message": str(e)}, status=500)
 
-        if specialization:
-            doctors = doctors.filter(specialization=specialization)
 
-        doctors_list = [
-            {
-                "id": doc.id,
-                "name": f"Dr. {doc.user.get_full_name() or doc.user.username}",
-                "specialization": doc.get_specialization_display(),
-                "specialization_code": doc.specialization,
-            }
-            for doc in doctors
-        ]
+def _availability_range(request):
+    """Parse ?from=&to= (default: the next 7 days); returns (start, end, error)."""
+    today = timezone.localdate()
+    start_raw, end_raw = request.GET.get("from"), request.GET.get("to")
+    try:
+        start = parse_date(start_raw) if start_raw else today
+        end = parse_date(end_raw) if end_raw else None
+    except ValueError:
+        start = end = None
+    if start is None or (end_raw and end is None):
+        return None, None, "Invalid date. Use YYYY-MM-DD."
+    end = end or start + timedelta(days=6)
+    if end < start:
+        return None, None, "'to' must not be before 'from'."
+    max_days = getattr(settings, "APPOINTMENT_AVAILABILITY_MAX_DAYS", 62)
+    if (end - start).days >= max_days:
+        return None, None, f"Date range is limited to {max_days} days."
+    return start, end, None
+
+
+def _availability_json(slots_by_date):
+    return {day.isoformat(): slots for day, slots in slots_by_date.items()}
+
+
+@require_http_methods(["GET"])
+def doctor_availability(request, doctor_id):
+    """Free appointment slots of one doctor between ?from= and ?to=."""
+    start, end, error = _availability_range(request)
+    if error:
+        return JsonResponse({"success": False, "message": error}, status=400)
+    if not Doctor.objects.filter(id=doctor_id, user__is_active=True).exists():
+        return JsonResponse({"success": False, "message": "Doctor not found."}, status=404)
+
+    availability = available_slots([doctor_id], start, end)[doctor_id]
+    return JsonResponse({
+        "success": True,
+        "doctor_id": doctor_id,
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "slot_minutes": slot_minutes(),
+        "availability": _availability_json(availability),
+    })
 
-        return JsonResponse({"success": True, "doctors": doctors_list})
-    except Exception as e:
-        return JsonResponse({"success": False, "message": str(e)}, status=500)
+
+@require_http_methods(["GET"])
+def doctors_availability(request):
+    """Free appointment slots of every active doctor between ?from= and ?to=."""
+    start, end, error = _availability_range(request)
+    if error:
+        return JsonResponse({"success": False, "message": error}, status=400)
+
+    doctor_ids = Doctor.objects.filter(user__is_active=True).values_list("id", flat=True)
+    availability = available_slots(doctor_ids, start, end)
+    return JsonResponse({
+        "success": True,
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "slot_minutes": slot_minutes(),
+        "doctors": {str(doctor_id): _availability_json(slots) for doctor_id, slots in availability.items()},
+    })
 
 
 @require_http_methods(["POST"])
@@ -1082,19 +1117,31 @@ def book_appointment(request):
                     {"success": False, "message": "Invalid age value."}, status=400
                 )
 
-        appointment = Appointment.objects.create(
-            patient=patient,
-            doctor=doctor,
-            patient_name=patient_name,
-            patient_email=patient_email,
-            patient_phone=patient_phone,
-            patient_age=patient_age_int,
-            appointment_date=parsed_date,
-            appointment_time=parsed_time,
-            reason=reason,
-            notes=notes,
-            status="pending",
-        )
+        if not fits_schedule(doctor.id, parsed_date, parsed_time):
+            return JsonResponse(
+                {
+                    "success": False,
+                    "message": "The doctor is not available at this time. Please choose another slot.",
+                },
+                status=400,
+            )
+
+        try:
+            appointment, _ = reserve_appointment(
+                patient=patient,
+                doctor=doctor,
+                patient_name=patient_name,
+                patient_email=patient_email,
+                patient_phone=patient_phone,
+                patient_age=patient_age_int,
+                appointment_date=parsed_date,
+                appointment_time=parsed_time,
+                reason=reason,
+                notes=notes,
+                status="pending",
+            )
+        except SlotUnavailable as e:
+            return JsonResponse({"success": False, "message": str(e)}, status=409)
 
         return JsonResponse(
             {
@@ -1161,6 +1208,104 @@ def doctor_appointments(request):
     return render(request, "dashboard/doctor-appointments.html", context)
 
 
+APPOINTMENT_PAGE_ORDER = ("appointment_date", "appointment_time", "id")
+APPOINTMENT_PAGE_FIELDS = ("id", "appointment_date", "appointment_time", "reason", "status")
+
+
+def _appointment_row(appointment):
+    return {
+        "id": appointment.id,
+        "date": appointment.appointment_date.strftime("%Y-%m-%d"),
+        "time": appointment.appointment_time.strftime("%H:%M"),
+        "reason": appointment.get_reason_display(),
+        "status": appointment.status,
+        "status_display": appointment.get_status_display(),
+    }
+
+
+def _page_response(request, queryset, order, key, serialize):
+    """One keyset page of ``queryset`` as {"success", key: [...], "next_cursor"}."""
+    try:
+        rows, next_cursor = keyset_page(
+            queryset, order, request.GET.get("cursor"), parse_limit(request.GET.get("limit"))
+        )
+    except InvalidCursor as e:
+        return JsonResponse({"success": False, "message": str(e)}, status=400)
+    return JsonResponse({"success": True, key: [serialize(row) for row in rows], "next_cursor": next_cursor})
+
+
+@login_required
+@require_http_methods(["GET"])
+def patient_appointments_api(request):
+    """Logged-in patient's appointments, newest first. ?cursor=&limit="""
+    try:
+        patient = request.user.patient_profile
+    except Patient.DoesNotExist:
+        return JsonResponse({"success": True, "appointments": [], "next_cursor": None})
+
+    appointments = (
+        Appointment.objects.filter(patient=patient)
+        .select_related("doctor__user")
+        .only(*APPOINTMENT_PAGE_FIELDS, "doctor__user__first_name", "doctor__user__last_name", "doctor__user__username")
+    )
+
+    def serialize(appointment):
+        doctor_user = appointment.doctor.user
+        return {
+            **_appointment_row(appointment),
+            "doctor": f"Dr. {doctor_user.get_full_name() or doctor_user.username}",
+        }
+
+    return _page_response(request, appointments, APPOINTMENT_PAGE_ORDER, "appointments", serialize)
+
+
+@login_required
+@require_http_methods(["GET"])
+def doctor_appointments_api(request):
+    """Logged-in doctor's appointments, newest first. ?cursor=&limit="""
+    try:
+        doctor = request.user.doctor_profile
+    except Doctor.DoesNotExist:
+        return JsonResponse({"success": False, "message": "Access denied. Doctors only."}, status=403)
+
+    appointments = Appointment.objects.filter(doctor=doctor).only(
+        *APPOINTMENT_PAGE_FIELDS, "patient_name", "patient_email", "patient_phone", "patient_age"
+    )
+
+    def serialize(appointment):
+        return {
+            **_appointment_row(appointment),
+            "patient_name": appointment.patient_name,
+            "patient_email": appointment.patient_email,
+            "patient_phone": appointment.patient_phone,
+            "patient_age": appointment.patient_age,
+        }
+
+    return _page_response(request, appointments, APPOINTMENT_PAGE_ORDER, "appointments", serialize)
+
+
+@login_required
+@require_http_methods(["GET"])
+def admin_reports_api(request):
+    """All analysis reports, newest first (superuser only). ?cursor=&limit="""
+    if not request.user.is_superuser:
+        return JsonResponse({"success": False, "message": "Access denied. Admin only."}, status=403)
+
+    reports = AnalysisReport.objects.only("id", "patient_name", "patient_email", "combined_risk_level", "created_at")
+
+    def serialize(report):
+        return {
+            "id": report.id,
+            "patient_name": report.patient_name,
+            "patient_email": report.patient_email,
+            "risk_level": report.combined_risk_level,
+            "created_at": report.created_at.isoformat(),
+            "download_url": reverse("feetal_app:download_report", args=[report.id]),
+        }
+
+    return _page_response(request, reports, ("created_at", "id"), "reports", serialize)
+
+
 @login_required
 @require_http_methods(["POST"])
 def admin_update_appointment_status(request, appointment_id):
@@ -1180,7 +1325,14 @@ def admin_update_appointment_status(request, appointment_id):
             )
 
         appointment.status = new_status
-        appointment.save()
+        try:
+            with transaction.atomic():
+                appointment.save()
+        except IntegrityError:
+            return JsonResponse(
+                {"success": False, "message": "Another active appointment already holds this slot."},
+                status=409,
+            )
 
         return JsonResponse(
             {
@@ -1257,6 +1409,87 @@ def predict_maternal_health_api(request):
         return JsonResponse({"success": False, "message": error_msg}, status=500)
 
 
+@require_http_methods(["POST"])
+@ensure_csrf_cookie
+def predict_maternal_health_batch_api(request):
+    """
+    Bulk maternal health scoring (e.g. nightly re-scoring of historical records).
+    Body: {"records": [{age, systolic_bp, diastolic_bp, bs, heart_rate, body_temp}, ...]}
+    Returns one result per record, in order, with the same fields as the single API.
+    """
+    try:
+        data = json.loads(request.body)
+        records = data.get("records") if isinstance(data, dict) else data
+
+        if not isinstance(records, list) or not records:
+            return JsonResponse(
+                {"success": False, "message": "Provide a non-empty list of records."},
+                status=400,
+            )
+
+        max_records = getattr(settings, "MATERNAL_BATCH_MAX_RECORDS", 10000)
+        if len(records) > max_records:
+            return JsonResponse(
+                {
+                    "success": False,
+                    "message": f"Too many records (maximum {max_records} per request).",
+                },
+                status=400,
+            )
+
+        required_fields = ["age", "systolic_bp", "diastolic_bp", "bs", "heart_rate"]
+        results = [None] * len(records)
+        valid_records, valid_index = [], []
+        for i, record in enumerate(records):
+            if not isinstance(record, dict):
+                results[i] = {"success": False, "message": "Record must be an object"}
+                continue
+            missing_fields = [field for field in required_fields if field not in record]
+            if missing_fields:
+                results[i] = {
+                    "success": False,
+                    "message": f'Missing required fields: {", ".join(missing_fields)}',
+                }
+                continue
+            valid_records.append(record)
+            valid_index.append(i)
+
+        for i, result in zip(valid_index, predict_maternal_health_batch(valid_records)):
+            if result.get("success"):
+                results[i] = {
+                    "success": True,
+                    "prediction": result.get("prediction"),
+                    "risk_level": result.get("risk_level"),
+                    "prediction_proba": result.get("prediction_proba"),
+                    "message": f'Risk assessment: {result.get("risk_level")}',
+                }
+            else:
+                results[i] = {
+                    "success": False,
+                    "message": result.get("error", "Prediction failed"),
+                }
+
+        return JsonResponse(
+            {
+                "success": True,
+                "count": len(results),
+                "scored": sum(1 for r in results if r.get("success")),
+                "results": results,
+            }
+        )
+
+    except json.JSONDecodeError:
+        return JsonResponse(
+            {"success": False, "message": "Invalid JSON data"}, status=400
+        )
+    except Exception as e:
+        if settings.DEBUG:
+            error_msg = f"{str(e)}\n{traceback.format_exc()}"
+        else:
+            error_msg = "An error occurred during prediction."
+        return JsonResponse({"success": False, "message": error_msg}, status=500)
+
+
 @require_http_methods(["POST"])
 @ensure_csrf_cookie
 def predict_preterm_delivery_api(request):
@@ -1323,182 +1556,28 @@ def predict_preterm_delivery_api(request):
         return JsonResponse({"success": False, "message": error_msg}, status=500)
 
 
-# ============================================================================
-# COMBINED ANALYSIS → PDF → ADMIN
-# ============================================================================
-
-def _build_combined_pdf(
-    patient_name,
-    patient_email,
-    preterm_result,
-    maternal_result,
-    combined_result,
-):
+def health_ready(request):
     """
-    Hospital-theme PDF: Blue + White minimal clinical report
+    Readiness probe for the load balancer: 503 while this worker is still
+    loading / warming up the ML models, 200 afterwards.
     """
-    from reportlab.platypus import SimpleDocTemplate, KeepTogether
-    from reportlab.lib.pagesizes import A4
-
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(
-        buffer,
-        pagesize=A4,
-        rightMargin=50,
-        leftMargin=50,
-        topMargin=50,
-        bottomMargin=50,
-    )
-
-    elements = []
-    styles = getSampleStyleSheet()
-
-    # >>> Correct date & time (local timezone)
-    generated_at = timezone.localtime()
-
-    from reportlab.platypus import Paragraph, Table, TableStyle, Spacer
-    from reportlab.lib import colors
-    from reportlab.lib.enums import TA_CENTER
-    from reportlab.lib.units import inch
+    state = get_model_readiness()
+    return JsonResponse(state, status=200 if state["ready"] else 503)
 
-    hospital_blue = colors.HexColor("#0052CC")
-    text_black = colors.HexColor("#1A1A1A")
-    text_gray = colors.HexColor("#6B7280")
 
-    # ---------------- HEADER ----------------
-    header = Table(
-        [
-            [Paragraph("<b><font size=24 color='white'>FetoScope AI</font></b>",
-                       ParagraphStyle(name="header", alignment=TA_CENTER))]
-        ],
-        colWidths=[7 * inch],
-    )
-    header.setStyle(TableStyle([
-        ("BACKGROUND", (0, 0), (-1, -1), hospital_blue),
-        ("TOPPADDING", (0, 0), (-1, -1), 18),
-        ("BOTTOMPADDING", (0, 0), (-1, -1), 18),
-    ]))
-    elements.append(header)
-    elements.append(Spacer(1, 20))
-
-    # ---------------- PATIENT INFO ----------------
-    elements.append(Paragraph("<b>Patient Information</b>",
-                              ParagraphStyle(name="sec", fontSize=13, textColor=hospital_blue)))
-    elements.append(Spacer(1, 5))
-
-    patient_table = Table([
-        ["Name:", patient_name],
-        ["Email:", patient_email],
-        ["Report Date:", generated_at.strftime("%B %d, %Y | %I:%M %p")],
-    ], colWidths=[1.7 * inch, 4.8 * inch])
-
-    patient_table.setStyle(TableStyle([
-        ("TEXTCOLOR", (0, 0), (-1, -1), text_black),
-        ("FONTNAME", (0, 0), (-1, -1), "Helvetica"),
-        ("FONTSIZE", (0, 0), (-1, -1), 11),
-        ("BOTTOMPADDING", (0, 0), (-1, -1), 8),
-    ]))
-    elements.append(patient_table)
-    elements.append(Spacer(1, 20))
-
-    # ---------------- OVERALL RISK ----------------
-    risk = combined_result.get("risk_level")
-    conf = combined_result.get("confidence")
-
-    risk_color = {
-        "High Risk": "#D90429",
-        "Medium Risk": "#FF8800",
-        "Low Risk": "#0BA82E",
-    }.get(risk, "#000000")
-
-    elements.append(Paragraph(
-        "<b>Overall Risk Assessment</b>",
-        ParagraphStyle(name="sec_title", fontSize=13, textColor=hospital_blue)
-    ))
-    elements.append(Spacer(1, 12))
-
-    risk_section = KeepTogether([
-        Paragraph(
-            f"<b><font size=34 color='{risk_color}'>{risk}</font></b>",
-            ParagraphStyle(name="risk_big", alignment=TA_CENTER, leading=38)
-        ),
-        Spacer(1, 14),
-        Paragraph(
-            f"<b><font size=14 color='{text_black}'>Confidence Level: {conf}%</font></b>",
-            ParagraphStyle(name="risk_conf", alignment=TA_CENTER)
+@login_required
+def ml_stats_api(request):
+    """Admin-only runtime counters for the ML layer (batch sizes, queue waits)."""
+    if not request.user.is_superuser:
+        return JsonResponse(
+            {"success": False, "message": "Access denied. Admin only."}, status=403
         )
-    ])
-
-    elements.append(risk_section)
-    elements.append(Spacer(1, 60))  # spacing before next section
-
-    # ---------------- DETAILED ANALYSIS ----------------
-    elements.append(Paragraph(
-        "<b>Detailed Analysis</b>",
-        ParagraphStyle(name="sec2", fontSize=13, textColor=hospital_blue)
-    ))
-    elements.append(Spacer(1, 10))
-
-    pre_r = preterm_result.get("risk_level")
-    pre_p = round(preterm_result.get("probability", 0) * 100, 2)
-    mat_r = maternal_result.get("risk_level")
-    mat_p = round(maternal_result.get("prediction_proba", 0) * 100, 2)
-
-    def risk_color_hex(r):
-        return {
-            "High Risk": "#D90429",
-            "Medium Risk": "#FF8800",
-            "Low Risk": "#0BA82E",
-        }.get(r, "#000000")
-
-    def risk_paragraph(title, risk, prob):
-        return [
-            Paragraph(title, ParagraphStyle(name="cell_title", fontSize=11, textColor=text_black)),
-            Paragraph(f"<b><font color='{risk_color_hex(risk)}'>{risk}</font></b>",
-                    ParagraphStyle(name="cell_risk", fontSize=11, alignment=TA_CENTER)),
-            Paragraph(f"{prob}%", ParagraphStyle(name="cell_prob", fontSize=11, alignment=TA_CENTER)),
-        ]
-
-    analysis_table = Table(
-        [
-            [
-                Paragraph("<b><font size=12 color='white'>Analysis Type</font></b>",
-                        ParagraphStyle(name="hdr", alignment=TA_CENTER)),
-                Paragraph("<b><font size=12 color='white'>Risk Level</font></b>",
-                        ParagraphStyle(name="hdr", alignment=TA_CENTER)),
-                Paragraph("<b><font size=12 color='white'>Probability</font></b>",
-                        ParagraphStyle(name="hdr", alignment=TA_CENTER)),
-            ],
-            risk_paragraph("Preterm Delivery (Image-based)", pre_r, pre_p),
-            risk_paragraph("Maternal Health (Reports-based)", mat_r, mat_p),
-        ],
-        colWidths=[3.7 * inch, 1.9 * inch, 1.1 * inch]
-    )
-
-    analysis_table.setStyle(TableStyle([
-        ("BACKGROUND", (0, 0), (-1, 0), hospital_blue),
-        ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
-        ("ALIGN", (0, 0), (-1, -1), "CENTER"),
-        ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
-        ("TOPPADDING", (0, 0), (-1, -1), 10),
-        ("BOTTOMPADDING", (0, 0), (-1, -1), 10),
-    ]))
-    elements.append(analysis_table)
-    elements.append(Spacer(1, 35))
-
-    # ---------------- FOOTER ----------------
-    elements.append(Paragraph(
-        f"Generated automatically by FetoScope AI · {generated_at.strftime('%B %d, %Y %I:%M %p')}",
-        ParagraphStyle(name="foot", fontSize=9, textColor=text_gray, alignment=TA_CENTER)
-    ))
-
-    doc.build(elements)
-    pdf = buffer.getvalue()
-    buffer.close()
-    return pdf
-
+    return JsonResponse({"success": True, "stats": get_inference_stats()})
 
 
+# ============================================================================
+# COMBINED ANALYSIS → PDF → ADMIN
+# ============================================================================
 
 @require_http_methods(["POST"])
 @ensure_csrf_cookie
@@ -1506,9 +1585,9 @@ def combined_analysis_api(request):
     """
     Combined analysis API:
     - Accepts scanning images & medical reports (TXT/PDF/DOC/DOCX)
-    - Runs both ML models
-    - Generates a PDF report
-    - Saves it to AnalysisReport for admin
+    - Queues an AnalysisJob and returns its job ID (202); a worker runs both
+      ML models, generates the PDF and saves it to AnalysisReport for admin
+    - With ANALYSIS_JOBS_ENABLED=False the analysis runs inside the request
     """
     try:
         if not request.FILES:
@@ -1532,81 +1611,6 @@ def combined_analysis_api(request):
                 status=400,
             )
 
-        # Preterm analysis (image-based)
-        preterm_input = {"image_file": scanning_files[0]}
-        preterm_result = predict_preterm_delivery(preterm_input)
-        if not preterm_result.get("success"):
-            return JsonResponse(
-                {
-                    "success": False,
-                    "message": preterm_result.get(
-                        "error", "Preterm analysis failed."
-                    ),
-                },
-                status=500,
-            )
-
-        # Maternal analysis (reports-based)
-        extracted = {}
-        for f in medical_files:
-            vals = extract_medical_values(f)
-            if vals:
-                for k, v in vals.items():
-                    if v is not None and v != "":
-                        extracted[k] = v
-
-        if not extracted:
-            return JsonResponse(
-                {
-                    "success": False,
-                    "message": "Could not detect medical values in reports. Please ensure Age, BP, Sugar, etc. are present in text.",
-                },
-                status=400,
-            )
-
-        maternal_result = predict_maternal_health(extracted)
-        if not maternal_result.get("success"):
-            return JsonResponse(
-                {
-                    "success": False,
-                    "message": maternal_result.get(
-                        "error", "Maternal analysis failed."
-                    ),
-                },
-                status=500,
-            )
-
-        # Combine risk logic
-        def risk_to_score(r):
-            if r == "High Risk":
-                return 3
-            if r == "Medium Risk":
-                return 2
-            return 1
-
-        preterm_risk = preterm_result.get("risk_level")
-        maternal_risk = maternal_result.get("risk_level")
-
-        scores = [risk_to_score(preterm_risk), risk_to_score(maternal_risk)]
-        max_score = max(scores)
-
-        if max_score == 3:
-            combined_risk = "High Risk"
-        elif max_score == 2:
-            combined_risk = "Medium Risk"
-        else:
-            combined_risk = "Low Risk"
-
-        pt_conf = preterm_result.get("probability", 0) * 100
-        mh_conf = maternal_result.get("prediction_proba", 0) * 100
-        combined_confidence = int(round((pt_conf + mh_conf) / 2))
-
-        combined_result = {
-            "risk_level": combined_risk,
-            "confidence": combined_confidence,
-        }
-
-        # Build PDF & save
         if request.user.is_authenticated and hasattr(request.user, "patient_profile"):
             patient_name = (
                 request.user.get_full_name() or request.user.username or "Patient"
@@ -1616,33 +1620,24 @@ def combined_analysis_api(request):
             patient_name = request.POST.get("patient_name", "Unknown Patient")
             patient_email = request.POST.get("patient_email", "")
 
-        pdf_bytes = _build_combined_pdf(
-            patient_name,
-            patient_email,
-            preterm_result,
-            maternal_result,
-            combined_result,
-        )
-
-        file_name = f"combined_report_{timezone.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-
-        report = AnalysisReport.objects.create(
-            patient_name=patient_name,
-            patient_email=patient_email,
-            combined_risk_level=combined_risk,
-        )
+        if getattr(settings, "ANALYSIS_JOBS_ENABLED", True):
+            job = enqueue_combined_analysis(scanning_files, medical_files, patient_name, patient_email)
+            remember_job(request, job)
+            return JsonResponse(
+                {
+                    "success": True,
+                    "job_id": str(job.job_id),
+                    "status": job.status,
+                    "status_url": reverse("feetal_app:analysis_job_status", args=[job.job_id]),
+                    "message": "Your reports were received and are being analyzed.",
+                },
+                status=202,
+            )
 
         try:
-            # Ensure directory exists (critical for Render)
-            report_dir = os.path.join(settings.MEDIA_ROOT, "analysis_reports")
-            os.makedirs(report_dir, exist_ok=True)
-            
-            report.pdf.save(file_name, ContentFile(pdf_bytes))
-            report.save()
-        except Exception as e:
-            if settings.DEBUG:
-                print(f"[ERROR] Failed to save PDF: {str(e)}")
-            report.save()
+            run_combined_analysis(scanning_files, medical_files, patient_name, patient_email)
+        except AnalysisError as e:
+            return JsonResponse({"success": False, "message": e.message}, status=e.status)
 
         return JsonResponse(
             {
@@ -1659,86 +1654,94 @@ def combined_analysis_api(request):
         return JsonResponse({"success": False, "message": error_msg}, status=500)
 
 
+@require_http_methods(["GET"])
+def analysis_job_status(request, job_id):
+    """Progress of a queued combined analysis and, once finished, the report link (uploader only)."""
+    try:
+        job = AnalysisJob.objects.get(job_id=job_id)
+    except AnalysisJob.DoesNotExist:
+        job = None
+    if job is None or not can_view_job(request, job):
+        # Same answer for someone else's job, so IDs cannot be probed
+        return JsonResponse({"success": False, "message": "Analysis job not found."}, status=404)
+    # Polling keeps this process's workers running even if it booted without them
+    get_worker_pool()
+    return JsonResponse({"success": True, **job_status(job)})
+
+
 @login_required
 def download_report(request, report_id):
     """Download report PDF - handles both MLReport and AnalysisReport"""
     # Try AnalysisReport first (newer reports with PDF files)
     try:
         report = AnalysisReport.objects.get(id=report_id)
+        # Stored PDF (location, size and ETag resolved once and kept on the row), or
+        # rendered from the saved results on first download (ANALYSIS_DEFER_PDF, lost file)
+        response = serve_report_pdf(request, report)
+        if response is not None:
+            return response
         if report.pdf and report.pdf.name:
-            if default_storage.exists(report.pdf.name):
-                file = default_storage.open(report.pdf.name, "rb")
-                response = FileResponse(
-                    file,
-                    content_type="application/pdf",
-                    filename=os.path.basename(report.pdf.name),
-                )
-                response[
-                    "Content-Disposition"
-                ] = f'attachment; filename="{os.path.basename(report.pdf.name)}"'
-                return response
-            else:
-                try:
-                    file_path = report.pdf.path
-                    if os.path.exists(file_path):
-                        return FileResponse(
-                            open(file_path, "rb"),
-                            content_type="application/pdf",
-                            filename=os.path.basename(report.pdf.name),
-                        )
-                except (ValueError, AttributeError):
-                    pass
-
-                base_dir = settings.BASE_DIR
-                alternative_paths = [
-                    os.path.join(base_dir, report.pdf.name),
-                    os.path.join(base_dir, "media", report.pdf.name),
-                ]
-
-                for alt_path in alternative_paths:
-                    normalized_path = os.path.normpath(alt_path)
-                    if os.path.exists(normalized_path):
-                        return FileResponse(
-                            open(normalized_path, "rb"),
-                            content_type="application/pdf",
-                            filename=os.path.basename(report.pdf.name),
-                        )
+            try:
+                file_path = report.pdf.path
+                if os.path.exists(file_path):
+                    return FileResponse(
+                        open(file_path, "rb"),
+                        content_type="application/pdf",
+                        filename=os.path.basename(report.pdf.name),
+                    )
+            except (ValueError, AttributeError):
+                pass
 
-                # Fallback: regenerate a simple PDF summary
-                buffer = io.BytesIO()
-                p = canvas.Canvas(buffer, pagesize=A4)
-                p.setFont("Helvetica-Bold", 16)
-                p.drawString(100, 800, "FetoScope AI Analysis Report")
-                p.setFont("Helvetica", 12)
-                p.drawString(50, 760, f"Patient: {report.patient_name}")
-                p.drawString(
-                    50, 740, f"Email: {report.patient_email or 'N/A'}"
-                )
-                p.drawString(
-                    50, 720, f"Risk Level: {report.combined_risk_level}"
-                )
-                p.drawString(
-                    50,
-                    700,
-                    f"Generated: {report.created_at.strftime('%Y-%m-%d %H:%M')}",
-                )
-                p.drawString(
-                    50,
-                    680,
-                    "Note: Original PDF file was not found. This is a regenerated summary.",
-                )
-                p.showPage()
-                p.save()
-
-                buffer.seek(0)
-                pdf_data = buffer.read()
-                buffer.close()
-
-                response = HttpResponse(pdf_data, content_type="application/pdf")
-                response[
-                    "Content-Disposition"
-                ] = f'attachment; filename="report_{report_id}_regenerated.pdf"'
-                return response
+            base_dir = settings.BASE_DIR
+            alternative_paths = [
+                os.path.join(base_dir, report.pdf.name),
+                os.path.join(base_dir, "media", report.pdf.name),
+            ]
+
+            for alt_path in alternative_paths:
+                normalized_path = os.path.normpath(alt_path)
+                if os.path.exists(normalized_path):
+                    return FileResponse(
+                        open(normalized_path, "rb"),
+                        content_type="application/pdf",
+                        filename=os.path.basename(report.pdf.name),
+                    )
+
+            # Fallback for reports saved without analysis_data: regenerate a simple PDF summary
+            buffer = io.BytesIO()
+            p = canvas.Canvas(buffer, pagesize=A4)
+            p.setFont("Helvetica-Bold", 16)
+            p.drawString(100, 800, "FetoScope AI Analysis Report")
+            p.setFont("Helvetica", 12)
+            p.drawString(50, 760, f"Patient: {report.patient_name}")
+            p.drawString(
+                50, 740, f"Email: {report.patient_email or 'N/A'}"
+            )
+            p.drawString(
+                50, 720, f"Risk Level: {report.combined_risk_level}"
+            )
+            p.drawString(
+                50,
+                700,
+                f"Generated: {report.created_at.strftime('%Y-%m-%d %H:%M')}",
+            )
+            p.drawString(
+                50,
+                680,
+                "Note: Original PDF file was not found. This is a regenerated summary.",
+            )
+            p.showPage()
+            p.save()
+
+            buffer.seek(0)
+            pdf_data = buffer.read()
+            buffer.close()
+
+            response = HttpResponse(pdf_data, content_type="application/pdf")
+            response[
+                "Content-Disposition"
+            ] = f'attachment; filename="report_{report_id}_regenerated.pdf"'
+            return response
     except AnalysisReport.DoesNotExist:
         pass
 
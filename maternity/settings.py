@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 import os
+import tempfile
 
 
 from pathlib import Path
@@ -91,6 +92,11 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # A temporary file rather than the in-memory default: concurrent-booking
+        # tests need SQLite's database locks, not the table locks of a shared
+        # in-memory cache. The pid keeps simultaneous test runs (CI matrix jobs,
+        # several checkouts) from sharing one file.
+        'TEST': {'NAME': os.path.join(tempfile.gettempdir(), f'feetal_test_{os.getpid()}.sqlite3')},
     }
 }
 
@@ -154,11 +160,126 @@ FILE_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10 MB
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
+# ML inference
+# Load both models and run a dummy forward pass when a WSGI/ASGI worker boots,
+# so the first request after a deploy does not time out; /health/ready/ returns
+# 503 until warm-up has finished.
+ML_WARMUP_ON_STARTUP = os.environ.get('ML_WARMUP_ON_STARTUP', 'False').lower() == 'true'
+
+# Micro-batching for the preterm CNN: concurrent requests are collected for up to
+# PRETERM_BATCH_MAX_WAIT_MS and run through one model.predict() call.
+PRETERM_BATCHING_ENABLED = os.environ.get('PRETERM_BATCHING_ENABLED', 'True').lower() == 'true'
+PRETERM_BATCH_MAX_SIZE = int(os.environ.get('PRETERM_BATCH_MAX_SIZE', '8'))
+PRETERM_BATCH_MAX_WAIT_MS = float(os.environ.get('PRETERM_BATCH_MAX_WAIT_MS', '5'))
+
+# Upper bound on records accepted by /api/predict/maternal-health/batch/
+MATERNAL_BATCH_MAX_RECORDS = int(os.environ.get('MATERNAL_BATCH_MAX_RECORDS', '10000'))
+
+# Memoized maternal predictions, keyed by the quantized feature vector and the
+# model file hash (invalidated automatically when the .pkl changes).
+MATERNAL_PREDICTION_CACHE_ENABLED = os.environ.get('MATERNAL_PREDICTION_CACHE_ENABLED', 'True').lower() == 'true'
+MATERNAL_PREDICTION_CACHE_SIZE = int(os.environ.get('MATERNAL_PREDICTION_CACHE_SIZE', '4096'))
+MATERNAL_PREDICTION_CACHE_TTL = int(os.environ.get('MATERNAL_PREDICTION_CACHE_TTL', '600'))
+
+# PDF reports are read page by page and stop early once every vital is found;
+# pages beyond this cap are never parsed.
+REPORT_PDF_MAX_PAGES = int(os.environ.get('REPORT_PDF_MAX_PAGES', '50'))
+
+# Values extracted from uploaded PDF/DOCX reports are cached on disk, keyed by
+# the SHA-256 of the file bytes (least recently used entries are evicted).
+REPORT_CACHE_ENABLED = os.environ.get('REPORT_CACHE_ENABLED', 'True').lower() == 'true'
+REPORT_CACHE_PATH = os.environ.get('REPORT_CACHE_PATH', os.path.join(BASE_DIR, 'cache', 'report_values.sqlite3'))
+REPORT_CACHE_MAX_ENTRIES = int(os.environ.get('REPORT_CACHE_MAX_ENTRIES', '5000'))
+
+# Out-of-process model server (python manage.py run_model_server). When a socket
+# path is set, web workers send predictions to that process over a Unix domain
+# socket instead of loading the models themselves.
+ML_MODEL_SERVER_SOCKET = os.environ.get('ML_MODEL_SERVER_SOCKET', '')
+ML_MODEL_SERVER_POOL_SIZE = int(os.environ.get('ML_MODEL_SERVER_POOL_SIZE', '4'))
+ML_MODEL_SERVER_TIMEOUT = float(os.environ.get('ML_MODEL_SERVER_TIMEOUT', '60'))
+
+# Runtime for the preterm CNN: 'keras' loads the .h5 with TensorFlow; 'tflite' or
+# 'onnx' run the artifact written by `python manage.py convert_preterm_model`
+# (ml_models/preterm_delivery_cnn.tflite / .onnx unless PRETERM_MODEL_ARTIFACT is set).
+PRETERM_MODEL_BACKEND = os.environ.get('PRETERM_MODEL_BACKEND', 'keras').lower()
+PRETERM_MODEL_ARTIFACT = os.environ.get('PRETERM_MODEL_ARTIFACT', '')
+PRETERM_MODEL_THREADS = int(os.environ['PRETERM_MODEL_THREADS']) if os.environ.get('PRETERM_MODEL_THREADS') else None
+
+# Let libjpeg downscale large JPEG scans while decoding (and shrink other formats
+# with Image.reduce before resampling). Set to False for bit-exact legacy resizing.
+PRETERM_JPEG_DRAFT = os.environ.get('PRETERM_JPEG_DRAFT', 'True').lower() == 'true'
+
+# Combined analyses run as AnalysisJob rows processed by a worker pool: the upload
+# request returns a job ID at once and /api/analysis/jobs/<id>/ reports progress.
+# ANALYSIS_JOB_WORKERS threads run in every web process; set it to 0 and run
+# `python manage.py run_analysis_worker` to process jobs in a separate process.
+ANALYSIS_JOBS_ENABLED = os.environ.get('ANALYSIS_JOBS_ENABLED', 'True').lower() == 'true'
+ANALYSIS_JOB_WORKERS = int(os.environ.get('ANALYSIS_JOB_WORKERS', '2'))
+# Start the pool as each web process boots (wsgi.py/asgi.py) instead of on the first upload
+ANALYSIS_JOB_WORKERS_ON_STARTUP = os.environ.get('ANALYSIS_JOB_WORKERS_ON_STARTUP', 'True').lower() == 'true'
+ANALYSIS_JOB_POLL_SECONDS = float(os.environ.get('ANALYSIS_JOB_POLL_SECONDS', '2'))
+ANALYSIS_JOB_STALE_SECONDS = int(os.environ.get('ANALYSIS_JOB_STALE_SECONDS', '600'))
+ANALYSIS_JOB_MAX_ATTEMPTS = int(os.environ.get('ANALYSIS_JOB_MAX_ATTEMPTS', '2'))
+
+# Scans and medical reports of one analysis are read concurrently on a shared,
+# bounded thread pool. PDF parsing is pure Python: ANALYSIS_REPORT_PROCESSES=True
+# parses reports in a process pool of the same size instead.
+ANALYSIS_FILE_WORKERS = int(os.environ.get('ANALYSIS_FILE_WORKERS', '8'))
+ANALYSIS_REPORT_PROCESSES = os.environ.get('ANALYSIS_REPORT_PROCESSES', 'False').lower() == 'true'
+
+# Skip rendering the PDF during analysis: the results are stored on the
+# AnalysisReport and the PDF is rendered (and saved) on its first download.
+ANALYSIS_DEFER_PDF = os.environ.get('ANALYSIS_DEFER_PDF', 'False').lower() == 'true'
+
+# Report downloads: 'xsendfile' (Apache mod_xsendfile, lighttpd) or 'x-accel'
+# (nginx) hands the PDF transfer to the front server instead of streaming it
+# through the worker. For nginx, REPORT_SENDFILE_PREFIX is the internal location
+# aliased to MEDIA_ROOT.
+REPORT_SENDFILE = os.environ.get('REPORT_SENDFILE', '').lower()
+REPORT_SENDFILE_PREFIX = os.environ.get('REPORT_SENDFILE_PREFIX', '/protected-media/')
+
+# Admin dashboard counters are cached for this many seconds (0 disables the cache);
+# saving a user, doctor, patient or appointment clears it.
+ADMIN_STATS_CACHE_TTL = float(os.environ.get('ADMIN_STATS_CACHE_TTL', '30'))
+
+# Length of a bookable appointment slot in minutes, and the longest date range
+# the availability endpoints accept.
+APPOINTMENT_SLOT_MINUTES = int(os.environ.get('APPOINTMENT_SLOT_MINUTES', '30'))
+APPOINTMENT_AVAILABILITY_MAX_DAYS = int(os.environ.get('APPOINTMENT_AVAILABILITY_MAX_DAYS', '62'))
+# Migration 0013 stops when a doctor/date/time is held by more than one active
+# appointment; set this to cancel all but the earliest booking instead (each
+# cancelled booking is logged).
+APPOINTMENT_CANCEL_DOUBLE_BOOKINGS = os.environ.get('APPOINTMENT_CANCEL_DOUBLE_BOOKINGS', 'False').lower() == 'true'
+
+# Django's cache holds data shared between worker processes (the doctor
+# directory); point it at Redis or Memcached when running several workers.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
+
+# The doctor directory (get_doctors) is cached for this many seconds (0 disables
+# the cache); saving or deleting a doctor or user starts a new version at once.
+DOCTOR_DIRECTORY_CACHE_TTL = float(os.environ.get('DOCTOR_DIRECTORY_CACHE_TTL', '3600'))
+
+
 if os.name == 'nt':
     TESSERACT_CMD = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
 else:
     TESSERACT_CMD = "tesseract"
 
+# OCR fallback for scanned PDF reports: pages without a text layer are rendered
+# at OCR_DPI and read by Tesseract on a pool of OCR_MAX_WORKERS processes, at
+# most OCR_MAX_PAGES pages per document and OCR_PAGE_TIMEOUT seconds per page.
+OCR_ENABLED = os.environ.get('OCR_ENABLED', 'True').lower() == 'true'
+OCR_DPI = int(os.environ.get('OCR_DPI', '200'))
+OCR_MAX_PAGES = int(os.environ.get('OCR_MAX_PAGES', '5'))
+OCR_MAX_WORKERS = int(os.environ.get('OCR_MAX_WORKERS', '2'))
+OCR_PAGE_TIMEOUT = int(os.environ.get('OCR_PAGE_TIMEOUT', '30'))
+OCR_LANG = os.environ.get('OCR_LANG', 'eng')
+
 EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
 EMAIL_HOST = "smtp.gmail.com"
 EMAIL_PORT = 587
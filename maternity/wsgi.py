@@ -14,3 +14,18 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'maternity.settings')
 
 application = get_wsgi_application()
+
+# Opt-in: load both ML models and run a dummy forward pass as each worker
+# boots; /health/ready/ answers 503 until this has finished.
+from django.conf import settings  # noqa: E402
+
+if settings.ML_WARMUP_ON_STARTUP:
+    from feetal_app.ml_service import start_model_warmup
+
+    start_model_warmup()
+
+# Resume queued and interrupted analysis jobs without waiting for an upload
+if settings.ANALYSIS_JOBS_ENABLED and settings.ANALYSIS_JOB_WORKERS_ON_STARTUP:
+    from feetal_app.jobs import get_worker_pool
+
+    get_worker_pool()